@@ -0,0 +1,430 @@
+import time
+import json
+import random
+import socket
+import weakref
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import Config
+from metrics import get_metrics
+from cancellation import OperationCancelled
+
+# 需要重试的状态码（限流和服务端临时错误）
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """令牌桶限速器，并支持在收到 Retry-After 时整体暂停"""
+
+    def __init__(self, rate_per_second, capacity=None):
+        self.rate = rate_per_second
+        self.capacity = capacity or max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """在接下来的 seconds 秒内暂停发放令牌"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def acquire(self, deadline=None, cancel_token=None):
+        """获取一个令牌，超过截止时间仍未获取到则返回 False，等待期间被取消时抛出 OperationCancelled"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    self.updated = self.paused_until
+                    wait = self.paused_until - now
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            if cancel_token is None:
+                time.sleep(wait)
+            elif cancel_token.wait(wait):
+                raise OperationCancelled()
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 自适应并发控制：请求成功时并发上限缓慢增加，
+    遇到限流时减半，使并发数稳定在配额允许的范围内。
+    """
+
+    def __init__(self, maximum, minimum=1, initial=None):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(initial or self.maximum)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, deadline=None, cancel_token=None):
+        if cancel_token is None:
+            return self._acquire(deadline)
+        # 取消时唤醒等待中的线程
+        with cancel_token.on_cancel(self._wake_all):
+            return self._acquire(deadline, cancel_token)
+
+    def _acquire(self, deadline=None, cancel_token=None):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return False
+                self._condition.wait(timeout)
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            self.in_flight += 1
+            return True
+
+    def _wake_all(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+class _AbortableAdapter(HTTPAdapter):
+    """连接池中的每个连接建立后都登记到所属的 AbortableSession"""
+
+    def __init__(self, session, **kwargs):
+        # HTTPAdapter.__init__ 会调用 init_poolmanager，需要先设置 session
+        self._session = session
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": self._tracked_pool(HTTPConnectionPool),
+            "https": self._tracked_pool(HTTPSConnectionPool),
+        }
+
+    def _tracked_pool(self, pool_cls):
+        session = self._session
+
+        class TrackedConnection(pool_cls.ConnectionCls):
+            def connect(self):
+                session.check_open()
+                super().connect()
+                session.track(self.sock)
+
+        return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": TrackedConnection})
+
+
+class AbortableSession(requests.Session):
+    """
+    可中止的会话，每次可取消的运行（每个取消令牌）使用一个。
+    abort 断开该会话的所有连接：正在等待响应的请求立即出错返回，不必等到超时，
+    之后也不再建立新的连接。
+    """
+
+    def __init__(self, pool_maxsize):
+        super().__init__()
+        self._sockets = weakref.WeakSet()
+        self._aborted = False
+        self._lock = threading.Lock()
+        adapter = _AbortableAdapter(self, pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def check_open(self):
+        if self._aborted:
+            raise ConnectionAbortedError("请求已取消")
+
+    def track(self, sock):
+        with self._lock:
+            aborted = self._aborted
+            if not aborted:
+                self._sockets.add(sock)
+        if aborted:
+            self._shutdown(sock)
+
+    @staticmethod
+    def _shutdown(sock):
+        # 只 shutdown 不 close：阻塞在该连接上的线程被唤醒，文件描述符仍由其所有者关闭
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def abort(self):
+        with self._lock:
+            self._aborted = True
+            sockets = list(self._sockets)
+        for sock in sockets:
+            self._shutdown(sock)
+        self.close()
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class GeminiClient:
+    """
+    共享连接池的 Gemini HTTP 客户端。
+    所有请求共用令牌桶限速和自适应并发控制，每次请求都有超时和总截止时间。
+    """
+
+    def __init__(self, max_connections=None, timeout=None, deadline=None, requests_per_minute=None):
+        self.timeout = timeout or Config.REQUEST_TIMEOUT
+        self.deadline = deadline or Config.REQUEST_DEADLINE
+        max_connections = max_connections or Config.MAX_WORKERS
+        self.max_connections = max_connections
+        # 不可取消的请求使用共享会话；可取消的请求按取消令牌使用各自的可中止会话
+        self.session = requests.Session()
+        self._run_sessions = weakref.WeakKeyDictionary()
+        self._run_sessions_lock = threading.Lock()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.rate_limiter = TokenBucket((requests_per_minute or Config.REQUESTS_PER_MINUTE) / 60.0)
+        self.concurrency = AdaptiveConcurrency(max_connections)
+        # 可取消的请求在这些线程中等待网络 I/O，调用方取消时不必等请求结束
+        self._io_executor = ThreadPoolExecutor(max_workers=max_connections * 2, thread_name_prefix="gemini-io")
+
+    def backoff(self, attempt):
+        """指数退避（带随机抖动），上限 30 秒"""
+        return random.uniform(0, min(30.0, 2 ** attempt))
+
+    def session_for(self, cancel_token):
+        """返回请求使用的会话：每个取消令牌一个可中止会话，取消时随之中止"""
+        if cancel_token is None:
+            return self.session
+        with self._run_sessions_lock:
+            session = self._run_sessions.get(cancel_token)
+            if session is None:
+                session = AbortableSession(self.max_connections)
+                self._run_sessions[cancel_token] = session
+            return session
+
+    def _wait(self, func, cancel_token, abort, on_abandon):
+        """
+        在 I/O 线程中执行 func 并等待结果；等待期间被取消时调用 abort 中止正在进行的 I/O，
+        并立即抛出 OperationCancelled。func 随之出错结束，结束后交给 on_abandon(future) 清理。
+        """
+        future = self._io_executor.submit(func)
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+
+        def on_cancel():
+            abort()
+            done.set()
+
+        with cancel_token.on_cancel(on_cancel):
+            done.wait()
+        if cancel_token.is_cancelled:
+            future.add_done_callback(on_abandon)
+            raise OperationCancelled()
+        return future.result()
+
+    @staticmethod
+    def _discard_abandoned(future):
+        """已取消的请求结束后关闭其响应（并发名额在取消时已经释放）"""
+        try:
+            future.result().close()
+        except Exception:
+            pass
+
+    def _send(self, url, payload, max_retries, stream=False, cancel_token=None):
+        """
+        发送请求并处理重试，返回 (响应对象, 尝试次数, 最后一次的 HTTP 状态码)。
+        失败时响应对象为 None，没有收到任何响应时状态码为 None。
+        成功返回时仍占用一个并发名额，调用方读取完响应后必须调用 _finish 释放。
+        提供 cancel_token 时，取消后中止正在进行的请求、释放并发名额，并直接抛出 OperationCancelled。
+        """
+        deadline = time.monotonic() + self.deadline
+        session = self.session_for(cancel_token)
+        metrics = get_metrics()
+        attempts = 0
+        status = None
+        for attempt in range(max_retries):
+            if attempt:
+                metrics.count("api.retries")
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if (not self.rate_limiter.acquire(deadline, cancel_token)
+                    or not self.concurrency.acquire(deadline, cancel_token)):
+                print("API调用超过截止时间，放弃请求")
+                return None, attempts, status
+            attempts += 1
+            status = None
+            wait_time = None
+            response = None
+            # 成功时并发名额交给调用方，这里不再释放
+            slot_handed_off = False
+            try:
+                timeout = max(1.0, min(self.timeout, deadline - time.monotonic()))
+                if cancel_token is None:
+                    response = session.post(url, json=payload, timeout=timeout, stream=stream)
+                else:
+                    response = self._wait(
+                        lambda: session.post(url, json=payload, timeout=timeout, stream=stream),
+                        cancel_token, session.abort, self._discard_abandoned
+                    )
+                status = response.status_code
+                metrics.count("api.requests")
+                metrics.count(f"api.status.{status}")
+                if response.status_code == 200:
+                    slot_handed_off = True
+                    return response, attempts, status
+                if response.status_code == 429:  # Rate limit
+                    self.concurrency.on_throttle()
+                    wait_time = parse_retry_after(response.headers.get("Retry-After"))
+                    if wait_time is None:
+                        wait_time = self.backoff(attempt + 1)
+                    self.rate_limiter.pause(wait_time)
+                    print(f"达到速率限制，等待{wait_time:.1f}秒后重试...")
+                elif response.status_code in RETRYABLE_STATUS:
+                    wait_time = parse_retry_after(response.headers.get("Retry-After")) or self.backoff(attempt)
+                    print(f"API调用失败（尝试 {attempt + 1}/{max_retries}）：{response.status_code} {response.text}")
+                else:
+                    # 其他客户端错误重试也不会成功
+                    print(f"API调用失败：{response.status_code} {response.text}")
+                    return None, attempts, status
+            except requests.RequestException as e:
+                metrics.count("api.errors")
+                wait_time = self.backoff(attempt)
+                print(f"API调用出错（尝试 {attempt + 1}/{max_retries}）：{str(e)}")
+            finally:
+                # 包括取消和 session.post 抛出的其他异常，保证名额总会被释放
+                if not slot_handed_off:
+                    if response is not None:
+                        response.close()
+                    self.concurrency.release()
+
+            if attempt + 1 < max_retries:
+                if time.monotonic() + wait_time > deadline:
+                    print("API调用超过截止时间，放弃请求")
+                    return None, attempts, status
+                if cancel_token is None:
+                    time.sleep(wait_time)
+                elif cancel_token.wait(wait_time):
+                    raise OperationCancelled()
+        return None, attempts, status
+
+    @staticmethod
+    def _record_attempts(record, attempts, status):
+        """将本次调用的尝试次数和最终状态码写入性能统计记录（可选）"""
+        if record is not None:
+            record["attempts"] = attempts
+            record["status"] = status
+
+    def _finish(self, response, success=False):
+        """关闭响应并释放并发名额"""
+        response.close()
+        if success:
+            self.concurrency.on_success()
+        self.concurrency.release()
+
+    def post_json(self, url, payload, max_retries=3, cancel_token=None, record=None):
+        """
+        发送 POST 请求并返回 JSON 结果，失败时返回 None，取消时抛出 OperationCancelled。
+        record 为性能统计记录（可选），写入尝试次数和最终状态码。
+        """
+        response, attempts, status = self._send(url, payload, max_retries, cancel_token=cancel_token)
+        self._record_attempts(record, attempts, status)
+        if response is None:
+            return None
+        success = False
+        try:
+            result = response.json()
+            success = True
+            return result
+        except ValueError as e:
+            print(f"解析API响应失败：{str(e)}")
+            return None
+        finally:
+            self._finish(response, success)
+
+    def stream_json(self, url, payload, max_retries=3, cancel_token=None, record=None):
+        """
+        发送流式请求（Server-Sent Events），逐个返回每个事件的 JSON 数据。
+        只在收到响应之前重试，读取过程中断时结束迭代；取消时抛出 OperationCancelled。
+        record 同 post_json。
+        """
+        response, attempts, status = self._send(url, payload, max_retries, stream=True, cancel_token=cancel_token)
+        self._record_attempts(record, attempts, status)
+        if response is None:
+            return
+        success = False
+        try:
+            response.encoding = "utf-8"
+            # 直接在当前线程逐行读取，行与行之间检查取消；取消时关闭响应，使阻塞中的读取立即结束
+            with cancel_token.on_cancel(response.close) if cancel_token is not None else contextlib.nullcontext():
+                for line in response.iter_lines(decode_unicode=True):
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    if line and line.startswith("data:"):
+                        yield json.loads(line[5:])
+            success = True
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            # 响应被取消回调关闭后，读取可能抛出各种异常，统一视为取消
+            if cancel_token is not None and cancel_token.is_cancelled:
+                raise OperationCancelled() from e
+            if not isinstance(e, (requests.RequestException, ValueError)):
+                raise
+            print(f"读取流式响应时出错：{str(e)}")
+        finally:
+            self._finish(response, success)
+
+    def close(self):
+        with self._run_sessions_lock:
+            run_sessions = list(self._run_sessions.values())
+        for session in run_sessions:
+            session.abort()
+        self._io_executor.shutdown(wait=False)
+        self.session.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client():
+    """返回进程内共享的客户端，所有 FileProcessor 共用连接池和限速"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = GeminiClient()
+        return _shared_client
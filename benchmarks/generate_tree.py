@@ -0,0 +1,114 @@
+"""
+生成用于性能测试的合成目录树。
+
+文件名模仿真实资料库的分布：中英文书名、扫描件编号、相机和截图文件名、
+带版本号的下载副本等；一部分文件名在不同子目录中重复出现，一部分文件内容完全相同。
+相同的 seed 总是生成相同的目录树。
+
+示例：
+    python benchmarks/generate_tree.py /tmp/bench_tree --files 100000
+"""
+import os
+import sys
+import random
+import argparse
+
+TOPICS = ["机器学习", "深度学习", "中国历史", "世界经济", "量子物理", "数据结构", "算法导论",
+          "红楼梦", "三国演义", "投资学", "心理学", "操作系统", "计算机网络", "线性代数"]
+TITLE_SUFFIXES = ["", "入门", "实战", "原理", "精要", "第二版", "（修订版）", "读书笔记", "习题解答"]
+ENGLISH_WORDS = ["deep", "learning", "python", "history", "economics", "design", "patterns",
+                 "network", "systems", "linear", "algebra", "statistics", "guide", "handbook"]
+BOOK_EXTENSIONS = [".pdf"] * 5 + [".epub"] * 3 + [".mobi", ".docx", ".txt", ".doc"]
+OTHER_EXTENSIONS = [".jpg", ".png", ".mp4", ".zip", ".xlsx", ".pptx", ".md", ".csv"]
+DIR_NAMES = ["下载", "资料", "books", "收藏", "临时", "archive", "新建文件夹", "工作", "学习", "misc"]
+
+# 文件名类型及其权重
+NAME_KINDS = [("chinese_book", 40), ("english_book", 20), ("scan", 10), ("camera", 10),
+              ("screenshot", 5), ("download_copy", 10), ("other", 5)]
+
+
+def random_name(rng, index):
+    kind = rng.choices([k for k, _ in NAME_KINDS], weights=[w for _, w in NAME_KINDS])[0]
+    if kind == "chinese_book":
+        return f"{rng.choice(TOPICS)}{rng.choice(TITLE_SUFFIXES)}{rng.choice(BOOK_EXTENSIONS)}"
+    if kind == "english_book":
+        words = rng.sample(ENGLISH_WORDS, rng.randint(2, 4))
+        separator = rng.choice([" ", "_", "-", "."])
+        return separator.join(word.capitalize() for word in words) + rng.choice(BOOK_EXTENSIONS)
+    if kind == "scan":
+        return f"scan_{index % 10000:04d}.pdf"
+    if kind == "camera":
+        return f"IMG_{20200101 + rng.randint(0, 40000)}_{rng.randint(0, 999999):06d}.jpg"
+    if kind == "screenshot":
+        return f"Screenshot {2023 + rng.randint(0, 2)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} at {index}.png"
+    if kind == "download_copy":
+        return f"{rng.choice(TOPICS)} ({rng.randint(1, 5)}){rng.choice(BOOK_EXTENSIONS)}"
+    return f"{rng.choice(ENGLISH_WORDS)}_{index}{rng.choice(OTHER_EXTENSIONS)}"
+
+
+def generate_tree(root_path, file_count, seed=0, max_depth=3, files_per_dir=200,
+                  duplicate_content_ratio=0.05):
+    """
+    在 root_path 下生成 file_count 个文件，返回生成的文件数。
+    files_per_dir 控制每个目录的平均文件数，目录层级最多 max_depth 层；
+    duplicate_content_ratio 比例的文件复制前面某个文件的内容（用于重复文件检测）。
+    """
+    rng = random.Random(seed)
+    os.makedirs(root_path, exist_ok=True)
+    dir_count = max(1, file_count // files_per_dir)
+    dirs = [""]
+    while len(dirs) < dir_count:
+        parent = rng.choice(dirs)
+        if parent.count(os.sep) + 1 >= max_depth:
+            parent = ""
+        child = os.path.join(parent, f"{rng.choice(DIR_NAMES)}_{len(dirs)}")
+        dirs.append(child)
+    for relative_dir in dirs:
+        os.makedirs(os.path.join(root_path, relative_dir), exist_ok=True)
+
+    contents = []
+    created = 0
+    for index in range(file_count):
+        relative_dir = rng.choice(dirs)
+        name = random_name(rng, index)
+        path = os.path.join(root_path, relative_dir, name)
+        if os.path.exists(path):
+            # 同一目录中的重名文件改为带编号的副本
+            stem, extension = os.path.splitext(name)
+            path = os.path.join(root_path, relative_dir, f"{stem}_{index}{extension}")
+        if contents and rng.random() < duplicate_content_ratio:
+            content = rng.choice(contents)
+        else:
+            content = f"{name}:{index}\n".encode("utf-8") * rng.randint(1, 8)
+            if len(contents) < 1000:
+                contents.append(content)
+        with open(path, "wb") as f:
+            f.write(content)
+        created += 1
+    # 少量隐藏文件，整理后清理空目录时需要处理
+    for relative_dir in dirs[1::5]:
+        open(os.path.join(root_path, relative_dir, ".DS_Store"), "wb").close()
+    return created
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="生成性能测试用的合成目录树")
+    parser.add_argument("root", help="输出目录")
+    parser.add_argument("--files", type=int, default=1000, help="文件数量")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-depth", type=int, default=3)
+    parser.add_argument("--files-per-dir", type=int, default=200)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05, help="内容重复的文件比例")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    count = generate_tree(args.root, args.files, args.seed, args.max_depth,
+                          args.files_per_dir, args.duplicate_ratio)
+    print(f"已生成 {count} 个文件：{args.root}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
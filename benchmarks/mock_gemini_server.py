@@ -0,0 +1,206 @@
+"""
+本地模拟的 Gemini generateContent 服务，用于性能测试。
+
+支持 :generateContent 和 :streamGenerateContent?alt=sse 两个接口，
+可配置响应延迟、429 限流比例和响应格式，不消耗真实的 API 配额。
+
+示例：
+    python benchmarks/mock_gemini_server.py --port 8765 --latency 200 --rate-429 0.05
+    API_BASE_URL=http://127.0.0.1:8765/v1beta python organize_cli.py /data/books
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 响应格式：
+#   markdown  用 ```json 代码块包裹（与真实模型最常见的返回一致）
+#   plain     只返回 JSON
+#   prose     JSON 前后带有说明文字
+#   truncated JSON 在末尾被截断（模拟输出长度超限）
+RESPONSE_SHAPES = ("markdown", "plain", "prose", "truncated")
+
+# 提示词中文件行的格式：编号|目录|文件名[|内容摘要]
+FILE_LINE_RE = re.compile(r"^(\d+)\|D\d+\|([^|\n]*)", re.M)
+
+# 模拟的分类：按扩展名决定大类，再按文件名哈希分到子类
+CATEGORY_BY_EXTENSION = {
+    ".pdf": "书籍", ".epub": "书籍", ".mobi": "书籍",
+    ".doc": "文档", ".docx": "文档", ".txt": "文档", ".md": "文档",
+    ".xls": "表格", ".xlsx": "表格", ".csv": "表格",
+    ".ppt": "演示文稿", ".pptx": "演示文稿",
+}
+SUBCATEGORIES = ("技术", "历史", "经济", "文学", "其他")
+
+# 分级路由的提示词要求给出置信度；这些前缀的文件名（扫描件、照片、截图）只给出低置信度
+LOW_CONFIDENCE_PREFIXES = ("scan_", "IMG_", "Screenshot")
+
+
+def classify_name(name):
+    """根据文件名生成确定性的分类"""
+    extension = os.path.splitext(name)[1].lower()
+    category = CATEGORY_BY_EXTENSION.get(extension, "其他")
+    subcategory = SUBCATEGORIES[sum(name.encode("utf-8")) % len(SUBCATEGORIES)]
+    return f"{category}/{subcategory}"
+
+
+class MockGeminiServer:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, rate_429=0.0,
+                 retry_after=1.0, shape="markdown", seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.shape = shape
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "throttled": 0, "stream_requests": 0}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _decide(self):
+        """返回 (是否限流, 延迟秒数)"""
+        with self._lock:
+            self.stats["requests"] += 1
+            throttled = self.random.random() < self.rate_429
+            if throttled:
+                self.stats["throttled"] += 1
+            delay = self.latency
+            if self.jitter:
+                delay = max(0.0, delay + self.random.uniform(-self.jitter, self.jitter))
+        return throttled, delay
+
+    def build_text(self, prompt):
+        """根据提示词生成模型回复文本"""
+        files = FILE_LINE_RE.findall(prompt)
+        if not files or "请提供你的分析和建议" in prompt:
+            return "这些文件主要是电子书和文档，建议按类型和主题分两级分类。"
+        scored = "置信度" in prompt
+        mapping = {}
+        for file_id, name in files:
+            value = int(file_id)
+            if scored:
+                value = [value, 0.3 if name.startswith(LOW_CONFIDENCE_PREFIXES) else 0.9]
+            mapping.setdefault(classify_name(name), []).append(value)
+        text = json.dumps(mapping, ensure_ascii=False)
+        if self.shape == "markdown":
+            return f"```json\n{text}\n```"
+        if self.shape == "prose":
+            return f"分类结果如下：\n{text}\n以上分类仅供参考。"
+        if self.shape == "truncated":
+            return text[:max(1, len(text) * 3 // 4)]
+        return text
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                    prompt = payload["contents"][0]["parts"][0]["text"]
+                except (ValueError, KeyError, IndexError):
+                    self._send_json(400, {"error": {"message": "invalid request"}})
+                    return
+
+                throttled, delay = server._decide()
+                time.sleep(delay)
+                if throttled:
+                    self._send_json(429, {"error": {"message": "rate limited"}},
+                                    {"Retry-After": str(server.retry_after)})
+                    return
+
+                text = server.build_text(prompt)
+                if ":streamGenerateContent" in self.path:
+                    with server._lock:
+                        server.stats["stream_requests"] += 1
+                    self._send_stream(text)
+                elif ":generateContent" in self.path:
+                    self._send_json(200, {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def _send_stream(self, text, chunk_size=200):
+                events = []
+                for start in range(0, len(text), chunk_size):
+                    event = {"candidates": [{"content": {"parts": [{"text": text[start:start + chunk_size]}]}}]}
+                    events.append(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+                data = b"".join(events)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="本地模拟 Gemini generateContent 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="平均响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机波动范围（毫秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的请求比例（0~1）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应中的 Retry-After 秒数")
+    parser.add_argument("--shape", choices=RESPONSE_SHAPES, default="markdown", help="分类结果的返回格式")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = MockGeminiServer(
+        args.host, args.port, args.latency / 1000, args.jitter / 1000,
+        args.rate_429, args.retry_after, args.shape, args.seed
+    )
+    print(f"模拟服务已启动：{server.base_url}（Ctrl+C 退出）", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
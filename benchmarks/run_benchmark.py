@@ -0,0 +1,211 @@
+"""
+端到端性能测试：生成合成目录树，启动本地模拟的 Gemini 服务，
+依次计时扫描、快照、重复检测、分类、移动、清理空目录和还原各阶段，输出 JSON 结果。
+
+示例：
+    python benchmarks/run_benchmark.py                              # 默认 1k 和 10k 个文件
+    python benchmarks/run_benchmark.py --sizes 1000,100000,1000000 --output results.json
+    python benchmarks/run_benchmark.py --latency 300 --rate-429 0.05 --shape truncated
+
+结果中每个阶段记录耗时（秒）、处理的条目数和吞吐量，可用于比较不同版本的性能变化。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+
+# 从仓库根目录导入各模块
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from config import Config
+from directory_scanner import scan_directory
+from directory_snapshot import DirectorySnapshot
+from duplicate_detector import DuplicateDetector
+from file_index import FileIndex
+from file_organizer import FileOrganizer
+from benchmarks.generate_tree import generate_tree
+from benchmarks.mock_gemini_server import MockGeminiServer, RESPONSE_SHAPES
+
+
+class StageTimer:
+    """记录各阶段的耗时和吞吐量"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, items=None):
+        start = time.perf_counter()
+        result = {}
+        try:
+            yield result
+        finally:
+            seconds = time.perf_counter() - start
+            count = result.get("items", items)
+            record = {"seconds": round(seconds, 4)}
+            if count is not None:
+                record["items"] = count
+                record["per_second"] = round(count / seconds, 1) if seconds > 0 else None
+            self.stages[name] = record
+
+
+def run_once(file_count, args, server, work_dir):
+    """对一个规模执行完整流程，返回结果字典"""
+    root_path = os.path.join(work_dir, f"tree_{file_count}")
+    timer = StageTimer()
+    result = {"files": file_count}
+
+    with timer.stage("generate", file_count):
+        generate_tree(root_path, file_count, seed=args.seed, duplicate_content_ratio=args.duplicate_ratio)
+
+    with timer.stage("scan") as stage:
+        scan = scan_directory(root_path)
+        stage["items"] = len(scan.files)
+
+    snapshot = DirectorySnapshot(root_path, backup_strategy=args.backup_strategy)
+    with timer.stage("snapshot", len(scan.files)):
+        snapshot.take_snapshot(scan)
+    if args.backup:
+        with timer.stage("backup", len(scan.files)):
+            result["backup_created"] = snapshot.create_backup()
+        result["backup_strategy"] = snapshot.backup_strategy_used
+
+    file_paths = scan.file_paths()
+    duplicates = None
+    if not args.skip_dedup:
+        with timer.stage("dedup", len(scan.files)):
+            duplicates = DuplicateDetector().detect(scan.files)
+        result["duplicate_groups"] = len(duplicates.groups)
+        file_paths = duplicates.unique_paths(file_paths)
+
+    # 只在分类阶段才导入，确保 Config 的修改已经生效
+    from file_processor import FileProcessor
+    processor = FileProcessor(api_key="benchmark")
+    if not args.cache:
+        processor.cache = None
+    if not args.rules:
+        processor.rule_classifier = None
+    requests_before = dict(server.stats)
+    with timer.stage("classify", len(file_paths)):
+        _, category_mapping = processor.analyze_filenames(file_paths)
+    result["api"] = {key: server.stats[key] - requests_before[key] for key in server.stats}
+    category_mapping = category_mapping or {}
+    if duplicates is not None:
+        category_mapping = duplicates.apply(category_mapping)
+    result["classified"] = sum(len(files) for files in category_mapping.values())
+    result["categories"] = len(category_mapping)
+
+    journal = snapshot.begin_journal(category_mapping)
+    organizer = FileOrganizer(
+        root_path, journal,
+        file_index=FileIndex.from_scan(scan),
+        trash_dir=snapshot.trash_path,
+        log=lambda message: None
+    )
+    try:
+        with timer.stage("move", result["classified"]):
+            organizer.move_files(category_mapping)
+        with timer.stage("cleanup") as stage:
+            organizer.cleanup_empty_dirs()
+            stage["items"] = len(organizer.vacated_dirs)
+        journal.commit()
+    finally:
+        journal.close()
+    result["organizer"] = dict(organizer.stats)
+
+    with timer.stage("restore", organizer.stats["moved"]):
+        result["restored"] = snapshot.restore()
+    with timer.stage("verify", len(scan.files)):
+        result["restore_diff_empty"] = snapshot.diff_with_current().is_empty()
+
+    snapshot.cleanup_backup()
+    if not args.keep:
+        shutil.rmtree(root_path, ignore_errors=True)
+    result["stages"] = timer.stages
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="文件整理流程的性能测试")
+    parser.add_argument("--sizes", default="1000,10000", help="文件数量列表，逗号分隔（如 1000,100000,1000000）")
+    parser.add_argument("--seed", type=int, default=0, help="生成目录树和模拟服务使用的随机种子")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05, help="内容重复的文件比例")
+    parser.add_argument("--latency", type=float, default=50.0, help="模拟服务的平均响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="模拟服务延迟的随机波动范围（毫秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="模拟服务返回 429 的请求比例")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="429 响应中的 Retry-After 秒数")
+    parser.add_argument("--shape", choices=RESPONSE_SHAPES, default="markdown", help="模拟服务的返回格式")
+    parser.add_argument("--structured", action="store_true", help="使用结构化输出模式（流式接口）")
+    parser.add_argument("--fast-model", default="", help="分级路由的快速模型名称（默认不启用）")
+    parser.add_argument("--rpm", type=float, default=100000, help="客户端每分钟请求上限")
+    parser.add_argument("--cache", action="store_true", help="启用分类缓存（默认关闭，保证每次都请求模拟服务）")
+    parser.add_argument("--rules", action="store_true", help="启用本地规则分类（默认关闭）")
+    parser.add_argument("--skip-dedup", action="store_true", help="跳过重复文件检测")
+    parser.add_argument("--backup", action="store_true", help="同时计时目录备份")
+    parser.add_argument("--backup-strategy", default=None, help="备份方式（auto/reflink/hardlink/copy）")
+    parser.add_argument("--work-dir", default=None, help="生成目录树的位置（默认使用临时目录）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的目录树")
+    parser.add_argument("--output", help="将 JSON 结果写入文件（默认输出到标准输出）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="file_organizer_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    server = MockGeminiServer(
+        latency=args.latency / 1000, jitter=args.jitter / 1000, rate_429=args.rate_429,
+        retry_after=args.retry_after, shape=args.shape, seed=args.seed
+    ).start()
+    # 所有请求发往模拟服务，缓存和操作日志写入临时目录，不影响正常使用的数据
+    Config.API_BASE_URL = server.base_url
+    Config.REQUESTS_PER_MINUTE = args.rpm
+    Config.STRUCTURED_OUTPUT = args.structured
+    Config.FAST_MODEL_NAME = args.fast_model
+    Config.APP_DATA_DIR = os.path.join(work_dir, "app_data")
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {
+            "latency_ms": args.latency, "jitter_ms": args.jitter, "rate_429": args.rate_429,
+            "shape": args.shape, "structured": args.structured, "fast_model": args.fast_model,
+            "seed": args.seed,
+            "batch_token_budget": Config.BATCH_TOKEN_BUDGET, "max_workers": Config.MAX_WORKERS,
+            "move_workers": Config.MOVE_WORKERS,
+        },
+        "runs": [],
+    }
+    try:
+        # 各模块的提示信息输出到标准错误，标准输出只留给结果
+        with contextlib.redirect_stdout(sys.stderr):
+            for size in sizes:
+                print(f"正在测试 {size} 个文件...")
+                report["runs"].append(run_once(size, args, server, work_dir))
+    finally:
+        server.stop()
+        if not args.work_dir and not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import threading
+import contextlib
+
+
+class OperationCancelled(Exception):
+    """操作已被用户取消"""
+
+    def __init__(self, message="操作已取消"):
+        super().__init__(message)
+
+
+class CancelToken:
+    """
+    协作式取消令牌。
+    后台任务在批次之间检查 is_cancelled，等待时用 wait 代替 time.sleep；
+    正在阻塞的操作（如等待 HTTP 响应）可以通过 on_cancel 注册回调，在取消时立即被唤醒。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """请求取消（可从任意线程调用，多次调用只生效一次）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @property
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+    def wait(self, timeout):
+        """最多等待 timeout 秒，期间被取消时立即返回 True"""
+        return self._event.wait(timeout)
+
+    @contextlib.contextmanager
+    def on_cancel(self, callback):
+        """在 with 语句块内注册取消回调，已经取消时立即调用"""
+        with self._lock:
+            cancelled = self._event.is_set()
+            if not cancelled:
+                self._callbacks.append(callback)
+        if cancelled:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
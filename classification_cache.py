@@ -0,0 +1,136 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+
+class ClassificationCache:
+    """
+    基于 SQLite 的文件分类结果缓存。
+    缓存键由规范化文件名、模型名称、temperature 和提示词版本共同决定，
+    按内容摘要分类时还包含摘要内容（同名但内容不同的文件不会共用缓存），
+    超出容量时按最近使用时间淘汰（LRU）。
+    """
+
+    def __init__(self, db_path, model_name, temperature, prompt_version, max_entries=100000):
+        self.db_path = db_path
+        self.model_name = model_name
+        self.temperature = temperature
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classification ("
+            "key TEXT PRIMARY KEY, category TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_classification_last_used ON classification(last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def normalize_name(file_name):
+        """规范化文件名：只取文件名部分，统一 Unicode 形式和大小写"""
+        base_name = os.path.basename(file_name.replace("\\", "/").rstrip("/"))
+        return unicodedata.normalize("NFC", base_name).strip().lower()
+
+    def make_key(self, file_name, content=None):
+        """生成缓存键，content 为文件的内容摘要（不按内容分类时为 None）"""
+        parts = [
+            self.normalize_name(file_name),
+            self.model_name,
+            repr(float(self.temperature)),
+            self.prompt_version
+        ]
+        if content is not None:
+            # 没有摘要的文件用空字符串，与不按内容分类时的缓存键区分开
+            parts.append("content:" + hashlib.sha1(content.encode("utf-8")).hexdigest())
+        raw = "\0".join(parts)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def content_of(contents, file_name):
+        """contents 为 {文件名: 内容摘要} 或 None（不按内容分类）"""
+        return None if contents is None else contents.get(file_name, "")
+
+    def get_many(self, file_names, contents=None):
+        """
+        批量查询缓存，返回 {文件名: 分类}，只包含命中的文件。
+        contents 为 {文件名: 内容摘要}（可选），提供时按文件名和内容共同查询。
+        """
+        keys = {}
+        for file_name in file_names:
+            keys.setdefault(self.make_key(file_name, self.content_of(contents, file_name)), []).append(file_name)
+
+        hits = {}
+        now = time.time()
+        key_list = list(keys)
+        with self._lock:
+            # SQLite 对单条语句的参数个数有限制，分段查询
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, category FROM classification WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, category in rows:
+                    for file_name in keys[key]:
+                        hits[file_name] = category
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE classification SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+        return hits
+
+    def put_mapping(self, category_mapping, contents=None):
+        """将分类映射 {分类: [文件名, ...]} 写入缓存，contents 同 get_many"""
+        now = time.time()
+        rows = [
+            (self.make_key(file_name, self.content_of(contents, file_name)), category, now)
+            for category, files in category_mapping.items()
+            for file_name in files
+            if isinstance(file_name, str)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO classification (key, category, last_used) VALUES (?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """超出容量时删除最久未使用的条目"""
+        count = self._conn.execute("SELECT COUNT(*) FROM classification").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM classification WHERE key IN ("
+                "SELECT key FROM classification ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM classification")
+            self._conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
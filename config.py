@@ -11,9 +11,64 @@ class Config:
     API_KEY = os.getenv("API_KEY")
     MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.0-flash-thinking-exp-1219")
     TEMPERATURE = float(os.getenv("TEMPERATURE", 0.7))
+    # API 地址（可指向代理或本地模拟服务，如性能测试时使用的模拟服务）
+    API_BASE_URL = os.getenv("API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+
+    # 分级模型路由：先用快速模型分类并给出置信度，只把低置信度和未分类的文件交给 MODEL_NAME
+    FAST_MODEL_NAME = os.getenv("FAST_MODEL_NAME", "")  # 留空则不启用
+    CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", 0.7))  # 低于该置信度的文件升级到 MODEL_NAME
+
+    # 结构化输出模式：单次流式请求直接返回 JSON 分类结果（不生成分析说明）
+    STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "False").lower() == "true"
+
+    # 分批分类配置（文件较多时按 token 预算切分并发请求）
+    BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", 8000))
+    MAX_WORKERS = int(os.getenv("MAX_WORKERS", 4))
+
+    # API 请求配置
+    REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", 120))  # 单次请求超时（秒）
+    REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 300))  # 含重试在内的总截止时间（秒）
+    REQUESTS_PER_MINUTE = float(os.getenv("REQUESTS_PER_MINUTE", 60))  # 每分钟最多请求数
+
+    # 应用数据目录（缓存等持久化数据存放位置）
+    APP_DATA_DIR = os.getenv("APP_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".file_smart_organizer")
+
+    # 本地规则分类配置（图片、压缩包等类型明确的文件不发送给大模型）
+    ENABLE_RULE_CLASSIFIER = os.getenv("ENABLE_RULE_CLASSIFIER", "True").lower() == "true"
+    RULES_FILE = os.getenv("RULES_FILE", None)  # 自定义规则 JSON 文件
+
+    # 分类结果缓存配置
+    ENABLE_CLASSIFICATION_CACHE = os.getenv("ENABLE_CLASSIFICATION_CACHE", "True").lower() == "true"
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 200000))
+
+    # 内容摘要配置：读取文件开头的少量内容，补充到分类提示词中
+    ENABLE_CONTENT_SNIPPETS = os.getenv("ENABLE_CONTENT_SNIPPETS", "False").lower() == "true"
+    SNIPPET_MAX_BYTES = int(os.getenv("SNIPPET_MAX_BYTES", 65536))  # 每个文件最多读取的字节数
+    SNIPPET_MAX_PAGES = int(os.getenv("SNIPPET_MAX_PAGES", 2))  # PDF 最多读取的页数
+    SNIPPET_MAX_CHARS = int(os.getenv("SNIPPET_MAX_CHARS", 200))  # 每个摘要的最大字符数
+    SNIPPET_WORKERS = int(os.getenv("SNIPPET_WORKERS", 0))  # 提取摘要的进程数，0 表示按 CPU 核数
+
+    # 重复文件检测配置：每组重复文件只分类一次
+    ENABLE_DUPLICATE_DETECTION = os.getenv("ENABLE_DUPLICATE_DETECTION", "True").lower() == "true"
+    # 多余副本的处理方式：report（只报告，留在原处）或 quarantine（移入重复文件目录）
+    DUPLICATE_ACTION = os.getenv("DUPLICATE_ACTION", "report")
+    DUPLICATE_DIR_NAME = os.getenv("DUPLICATE_DIR_NAME", "重复文件")
+    HASH_WORKERS = int(os.getenv("HASH_WORKERS", 4))  # 并行计算文件哈希的线程数
 
     # 文件处理相关配置
     DEFAULT_BASE_DIR = os.getenv("DEFAULT_BASE_DIR", None)
+    # 备份方式：auto（自动选择）、reflink、hardlink 或 copy
+    BACKUP_STRATEGY = os.getenv("BACKUP_STRATEGY", "auto")
+    SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", 5))  # 每个目录在应用数据目录中保留的快照清单数
+    JOURNAL_KEEP = int(os.getenv("JOURNAL_KEEP", 20))  # 每个目录保留的已提交整理日志数（命令行整理）
+    MOVE_WORKERS = int(os.getenv("MOVE_WORKERS", 8))  # 并行移动文件的线程数
+
+    # 监听模式配置（持续整理新到达的文件）
+    WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", 2))  # 最后一个文件到达后等待的秒数
+    WATCH_MAX_BATCH = int(os.getenv("WATCH_MAX_BATCH", 200))  # 每批最多处理的文件数
+    WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", 5))  # 不支持 inotify 时的检查间隔（秒）
+    WATCH_MAX_RETRIES = int(os.getenv("WATCH_MAX_RETRIES", 5))  # 分类失败的文件最多重试的次数
+    WATCH_KEEP_JOURNALS = int(os.getenv("WATCH_KEEP_JOURNALS", 20))  # 每个目录保留的监听批次日志数
     ENABLE_LOGGING = os.getenv("ENABLE_LOGGING", "True").lower() == "true"
     LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "logs/app.log")
 
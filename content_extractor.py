@@ -0,0 +1,239 @@
+import os
+import re
+import mmap
+import html
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from cancellation import OperationCancelled
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF 摘要为可选功能
+    PdfReader = None
+
+# 多个进程之间按批分发文件，减少进程间通信次数
+EXTRACT_CHUNK_SIZE = 16
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+_OPF_TITLE_RE = re.compile(r"<dc:title[^>]*>(.*?)</dc:title>", re.S)
+_OPF_CREATOR_RE = re.compile(r"<dc:creator[^>]*>(.*?)</dc:creator>", re.S)
+
+
+def compact_text(text, max_chars):
+    """合并空白字符并截断"""
+    return _SPACE_RE.sub(" ", text).strip()[:max_chars]
+
+
+def markup_to_text(markup):
+    """去掉 XML/HTML 标签，只保留文字"""
+    return html.unescape(_TAG_RE.sub(" ", markup))
+
+
+def decode_bytes(data):
+    """按 UTF-8 解码，失败时尝试 GB18030（截断处的半个字符直接丢弃）"""
+    for encoding in ("utf-8", "gb18030"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError as e:
+            # 只在末尾被截断时容忍解码错误
+            if e.start >= len(data) - 4:
+                return data[:e.start].decode(encoding, errors="ignore")
+    return data.decode("utf-8", errors="ignore")
+
+
+def read_text_head(path, max_bytes):
+    """通过内存映射读取纯文本文件开头的 max_bytes 字节"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_bytes(mapped[:min(size, max_bytes)])
+
+
+def read_zip_member(archive, name, max_bytes):
+    """读取压缩包中某个成员解压后的前 max_bytes 字节"""
+    with archive.open(name) as member:
+        return decode_bytes(member.read(max_bytes))
+
+
+def extract_docx(path, max_bytes):
+    with zipfile.ZipFile(path) as archive:
+        return markup_to_text(read_zip_member(archive, "word/document.xml", max_bytes))
+
+
+def extract_epub(path, max_bytes):
+    """电子书：优先读取元数据中的书名和作者，再读取第一个正文文件的开头"""
+    parts = []
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        opf_names = [name for name in names if name.lower().endswith(".opf")]
+        if opf_names:
+            opf = read_zip_member(archive, opf_names[0], max_bytes)
+            for regex in (_OPF_TITLE_RE, _OPF_CREATOR_RE):
+                match = regex.search(opf)
+                if match:
+                    parts.append(markup_to_text(match.group(1)))
+        for name in names:
+            lower_name = name.lower()
+            if lower_name.endswith((".xhtml", ".html", ".htm")) and not any(
+                    word in lower_name for word in ("cover", "toc", "nav", "copyright")):
+                parts.append(markup_to_text(read_zip_member(archive, name, max_bytes)))
+                break
+    return " ".join(parts)
+
+
+def extract_pdf(path, max_pages):
+    """PDF：读取元数据标题和前 max_pages 页的文字（需要安装 pypdf）"""
+    if PdfReader is None:
+        return ""
+    reader = PdfReader(path)
+    parts = []
+    title = (reader.metadata or {}).get("/Title")
+    if title:
+        parts.append(str(title))
+    for page in reader.pages[:max_pages]:
+        parts.append(page.extract_text() or "")
+    return " ".join(parts)
+
+
+def extract_mobi(path):
+    """MOBI：PalmDB 文件头的前 32 字节是书名"""
+    with open(path, "rb") as f:
+        header = f.read(32)
+    return decode_bytes(header.split(b"\0", 1)[0]).replace("_", " ")
+
+
+def extract_snippet(path, max_bytes=None, max_pages=None, max_chars=None):
+    """
+    提取单个文件的内容摘要，无法提取时返回空字符串。
+    每个文件最多读取 max_bytes 字节（PDF 为 max_pages 页），不会完整读取大文件。
+    """
+    max_bytes = max_bytes or Config.SNIPPET_MAX_BYTES
+    max_pages = max_pages or Config.SNIPPET_MAX_PAGES
+    max_chars = max_chars or Config.SNIPPET_MAX_CHARS
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension in (".txt", ".md"):
+            text = read_text_head(path, max_bytes)
+        elif extension == ".docx":
+            text = extract_docx(path, max_bytes)
+        elif extension == ".epub":
+            text = extract_epub(path, max_bytes)
+        elif extension == ".pdf":
+            text = extract_pdf(path, max_pages)
+        elif extension == ".mobi":
+            text = extract_mobi(path)
+        else:
+            return ""
+    except Exception:
+        # 文件损坏或格式不符时只是没有摘要，不影响按文件名分类
+        return ""
+    return compact_text(text, max_chars)
+
+
+def _extract_chunk(paths, max_bytes, max_pages, max_chars):
+    return [extract_snippet(path, max_bytes, max_pages, max_chars) for path in paths]
+
+
+class ContentExtractor:
+    """
+    在进程池中并行提取文件内容摘要，作为分类提示词的补充信息。
+    只处理 supported_types 中的文件类型，每个文件的读取量有上限。
+    keep_pool 为 True 时进程池在多次调用之间复用（如监听模式），用完后需调用 close。
+    """
+
+    def __init__(self, supported_types, max_workers=None, max_bytes=None, max_pages=None, max_chars=None,
+                 keep_pool=False):
+        self.supported_types = {extension.lower() for extension in supported_types}
+        self.max_workers = max(1, max_workers or Config.SNIPPET_WORKERS or os.cpu_count() or 1)
+        self.max_bytes = max_bytes or Config.SNIPPET_MAX_BYTES
+        self.max_pages = max_pages or Config.SNIPPET_MAX_PAGES
+        self.max_chars = max_chars or Config.SNIPPET_MAX_CHARS
+        self.keep_pool = keep_pool
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def extract_many(self, file_names, cancel_token=None):
+        """
+        返回 {文件路径: 摘要}，只包含成功提取到摘要的文件。
+        提供 cancel_token 时每处理完一批文件检查一次，取消后尚未开始的批次不再执行，
+        立即抛出 OperationCancelled。
+        """
+        paths = [
+            file_name for file_name in file_names
+            if os.path.splitext(file_name)[1].lower() in self.supported_types and os.path.isfile(file_name)
+        ]
+        if not paths:
+            return {}
+        chunks = [paths[start:start + EXTRACT_CHUNK_SIZE] for start in range(0, len(paths), EXTRACT_CHUNK_SIZE)]
+        args = (self.max_bytes, self.max_pages, self.max_chars)
+        if len(chunks) == 1 or self.max_workers == 1:
+            results = []
+            for chunk in chunks:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                results.append(_extract_chunk(chunk, *args))
+        else:
+            results = self._extract_in_pool(chunks, args, cancel_token)
+        snippets = {}
+        for chunk, chunk_snippets in zip(chunks, results):
+            for path, snippet in zip(chunk, chunk_snippets):
+                if snippet:
+                    snippets[path] = snippet
+        return snippets
+
+    def _get_executor(self, chunk_count):
+        """返回进程池：复用时创建一次并保留最大进程数，否则按本次的批数创建"""
+        # 调用方通常运行在多线程环境中（界面线程、HTTP 连接池），使用 spawn 避免 fork 带来的死锁
+        context = multiprocessing.get_context("spawn")
+        if not self.keep_pool:
+            return ProcessPoolExecutor(max_workers=min(self.max_workers, chunk_count), mp_context=context)
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            return self._executor
+
+    def _extract_in_pool(self, chunks, args, cancel_token=None):
+        """在进程池中提取各批摘要，按批次顺序返回结果"""
+        executor = self._get_executor(len(chunks))
+        cancelled = False
+        try:
+            futures = [executor.submit(_extract_chunk, chunk, *args) for chunk in chunks]
+            if cancel_token is None:
+                return [future.result() for future in futures]
+            # 任意一批完成或被取消时唤醒，取消后不必等待剩余的批次
+            progress = threading.Event()
+            for future in futures:
+                future.add_done_callback(lambda _: progress.set())
+            with cancel_token.on_cancel(progress.set):
+                while not all(future.done() for future in futures):
+                    progress.wait()
+                    progress.clear()
+                    if cancel_token.is_cancelled:
+                        cancelled = True
+                        for future in futures:
+                            future.cancel()
+                        raise OperationCancelled()
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            # 工作进程异常退出后进程池不能再使用，下次调用时重新创建
+            if self.keep_pool:
+                self.close()
+            raise
+        finally:
+            # 取消时正在执行的批次（每批最多 EXTRACT_CHUNK_SIZE 个文件）在后台结束，不再等待
+            if not self.keep_pool:
+                executor.shutdown(wait=not cancelled)
+
+    def close(self):
+        """关闭复用的进程池"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,215 @@
+import os
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+from metrics import timed
+
+# 条目类型标志位
+FLAG_DIR = 1
+FLAG_SYMLINK = 2
+
+
+class FileInfo(NamedTuple):
+    path: str
+    is_dir: bool
+    original_path: str
+    size: int = 0
+    mtime_ns: int = 0
+    inode: int = 0
+    device: int = 0
+    is_symlink: bool = False
+
+    @property
+    def file_id(self) -> Tuple[int, int]:
+        """文件的唯一标识（设备号, inode），重命名和移动后保持不变"""
+        return (self.device, self.inode)
+
+
+class ScanEntries(Sequence):
+    """扫描结果中一组条目的只读视图，访问时才生成 FileInfo"""
+
+    def __init__(self, scan: "ScanResult", indexes):
+        self._scan = scan
+        self._indexes = indexes
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return ScanEntries(self._scan, self._indexes[position])
+        return self._scan.info(self._indexes[position])
+
+    def __iter__(self) -> Iterator[FileInfo]:
+        info = self._scan.info
+        for index in self._indexes:
+            yield info(index)
+
+
+class ScanResult:
+    """
+    一次目录扫描的结果。
+    快照、备份、文件列表显示、分析线程和文件索引共用同一份扫描结果，
+    避免对同一目录重复遍历。扫描结果创建后不再修改。
+
+    条目按列紧凑存储：每个条目只记录父目录的序号和文件名（相同的文件名只保存一份），
+    大小、修改时间、inode 等保存在数组中；完整路径和 FileInfo 只在访问时生成。
+    """
+
+    def __init__(self, root_path: str):
+        self.root_path = root_path
+        self._root_prefix = os.path.join(root_path, "")
+        self._parents = array("q")
+        self._names: List[str] = []
+        self._flags = bytearray()
+        self._sizes = array("q")
+        self._mtimes = array("q")
+        self._inodes = array("Q")
+        self._devices = array("Q")
+        self._file_indexes = array("q")
+        self._dir_indexes = array("q")
+        # 目录数量远少于文件，目录的相对路径直接保存 {条目序号: 相对路径}
+        self._dir_paths: Dict[int, str] = {}
+        self._name_table: Dict[str, str] = {}
+
+    def append(self, parent: int, name: str, is_dir: bool, is_symlink: bool,
+               size: int, mtime_ns: int, inode: int, device: int) -> int:
+        """追加一个条目（仅在扫描过程中调用），parent 为父目录的序号（根目录为 -1），返回新条目的序号"""
+        index = len(self._names)
+        self._parents.append(parent)
+        self._names.append(self._name_table.setdefault(name, name))
+        self._flags.append((FLAG_DIR if is_dir else 0) | (FLAG_SYMLINK if is_symlink else 0))
+        self._sizes.append(size)
+        self._mtimes.append(mtime_ns)
+        self._inodes.append(inode)
+        self._devices.append(device)
+        if is_dir:
+            self._dir_indexes.append(index)
+            parent_path = self._dir_paths.get(parent)
+            self._dir_paths[index] = f"{parent_path}{os.sep}{name}" if parent_path else name
+        else:
+            self._file_indexes.append(index)
+        return index
+
+    def finish(self):
+        """扫描结束后释放只在构造时使用的文件名表"""
+        self._name_table = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def relative_path(self, index: int) -> str:
+        """第 index 个条目相对于根目录的路径"""
+        parent_path = self._dir_paths.get(self._parents[index])
+        name = self._names[index]
+        return f"{parent_path}{os.sep}{name}" if parent_path else name
+
+    def absolute_path(self, index: int) -> str:
+        """第 index 个条目的绝对路径"""
+        return self._root_prefix + self.relative_path(index)
+
+    def name(self, index: int) -> str:
+        """第 index 个条目的文件名（与扫描结果共用同一个字符串）"""
+        return self._names[index]
+
+    def info(self, index: int) -> FileInfo:
+        """生成第 index 个条目的 FileInfo"""
+        path = self.relative_path(index)
+        flags = self._flags[index]
+        return FileInfo(
+            path=path,
+            is_dir=bool(flags & FLAG_DIR),
+            original_path=self._root_prefix + path,
+            size=self._sizes[index],
+            mtime_ns=self._mtimes[index],
+            inode=self._inodes[index],
+            device=self._devices[index],
+            is_symlink=bool(flags & FLAG_SYMLINK)
+        )
+
+    @property
+    def entries(self) -> ScanEntries:
+        """所有条目，父目录总是排在其内容之前"""
+        return ScanEntries(self, range(len(self._names)))
+
+    @property
+    def file_indexes(self) -> array:
+        """所有文件条目的序号（按扫描顺序）"""
+        return self._file_indexes
+
+    @property
+    def files(self) -> ScanEntries:
+        return ScanEntries(self, self._file_indexes)
+
+    @property
+    def dirs(self) -> ScanEntries:
+        return ScanEntries(self, self._dir_indexes)
+
+    def file_paths(self) -> List[str]:
+        """所有文件的绝对路径"""
+        dir_prefixes = {-1: self._root_prefix}
+        for index, path in self._dir_paths.items():
+            dir_prefixes[index] = f"{self._root_prefix}{path}{os.sep}"
+        parents, names = self._parents, self._names
+        return [dir_prefixes[parents[index]] + names[index] for index in self._file_indexes]
+
+
+def _walk(root_path: str, on_error=None):
+    """
+    使用 os.scandir 遍历目录一次，逐个产生 (父目录序号, DirEntry, 是否目录, stat)。
+    序号按产生顺序从 0 开始，根目录下的条目父目录序号为 -1；父目录总是先于其内容产生。
+    """
+    pending = [(root_path, -1)]
+    index = 0
+    while pending:
+        current, parent = pending.pop()
+        try:
+            iterator = os.scandir(current)
+        except OSError as e:
+            if on_error:
+                on_error(current, e)
+            continue
+        with iterator:
+            for entry in iterator:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                yield parent, entry, is_dir, stat
+                if is_dir:
+                    pending.append((entry.path, index))
+                index += 1
+
+
+def iter_directory(root_path: str, on_error=None) -> Iterator[FileInfo]:
+    """
+    遍历目录，逐个产生条目（父目录总是先于其内容），
+    记录每个条目的类型、大小、修改时间和 inode。
+    on_error: 读取目录失败时的回调，参数为 (目录路径, 异常)
+    """
+    root_len = len(os.path.join(root_path, ""))
+    for _, entry, is_dir, stat in _walk(root_path, on_error):
+        yield FileInfo(
+            path=entry.path[root_len:],
+            is_dir=is_dir,
+            original_path=entry.path,
+            size=0 if is_dir else stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            inode=stat.st_ino,
+            device=stat.st_dev,
+            is_symlink=entry.is_symlink()
+        )
+
+
+@timed("scan_directory")
+def scan_directory(root_path: str, on_error=None) -> ScanResult:
+    """遍历目录并返回紧凑存储的扫描结果，on_error 同 iter_directory"""
+    scan = ScanResult(root_path)
+    for parent, entry, is_dir, stat in _walk(root_path, on_error):
+        scan.append(
+            parent, entry.name, is_dir, entry.is_symlink(),
+            0 if is_dir else stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev
+        )
+    scan.finish()
+    return scan
@@ -1,63 +1,274 @@
 import os
 import json
+import errno
 import shutil
-from dataclasses import dataclass
+import tempfile
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from move_journal import MoveJournal
+from directory_scanner import FileInfo, ScanResult, iter_directory
+from snapshot_manifest import SnapshotManifest
+from metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows 不支持
+    fcntl = None
+
+# Linux ioctl FICLONE，用于在支持写时复制的文件系统（Btrfs、XFS 等）上克隆文件
+FICLONE = 0x40049409
+
+# 备份方式名称
+BACKUP_STRATEGY_NAMES = {
+    "reflink": "写时复制(reflink)",
+    "hardlink": "硬链接",
+    "copy": "完整复制",
+}
+
+# 链接或克隆单个文件失败时，只有这些错误（文件系统或权限限制）才改为完整复制；
+# 其他错误（尤其是目标已存在）直接报错，绝不覆盖已有文件
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK}
+
+def reflink_file(src: str, dst: str):
+    """通过 FICLONE 克隆文件，不占用额外的数据块（目标已存在时报错）"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "当前平台不支持 reflink")
+    with open(src, "rb") as src_file, open(dst, "xb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            # 删除刚创建的空文件，以便改用其他方式复制
+            dst_file.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def hardlink_file(src: str, dst: str):
+    """创建硬链接（整理过程只会重命名文件，不会修改文件内容）"""
+    os.link(src, dst)
+
+def copy_file(src: str, dst: str):
+    """完整复制文件内容和元数据（目标已存在时报错，不会覆盖）"""
+    with open(src, "rb") as src_file, open(dst, "xb") as dst_file:
+        shutil.copyfileobj(src_file, dst_file)
+    shutil.copystat(src, dst)
+
+BACKUP_COPY_FUNCTIONS = {
+    "reflink": reflink_file,
+    "hardlink": hardlink_file,
+    "copy": copy_file,
+}
 
 @dataclass
-class FileInfo:
-    path: str
-    is_dir: bool
-    original_path: str
+class SnapshotDiff:
+    """两次快照之间的差异"""
+    added: List[FileInfo] = field(default_factory=list)
+    removed: List[FileInfo] = field(default_factory=list)
+    moved: List[Tuple[FileInfo, FileInfo]] = field(default_factory=list)  # (旧, 新)
+    modified: List[Tuple[FileInfo, FileInfo]] = field(default_factory=list)  # (旧, 新)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.moved or self.modified)
+
+    def summary(self) -> str:
+        return (f"新增 {len(self.added)} 项，删除 {len(self.removed)} 项，"
+                f"移动 {len(self.moved)} 项，修改 {len(self.modified)} 项")
 
 class DirectorySnapshot:
-    def __init__(self, root_path: str):
+    def __init__(self, root_path: str, backup_strategy: Optional[str] = None):
         self.root_path = root_path
         self.snapshot_time = datetime.now()
-        self.files: Dict[str, FileInfo] = {}
+        # 快照内容保存在磁盘上的清单中，程序重启后可通过 load / find_by_journal 重新打开
+        self.manifest: Optional[SnapshotManifest] = None
         self.backup_path: Optional[str] = None
-        
-    def take_snapshot(self):
-        """记录目录的当前状态"""
-        self.files.clear()
-        for root, dirs, files in os.walk(self.root_path):
-            # 记录目录
-            for dir_name in dirs:
-                full_path = os.path.join(root, dir_name)
-                rel_path = os.path.relpath(full_path, self.root_path)
-                self.files[rel_path] = FileInfo(
-                    path=rel_path,
-                    is_dir=True,
-                    original_path=full_path
-                )
-            
-            # 记录文件
-            for file_name in files:
-                full_path = os.path.join(root, file_name)
-                rel_path = os.path.relpath(full_path, self.root_path)
-                self.files[rel_path] = FileInfo(
-                    path=rel_path,
-                    is_dir=False,
-                    original_path=full_path
-                )
-    
-    def create_backup(self):
-        """创建目录的物理备份"""
+        # 备份方式：auto / reflink / hardlink / copy
+        self.backup_strategy = (backup_strategy or Config.BACKUP_STRATEGY).lower()
+        self.backup_strategy_used: Optional[str] = None
+        # 本次会话中每次整理操作的日志，还原时按相反顺序回放
+        self.journals: List[MoveJournal] = []
         timestamp = self.snapshot_time.strftime("%Y%m%d_%H%M%S")
-        backup_dir = os.path.join(os.path.dirname(self.root_path), f".backup_{timestamp}")
-        
+        self.trash_path = os.path.join(os.path.dirname(self.root_path), f".trash_{timestamp}")
+
+    @classmethod
+    def load(cls, manifest_path: str) -> "DirectorySnapshot":
+        """重新打开磁盘上的快照清单（如程序重启后），恢复备份和整理日志信息"""
+        manifest = SnapshotManifest(manifest_path)
+        snapshot = cls(manifest.root_path, manifest.get_meta("backup_strategy"))
+        snapshot.snapshot_time = datetime.fromisoformat(manifest.get_meta("time"))
+        timestamp = snapshot.snapshot_time.strftime("%Y%m%d_%H%M%S")
+        snapshot.trash_path = os.path.join(os.path.dirname(snapshot.root_path), f".trash_{timestamp}")
+        snapshot.manifest = manifest
+        snapshot.backup_path = manifest.get_meta("backup_path")
+        snapshot.backup_strategy_used = manifest.get_meta("backup_strategy_used")
+        snapshot.journals = [
+            MoveJournal(path) for path in manifest.get_meta("journals", [])
+            if os.path.exists(path)
+        ]
+        return snapshot
+
+    @classmethod
+    def find_by_journal(cls, root_path: str, journal_path: str) -> Optional["DirectorySnapshot"]:
+        """查找记录了指定整理日志的快照（整理前拍摄的快照），没有时返回 None"""
+        manifest_dir = SnapshotManifest.manifest_dir(Config.APP_DATA_DIR)
+        for path in reversed(SnapshotManifest.find_by_root(manifest_dir, root_path)):
+            manifest = SnapshotManifest(path)
+            try:
+                found = journal_path in manifest.get_meta("journals", [])
+            finally:
+                manifest.close()
+            if found:
+                return cls.load(path)
+        return None
+
+    @timed("take_snapshot")
+    def take_snapshot(self, scan: Optional[ScanResult] = None, temporary: bool = False):
+        """
+        记录目录的当前状态并写入快照清单，可直接使用已有的扫描结果；
+        没有扫描结果时边遍历边写入，内存占用与目录大小无关。
+        temporary 为 True 时使用临时清单（仅用于一次差异比较）。
+        """
+        if self.manifest is not None:
+            self.manifest.discard()
+        self.manifest = SnapshotManifest.create(
+            SnapshotManifest.manifest_dir(Config.APP_DATA_DIR),
+            self.root_path,
+            self.snapshot_time,
+            temporary=temporary,
+            keep=Config.SNAPSHOT_KEEP
+        )
+        self.manifest.set_meta("backup_strategy", self.backup_strategy)
+        if scan is not None:
+            entries = scan.entries
+        else:
+            entries = iter_directory(
+                self.root_path,
+                on_error=lambda path, e: print(f"读取目录失败：{path} - {str(e)}")
+            )
+        self.manifest.write_entries(entries)
+
+    def diff(self, other: "DirectorySnapshot") -> SnapshotDiff:
+        """
+        比较本快照与另一个（较新的）快照。
+        路径消失但同一 inode 出现在新路径上的视为移动；
+        路径相同但大小或修改时间不同的文件视为修改。
+        两个快照都在各自的清单中比较，只有差异部分会载入内存。
+        """
+        result = SnapshotDiff()
+        removed, added_entries, result.modified = self.manifest.compare(other.manifest)
+        added = {info.path: info for info in added_entries}
+
+        added_by_id = {info.file_id: path for path, info in added.items() if info.inode}
+        for old_info in removed:
+            new_path = added_by_id.get(old_info.file_id) if old_info.inode else None
+            # 重命名不会改变大小和修改时间，借此排除 inode 被新文件复用的情况
+            if new_path is not None and self._same_content(old_info, added[new_path]):
+                result.moved.append((old_info, added.pop(new_path)))
+            else:
+                result.removed.append(old_info)
+        result.added = list(added.values())
+        return result
+
+    @staticmethod
+    def _same_content(old_info: FileInfo, new_info: FileInfo) -> bool:
+        if old_info.is_dir != new_info.is_dir:
+            return False
+        return old_info.is_dir or (old_info.size == new_info.size and old_info.mtime_ns == new_info.mtime_ns)
+
+    def diff_with_current(self, scan: Optional[ScanResult] = None) -> SnapshotDiff:
+        """对目录重新拍摄快照（或使用给定的最新扫描结果），并返回与本快照的差异"""
+        current = DirectorySnapshot(self.root_path, self.backup_strategy)
+        current.take_snapshot(scan, temporary=True)
         try:
-            # 复制整个目录结构
-            shutil.copytree(self.root_path, backup_dir)
-            self.backup_path = backup_dir
+            return self.diff(current)
+        finally:
+            current.manifest.discard()
+
+    def _probe_strategy(self, strategy: str, backup_dir: str, probe_file: Optional[str]) -> bool:
+        """在备份目录中试用一次备份方式，判断当前文件系统是否支持"""
+        if strategy == "copy" or probe_file is None:
+            return True
+        probe_target = os.path.join(backup_dir, ".backup_probe")
+        try:
+            os.makedirs(backup_dir, exist_ok=True)
+            BACKUP_COPY_FUNCTIONS[strategy](probe_file, probe_target)
             return True
+        except OSError:
+            return False
+        finally:
+            if os.path.exists(probe_target):
+                os.remove(probe_target)
+
+    def _candidate_strategies(self) -> List[str]:
+        """按优先级返回要尝试的备份方式"""
+        if self.backup_strategy in BACKUP_COPY_FUNCTIONS:
+            # 指定的方式不可用时仍回退到完整复制
+            return [self.backup_strategy] if self.backup_strategy == "copy" else [self.backup_strategy, "copy"]
+        return ["reflink", "hardlink", "copy"]
+
+    def _copy_entries(self, backup_dir: str, copy_function):
+        """按快照清单在（新建的空）备份目录中重建目录结构并复制文件"""
+        for entry in self.manifest.iter_entries():
+            target = os.path.join(backup_dir, entry.path)
+            if entry.is_dir:
+                # 父目录总是先于其内容，不使用 exist_ok，遇到已存在的目录直接报错
+                os.mkdir(target)
+            elif entry.is_symlink:
+                os.symlink(os.readlink(entry.original_path), target)
+            else:
+                try:
+                    copy_function(entry.original_path, target)
+                except OSError as e:
+                    # 个别文件无法链接（如跨设备、权限或链接数限制）时单独完整复制
+                    if copy_function is copy_file or e.errno not in FALLBACK_ERRNOS:
+                        raise
+                    copy_file(entry.original_path, target)
+
+    @timed("create_backup")
+    def create_backup(self):
+        """创建目录的物理备份（优先使用 reflink / 硬链接，避免复制文件数据）"""
+        timestamp = self.snapshot_time.strftime("%Y%m%d_%H%M%S")
+        backup_dir = None
+
+        try:
+            # 每次备份都新建一个唯一的空目录，同一秒内备份多个相邻目录也不会共用
+            backup_dir = tempfile.mkdtemp(prefix=f".backup_{timestamp}_", dir=os.path.dirname(self.root_path))
+            if self.manifest is None:
+                self.take_snapshot()
+            probe_entry = self.manifest.first_regular_file()
+            probe_file = probe_entry.original_path if probe_entry else None
+            for strategy in self._candidate_strategies():
+                if not self._probe_strategy(strategy, backup_dir, probe_file):
+                    continue
+                # 复用快照清单复制整个目录结构，文件按所选方式复制
+                self._copy_entries(backup_dir, BACKUP_COPY_FUNCTIONS[strategy])
+                self.backup_path = backup_dir
+                self.backup_strategy_used = strategy
+                self.manifest.set_meta("backup_path", backup_dir)
+                self.manifest.set_meta("backup_strategy_used", strategy)
+                return True
+            return False
         except Exception as e:
             print(f"创建备份失败：{str(e)}")
+            if backup_dir is not None:
+                shutil.rmtree(backup_dir, ignore_errors=True)
             return False
     
+    def begin_journal(self, plan: Optional[Dict[str, List[str]]] = None) -> MoveJournal:
+        """开始记录一次整理操作"""
+        journal = MoveJournal.create(MoveJournal.journal_dir(Config.APP_DATA_DIR), self.root_path, plan)
+        self.journals.append(journal)
+        if self.manifest is not None:
+            self.manifest.set_meta("journals", [item.path for item in self.journals])
+        return journal
+
+    @timed("restore")
     def restore(self) -> bool:
         """还原到初始状态"""
+        if any(journal.operation_count for journal in self.journals):
+            return self.restore_from_journals()
+
         if not self.backup_path or not os.path.exists(self.backup_path):
             return False
         
@@ -70,26 +281,67 @@ class DirectorySnapshot:
                 elif os.path.isdir(item_path):
                     shutil.rmtree(item_path)
             
-            # 从备份中复制所有内容
+            # 从备份中复制所有内容（沿用备份时的方式，硬链接/reflink 备份可以快速还原）
+            copy_function = BACKUP_COPY_FUNCTIONS.get(self.backup_strategy_used, copy_file)
             for item in os.listdir(self.backup_path):
                 src_path = os.path.join(self.backup_path, item)
                 dst_path = os.path.join(self.root_path, item)
                 if os.path.isfile(src_path):
-                    shutil.copy2(src_path, dst_path)
+                    copy_function(src_path, dst_path)
                 else:
-                    shutil.copytree(src_path, dst_path)
+                    shutil.copytree(src_path, dst_path, copy_function=copy_function)
             
             return True
         except Exception as e:
             print(f"还原失败：{str(e)}")
             return False
+
+    def restore_from_journals(self) -> bool:
+        """按相反顺序回放整理日志，只撤销实际执行过的操作"""
+        success = True
+        while self.journals:
+            journal = self.journals.pop()
+            try:
+                if journal.rollback():
+                    journal.discard()
+                else:
+                    success = False
+            except Exception as e:
+                print(f"还原失败：{str(e)}")
+                success = False
+        return success
     
     def cleanup_backup(self):
-        """清理备份目录"""
-        if self.backup_path and os.path.exists(self.backup_path):
-            try:
-                shutil.rmtree(self.backup_path)
-                return True
-            except Exception:
-                return False
-        return False
\ No newline at end of file
+        """清理备份目录、回收目录、整理日志和快照清单"""
+        # 未完成的日志保留下来，下次打开该目录时可以继续或回滚
+        unfinished = False
+        for journal in self.journals:
+            if journal.is_finished or not journal.operation_count:
+                journal.discard()
+            else:
+                journal.close()
+                unfinished = True
+        self.journals.clear()
+        if self.manifest is not None:
+            # 有未完成的日志时保留快照清单，下次继续或回滚后仍可用于核对
+            if unfinished:
+                self.manifest.close()
+            else:
+                self.manifest.discard()
+            self.manifest = None
+        if not unfinished and os.path.exists(self.trash_path):
+            shutil.rmtree(self.trash_path, ignore_errors=True)
+        return self.remove_backup()
+
+    def remove_backup(self) -> bool:
+        """删除备份目录，返回是否删除成功"""
+        if not self.backup_path or not os.path.exists(self.backup_path):
+            return False
+        try:
+            shutil.rmtree(self.backup_path)
+        except Exception:
+            return False
+        self.backup_path = None
+        if self.manifest is not None:
+            self.manifest.set_meta("backup_path", None)
+        return True
\ No newline at end of file
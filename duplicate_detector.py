@@ -0,0 +1,169 @@
+import os
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List
+from config import Config
+from cancellation import OperationCancelled
+
+# 部分哈希读取文件开头和结尾各多少字节
+PARTIAL_HASH_BYTES = 64 * 1024
+
+# 完整哈希时每次送入哈希函数的数据量
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def partial_hash(path, size):
+    """读取文件开头和结尾各一小块计算哈希，快速排除内容不同的文件"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES:
+            f.seek(max(PARTIAL_HASH_BYTES, size - PARTIAL_HASH_BYTES))
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def full_hash(path, cancel_token=None):
+    """
+    通过内存映射计算整个文件的哈希（计算期间会释放 GIL，可多线程并行）。
+    提供 cancel_token 时每处理一块数据检查一次，大文件也能及时响应取消。
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # 扫描后被清空的文件（mmap 不能映射空文件），由调用方作为读取失败处理
+            raise ValueError("文件在扫描后已被清空")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for start in range(0, len(mapped), HASH_BLOCK_SIZE):
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    digest.update(view[start:start + HASH_BLOCK_SIZE])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+@dataclass
+class DuplicateReport:
+    """重复文件检测结果，每组的第一个路径为保留的代表文件"""
+    groups: List[List[str]] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._copies = {path: group[0] for group in self.groups for path in group[1:]}
+
+    @property
+    def duplicate_count(self) -> int:
+        """多余副本的数量"""
+        return len(self._copies)
+
+    def is_empty(self) -> bool:
+        return not self.groups
+
+    def unique_paths(self, paths: List[str]) -> List[str]:
+        """去掉多余副本，每组只保留代表文件"""
+        return [path for path in paths if path not in self._copies]
+
+    def apply(self, category_mapping: Dict[str, List[str]], action=None) -> Dict[str, List[str]]:
+        """
+        根据处理方式补充分类方案：
+        report 只报告，多余副本留在原处；quarantine 将多余副本移入重复文件目录。
+        """
+        action = action or Config.DUPLICATE_ACTION
+        if action != "quarantine" or not self._copies:
+            return category_mapping
+        mapping = {category: list(files) for category, files in category_mapping.items()}
+        mapping.setdefault(Config.DUPLICATE_DIR_NAME, []).extend(self._copies)
+        return mapping
+
+    def summary(self) -> str:
+        return f"发现 {len(self.groups)} 组重复文件，共 {self.duplicate_count} 个多余副本"
+
+    def describe(self, root_path) -> List[str]:
+        """生成日志或报告中的重复文件列表"""
+        lines = []
+        for group in self.groups:
+            lines.append(f"- {os.path.relpath(group[0], root_path)}")
+            for path in group[1:]:
+                lines.append(f"    重复：{os.path.relpath(path, root_path)}")
+        return lines
+
+
+class DuplicateDetector:
+    """
+    分阶段检测重复文件：先按文件大小分组，再比较开头和结尾的部分哈希，
+    最后只对仍然相同的候选计算完整哈希。同一文件的硬链接不会重复读取。
+    提供 cancel_token 时逐个文件检查，取消后 detect 抛出 OperationCancelled。
+    """
+
+    def __init__(self, max_workers=None, on_error=None, cancel_token=None):
+        self.max_workers = max(1, max_workers or Config.HASH_WORKERS)
+        self.on_error = on_error
+        self.cancel_token = cancel_token
+
+    def _hash_groups(self, groups, hash_func):
+        """对每组候选并行计算哈希，按哈希值拆分后只保留仍有多个文件的组"""
+        entries = [entry for group in groups for entry in group]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._safe_hash, hash_func, entry) for entry in entries]
+            try:
+                digests = [future.result() for future in futures]
+            except OperationCancelled:
+                # 尚未开始的文件不再计算，正在计算的文件在下一块数据前停止
+                for future in futures:
+                    future.cancel()
+                raise
+        result = []
+        position = 0
+        for group in groups:
+            by_digest = {}
+            for entry in group:
+                digest = digests[position]
+                position += 1
+                if digest is not None:
+                    by_digest.setdefault(digest, []).append(entry)
+            result.extend(candidates for candidates in by_digest.values() if len(candidates) > 1)
+        return result
+
+    def _safe_hash(self, hash_func, entry):
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+        try:
+            return hash_func(entry)
+        except (OSError, ValueError) as e:
+            # 扫描后被删除、清空或无法读取的文件不参与比较，只报告错误
+            if self.on_error:
+                self.on_error(entry.original_path, e)
+            return None
+
+    def detect(self, files) -> DuplicateReport:
+        """检测 FileInfo 列表（如 ScanResult.files）中的重复文件"""
+        # 同一 inode 的硬链接只取一个参与比较
+        by_size = {}
+        seen_inodes = {}
+        for entry in files:
+            if entry.is_symlink or entry.size == 0:
+                continue
+            inode_key = (entry.device, entry.inode)
+            if entry.inode and inode_key in seen_inodes:
+                continue
+            seen_inodes[inode_key] = entry
+            by_size.setdefault(entry.size, []).append(entry)
+        groups = [group for group in by_size.values() if len(group) > 1]
+
+        groups = self._hash_groups(groups, lambda entry: partial_hash(entry.original_path, entry.size))
+        # 小文件的部分哈希已经覆盖全部内容
+        large_groups = [group for group in groups if group[0].size > 2 * PARTIAL_HASH_BYTES]
+        small_groups = [group for group in groups if group[0].size <= 2 * PARTIAL_HASH_BYTES]
+        groups = small_groups + self._hash_groups(large_groups, lambda entry: full_hash(entry.original_path, self.cancel_token))
+
+        path_groups = []
+        for group in groups:
+            # 路径最短（层级最浅）的文件作为代表
+            paths = sorted((entry.original_path for entry in group), key=lambda path: (path.count(os.sep), len(path), path))
+            path_groups.append(paths)
+        path_groups.sort(key=lambda paths: paths[0])
+        return DuplicateReport(path_groups)
@@ -0,0 +1,115 @@
+import os
+from directory_scanner import scan_directory
+
+
+class FileIndex:
+    """
+    文件名到路径的多值索引。
+    同一文件名可能出现在不同子目录中，因此每个文件名对应多个路径。
+    由扫描结果建立时只记录条目序号（文件名与扫描结果共用同一个字符串），路径在查找时才生成。
+    """
+
+    def __init__(self, root_path, scan=None):
+        self.root_path = root_path
+        self._scan = scan
+        # 文件名 -> 条目：扫描结果中的序号（int）或之后添加的路径（str），
+        # 多个同名文件时为列表，大多数文件名只对应一个条目，不额外创建列表
+        self._by_name = {}
+        self._count = 0
+
+    @classmethod
+    def build(cls, root_path):
+        """扫描目录一次并建立索引"""
+        return cls.from_scan(scan_directory(root_path))
+
+    @classmethod
+    def from_scan(cls, scan):
+        """根据已有的扫描结果建立索引"""
+        index = cls(scan.root_path, scan)
+        for entry_index in scan.file_indexes:
+            index._put(scan.name(entry_index), entry_index)
+        return index
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, path):
+        path = os.path.normpath(path)
+        return path in self._paths(os.path.basename(path))
+
+    def _items(self, name):
+        items = self._by_name.get(name)
+        if items is None:
+            return []
+        return items if isinstance(items, list) else [items]
+
+    def _path(self, item):
+        return item if isinstance(item, str) else os.path.normpath(self._scan.absolute_path(item))
+
+    def _paths(self, name):
+        return [self._path(item) for item in self._items(name)]
+
+    def _put(self, name, item):
+        items = self._by_name.get(name)
+        if items is None:
+            self._by_name[name] = item
+        elif isinstance(items, list):
+            items.append(item)
+        else:
+            self._by_name[name] = [items, item]
+        self._count += 1
+
+    def add(self, path):
+        """添加文件路径"""
+        path = os.path.normpath(path)
+        name = os.path.basename(path)
+        if path in self._paths(name):
+            return
+        self._put(name, path)
+
+    def remove(self, path):
+        """移除文件路径"""
+        path = os.path.normpath(path)
+        name = os.path.basename(path)
+        items = self._items(name)
+        remaining = [item for item in items if self._path(item) != path]
+        if len(remaining) == len(items):
+            return
+        self._count -= len(items) - len(remaining)
+        if not remaining:
+            del self._by_name[name]
+        else:
+            self._by_name[name] = remaining if len(remaining) > 1 else remaining[0]
+
+    def move(self, src_path, dst_path):
+        """文件移动后更新索引"""
+        self.remove(src_path)
+        self.add(dst_path)
+
+    def lookup(self, file_name):
+        """
+        查找文件，返回候选路径列表。
+        file_name 可以是绝对路径、相对于根目录的路径或单纯的文件名；
+        能精确匹配路径时只返回该路径，否则返回所有同名文件。
+        """
+        if os.path.isabs(file_name):
+            candidate = os.path.normpath(file_name)
+        else:
+            candidate = os.path.normpath(os.path.join(self.root_path, file_name))
+        name = os.path.basename(candidate)
+        paths = []
+        for item in self._items(name):
+            path = self._path(item)
+            if path == candidate:
+                return [candidate]
+            paths.append(path)
+        if name == os.path.basename(file_name):
+            return paths
+        return self._paths(os.path.basename(file_name))
+
+    def duplicates(self):
+        """返回所有存在重名的文件 {文件名: [路径, ...]}"""
+        return {
+            name: self._paths(name) for name, items in self._by_name.items()
+            if isinstance(items, list) and len(items) > 1
+        }
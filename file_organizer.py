@@ -0,0 +1,191 @@
+import os
+import json
+import heapq
+from datetime import datetime
+from file_index import FileIndex
+from move_journal import MoveJournal
+from move_executor import MoveExecutor
+from metrics import get_metrics, timed
+
+
+class FileOrganizer:
+    """
+    按分类方案整理目录：移动文件、清理空目录、保存分析报告。
+    不依赖任何界面库，图形界面和命令行共用。
+    所有修改目录的操作都记录在 journal 中，便于还原。
+    """
+
+    def __init__(self, root_path, journal: MoveJournal, file_index: FileIndex = None,
+                 trash_dir=None, log=print):
+        self.root_path = root_path
+        self.journal = journal
+        self.file_index = file_index
+        self.trash_dir = trash_dir or f"{journal.path}.trash"
+        self.log = log
+        self.vacated_dirs = set()  # 本次移走过文件的源目录，整理后只检查这些目录是否变空
+        self.stats = {"moved": 0, "skipped": 0, "failed": 0, "removed_dirs": 0, "cancelled": False}
+
+    def find_file(self, file_name):
+        """通过文件索引查找文件，同名文件不唯一时报告并返回 None"""
+        if self.file_index is None:
+            self.file_index = FileIndex.build(self.root_path)
+        candidates = self.file_index.lookup(file_name)
+        if not candidates:
+            self.log(f"警告：未找到文件'{file_name}'")
+            return None
+        if len(candidates) > 1:
+            self.log(f"警告：存在 {len(candidates)} 个同名文件'{file_name}'，无法确定要移动哪一个，已跳过：")
+            for path in candidates:
+                self.log(f"  - {os.path.relpath(path, self.root_path)}")
+            return None
+        return candidates[0]
+
+    def plan_moves(self, category_mapping):
+        """
+        生成移动方案 [(源路径, 目标路径, 原文件名, 分类), ...]。
+        无法定位的文件、重复出现的文件以及目标位置已被占用的文件会被跳过。
+        """
+        moves = []
+        moved_files = set()
+        targets = set()
+        for category, files in category_mapping.items():
+            category_dir = os.path.join(self.root_path, category)
+            for file_name in files:
+                if file_name in moved_files:
+                    self.log(f"警告：文件'{file_name}'已经被移动过")
+                    self.stats["skipped"] += 1
+                    continue
+
+                src_file = self.find_file(file_name)
+                if not src_file:
+                    self.stats["skipped"] += 1
+                    continue
+                moved_files.add(file_name)
+                dst_file = os.path.join(category_dir, os.path.basename(src_file))
+                if os.path.normpath(src_file) == os.path.normpath(dst_file):
+                    continue
+                if dst_file in targets or os.path.lexists(dst_file):
+                    self.log(f"警告：'{category}'中已存在同名文件，跳过'{file_name}'")
+                    self.stats["skipped"] += 1
+                    continue
+                targets.add(dst_file)
+                moves.append((src_file, dst_file, file_name, category))
+        return moves
+
+    @timed("move_files")
+    def move_files(self, category_mapping, on_progress=None, should_cancel=None):
+        """
+        移动文件到对应目录。
+        每个分类目录只创建一次，移动操作由线程池并行执行；
+        on_progress(已完成数, 总数) 报告进度，should_cancel 返回 True 时停止后续移动。
+        """
+        moves = self.plan_moves(category_mapping)
+        for category_dir in sorted({os.path.dirname(dst) for _, dst, _, _ in moves}):
+            self.journal.makedirs(category_dir)
+
+        sources = {src: (file_name, category) for src, _, file_name, category in moves}
+        total = len(moves)
+        done = 0
+
+        def on_result(src, dst, error):
+            nonlocal done
+            done += 1
+            file_name, category = sources[src]
+            if error is None:
+                self.file_index.move(src, dst)
+                self.vacated_dirs.add(os.path.dirname(src))
+                self.stats["moved"] += 1
+                self.log(f"已移动：'{file_name}' -> {category}")
+            else:
+                self.stats["failed"] += 1
+                self.log(f"移动文件'{file_name}'时出错：{str(error)}")
+            if on_progress:
+                on_progress(done, total)
+
+        executor = MoveExecutor(self.journal)
+        if not executor.run([(src, dst) for src, dst, _, _ in moves], on_result, should_cancel):
+            self.stats["cancelled"] = True
+            self.log(f"已取消：完成 {done}/{total} 个文件的移动")
+        return self.stats
+
+    @timed("cleanup_empty_dirs")
+    def cleanup_empty_dirs(self, dirs=None):
+        """
+        清理移动后变空的目录（只含隐藏文件如 .DS_Store 的目录同样视为空目录，
+        其中的隐藏文件移入回收目录以便还原）。
+        只检查 dirs（默认为本次移走过文件的源目录）及其上级目录，不遍历整个目录树。
+        """
+        root_path = os.path.abspath(self.root_path)
+        dirs = self.vacated_dirs if dirs is None else dirs
+        # 按深度从深到浅处理，子目录删除后再检查上级目录
+        heap = []
+        queued = set()
+
+        def enqueue(dir_path):
+            dir_path = os.path.abspath(dir_path)
+            if dir_path in queued or dir_path == root_path or not dir_path.startswith(root_path + os.sep):
+                return
+            queued.add(dir_path)
+            heapq.heappush(heap, (-dir_path.count(os.sep), dir_path))
+
+        for dir_path in dirs:
+            enqueue(dir_path)
+
+        while heap:
+            _, dir_path = heapq.heappop(heap)
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            if any(not entry.name.startswith('.') or not entry.is_file(follow_symlinks=False) for entry in entries):
+                continue
+
+            # 删除隐藏文件（如 .DS_Store）
+            try:
+                for entry in entries:
+                    self.journal.remove(entry.path, self.trash_dir)
+                    self.log(f"已删除隐藏文件：{os.path.relpath(entry.path, self.root_path)}")
+                self.journal.rmdir(dir_path)
+                self.stats["removed_dirs"] += 1
+                self.log(f"已删除空目录：{os.path.relpath(dir_path, self.root_path)}")
+            except OSError as e:
+                self.log(f"删除目录失败：{os.path.relpath(dir_path, self.root_path)} - {str(e)}")
+                continue
+            enqueue(os.path.dirname(dir_path))
+
+    def save_analysis_report(self, category_mapping, log_text=""):
+        """保存分析报告，返回报告路径"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_path = os.path.join(self.root_path, f"file_analysis_report_{timestamp}.txt")
+        self.journal.record_create(report_path)
+
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write("文件分类分析报告\n")
+            f.write("=" * 50 + "\n\n")
+            f.write(f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"目录路径：{self.root_path}\n\n")
+            f.write("分类结果：\n")
+            f.write(json.dumps(category_mapping, ensure_ascii=False, indent=2))
+            summary_lines = get_metrics().summary_lines()
+            if summary_lines:
+                f.write("\n\n性能统计：\n")
+                f.write("\n".join(summary_lines))
+            f.write("\n\n处理日志：\n")
+            f.write(log_text)
+        return report_path
+
+    @classmethod
+    def resume(cls, journal: MoveJournal, log=print):
+        """
+        继续执行中断的整理操作：按日志中记录的方案重新整理，已移动的文件会被跳过。
+        与正常整理一样保留提交后的日志和回收目录，之后仍可撤销（包括中断前已执行的操作）。
+        """
+        # 沿用中断前使用的回收目录，删除的隐藏文件集中在一处，撤销时都能找回
+        organizer = cls(journal.root, journal, trash_dir=journal.trash_dir, log=log)
+        # 中断前已执行的移动同样可能留下空目录
+        vacated_dirs = {os.path.dirname(entry["src"]) for entry in journal.entries if entry.get("op") == "move"}
+        organizer.move_files(journal.plan)
+        organizer.cleanup_empty_dirs(vacated_dirs | organizer.vacated_dirs)
+        journal.commit()
+        return organizer.stats
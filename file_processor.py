@@ -1,25 +1,183 @@
 import os
-import requests
-import json
-import re
-import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from config import Config  # 导入配置类
+from classification_cache import ClassificationCache
+from api_client import get_shared_client
+from rule_classifier import RuleClassifier
+from prompt_encoding import EncodedFileList
+from json_utils import IncrementalObjectParser, extract_json_value
+from content_extractor import ContentExtractor
+from metrics import get_metrics, timed
+from cancellation import OperationCancelled
+
+# 分析阶段提示词
+ANALYSIS_PROMPT_TEMPLATE = (
+    "你是一个专业的文件分类助手。请分析以下文件列表，完成以下任务：\n\n"
+    "任务1 - 分析和理解：\n"
+    "1. 理解文件的主题和类型\n"
+    "2. 识别文件之间的关联性\n"
+    "3. 发现可能的分类维度\n"
+    "4. 确定合适的分类层次\n\n"
+    "任务2 - 提供分类建议：\n"
+    "1. 建议最合适的分类方案\n"
+    "2. 说明分类的理由\n"
+    "3. 解释分类的优势\n\n"
+    "文件列表（为节省篇幅，目录用目录表编号表示）：\n"
+    "{file_list}"
+    "\n\n请提供你的分析和建议。"
+)
+
+# 分类阶段提示词
+CLASSIFICATION_PROMPT_TEMPLATE = (
+    "基于以下分析结果，请将文件按照最优的分类方案进行分类，并以JSON格式返回。\n\n"
+    "分析结果：\n"
+    "{analysis_text}\n\n"
+    "{taxonomy_hint}"
+    "要求：\n"
+    "1. 使用最合适的分类层次\n"
+    "2. 分类名称要清晰易懂\n"
+    "3. 可以使用层级结构（用'/'分隔）\n"
+    "4. 确保分类逻辑合理\n"
+    "5. 返回格式为JSON，可以使用markdown代码块\n"
+    "6. JSON中只使用文件编号（整数）表示文件，不要写文件名或路径\n\n"
+    "示例格式：\n"
+    "```json\n"
+    "{{\n"
+    '  "主分类/子分类": [0, 3],\n'
+    '  "另一分类": [1, 2]\n'
+    "}}\n"
+    "```\n\n"
+    "需要分类的文件：\n"
+    "{file_list}"
+)
+
+# 分批分类时共享的分类体系提示
+TAXONOMY_HINT_TEMPLATE = (
+    "已有分类体系（请优先使用以下分类名称，确有必要时才新增分类）：\n"
+    "{taxonomy}\n\n"
+)
+
+# 结构化输出模式的单次分类提示词
+STRUCTURED_PROMPT_TEMPLATE = (
+    "你是一个专业的文件分类助手。请理解以下文件的主题和类型，"
+    "按照最合适的分类方案对所有文件进行分类。\n\n"
+    "{taxonomy_hint}"
+    "要求：\n"
+    "1. 使用最合适的分类层次\n"
+    "2. 分类名称要清晰易懂\n"
+    "3. 可以使用层级结构（用'/'分隔）\n"
+    "4. 直接返回一个JSON对象，键为分类名称，值为该分类下的文件编号（整数）列表，不要输出其他内容\n\n"
+    "文件列表（为节省篇幅，目录用目录表编号表示）：\n"
+    "{file_list}"
+)
+
+# 分级路由时快速模型使用的提示词：分类的同时给出每个文件的置信度
+ROUTING_PROMPT_TEMPLATE = (
+    "你是一个专业的文件分类助手。请理解以下文件的主题和类型，"
+    "按照最合适的分类方案对所有文件进行分类，并给出每个文件分类的把握程度。\n\n"
+    "{taxonomy_hint}"
+    "要求：\n"
+    "1. 使用最合适的分类层次\n"
+    "2. 分类名称要清晰易懂\n"
+    "3. 可以使用层级结构（用'/'分隔）\n"
+    "4. 直接返回一个JSON对象，键为分类名称，值为 [文件编号, 置信度] 的列表，"
+    "置信度为 0 到 1 之间的小数，不要输出其他内容\n"
+    "5. 仅凭现有信息无法判断的文件请给出较低的置信度，或归入\"{uncategorized}\"\n\n"
+    "示例格式：\n"
+    '{{"主分类/子分类": [[0, 0.95], [3, 0.6]], "{uncategorized}": [[1, 0.2]]}}\n\n'
+    "文件列表（为节省篇幅，目录用目录表编号表示）：\n"
+    "{file_list}"
+)
+
+# 快速模型无法分类时使用的分类名称（这些文件总是交给主模型）
+UNCATEGORIZED_NAMES = ("未分类", "其他", "uncategorized", "Uncategorized")
+
+# 结构化输出模式下的分析说明
+STRUCTURED_ANALYSIS_TEXT = "结构化输出模式：单次请求直接返回分类结果，未生成分析说明。"
+
+# 按已有分类体系增量分类时的分析说明
+TAXONOMY_ANALYSIS_TEXT = "按已有的分类体系直接分类，未生成分析说明。"
+
+# 分级路由的分析说明
+ROUTED_ANALYSIS_TEXT = "分级模型路由：{fast_model} 确定分类 {confident} 个文件，{escalated} 个低置信度文件交由 {model} 分类。"
+
+# 提示词版本：提示词模板变化后缓存自动失效
+PROMPT_VERSION = hashlib.sha1(
+    (ANALYSIS_PROMPT_TEMPLATE + CLASSIFICATION_PROMPT_TEMPLATE + TAXONOMY_HINT_TEMPLATE
+     + STRUCTURED_PROMPT_TEMPLATE + ROUTING_PROMPT_TEMPLATE).encode("utf-8")
+).hexdigest()[:12]
+
+# 分析被取消时的说明
+CANCELLED_ANALYSIS_TEXT = "分析已取消，以下为取消前已完成分类的 {count} 个文件。"
+
+# 全部文件在本地完成分类时的分析说明
+LOCAL_ANALYSIS_TEXT = "所有文件均已通过本地规则或分类缓存完成分类，未调用大模型。"
+
+# 大模型分类失败、只有本地结果时的说明
+LOCAL_ONLY_ANALYSIS_TEXT = "大模型分类失败，以下为本地规则和分类缓存确定分类的 {count} 个文件。"
 
 class FileProcessor:
-    def __init__(self, api_key=None, model_name=None, temperature=None):
+    def __init__(self, api_key=None, model_name=None, temperature=None, fast_model_name=None):
         """
         初始化 FileProcessor 类。
         参数：
         - api_key: API 密钥（可选，默认从 Config 中读取）
         - model_name: 模型名称（可选，默认从 Config 中读取）
         - temperature: 随机性参数（可选，默认从 Config 中读取）
+        - fast_model_name: 分级路由使用的快速模型（可选，默认从 Config 中读取，为空时不启用）
         """
         self.api_key = api_key or Config.API_KEY
         self.model_name = model_name or Config.MODEL_NAME
         self.temperature = temperature or Config.TEMPERATURE
-        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:generateContent?key={self.api_key}"
+        self.api_url = self.model_url(self.model_name)
+        self.stream_url = self.model_url(self.model_name, stream=True)
+        # 分级模型路由：快速模型先分类，低置信度的文件再交给主模型
+        self.fast_model_name = fast_model_name or Config.FAST_MODEL_NAME
+        if self.fast_model_name == self.model_name:
+            self.fast_model_name = ""
+        self.fast_api_url = self.model_url(self.fast_model_name) if self.fast_model_name else None
+        self.confidence_threshold = Config.CONFIDENCE_THRESHOLD
+        # 结构化输出模式：单次流式请求直接返回 JSON 分类结果
+        self.structured_output = Config.STRUCTURED_OUTPUT
+        # 每完成一个分类时的回调，参数为 (分类名称, 文件路径列表)
+        self.on_category = None
+        # 取消令牌（可选）：取消后不再发起新的请求，正在进行的请求也不再等待
+        self.cancel_token = None
+        self.cancelled = False
+        # 本次分析中已经完成分类的文件，取消时作为部分结果返回
+        self.completed_mapping = {}
+        self._completed_lock = threading.Lock()
         self.supported_types = ['.txt', '.pdf', '.docx', '.doc', '.epub', '.mobi']
+        # 内容摘要（可选）：{文件路径: 摘要}，在请求大模型之前提取
+        self.content_extractor = ContentExtractor(self.supported_types) if Config.ENABLE_CONTENT_SNIPPETS else None
+        self.snippets = {}
+        self.batch_token_budget = Config.BATCH_TOKEN_BUDGET
+        self.max_workers = max(1, Config.MAX_WORKERS)
+        # 共享连接池、限速和自适应并发控制
+        self.client = get_shared_client()
+        self.rule_classifier = None
+        if Config.ENABLE_RULE_CLASSIFIER:
+            try:
+                self.rule_classifier = RuleClassifier.from_file(Config.RULES_FILE)
+            except Exception as e:
+                print(f"加载分类规则失败，将不使用本地规则：{str(e)}")
+        self.cache = None
+        if Config.ENABLE_CLASSIFICATION_CACHE:
+            try:
+                self.cache = ClassificationCache(
+                    os.path.join(Config.APP_DATA_DIR, "classification_cache.db"),
+                    # 分级路由的结果同时取决于两个模型
+                    f"{self.fast_model_name}+{self.model_name}" if self.fast_model_name else self.model_name,
+                    self.temperature,
+                    PROMPT_VERSION,
+                    max_entries=Config.CACHE_MAX_ENTRIES
+                )
+            except Exception as e:
+                print(f"初始化分类缓存失败，将不使用缓存：{str(e)}")
 
+    @timed("extract_json_from_text")
     def extract_json_from_text(self, text):
         """从文本中提取JSON字符串"""
         if isinstance(text, dict):
@@ -37,44 +195,21 @@ class FileProcessor:
         if not isinstance(text, str):
             return None
         
-        # 首先尝试提取markdown代码块中的JSON
-        json_block_pattern = r'```json\s*([\s\S]*?)\s*```'
-        json_blocks = re.findall(json_block_pattern, text)
-        
-        for block in json_blocks:
-            try:
-                json_obj = json.loads(block.strip())
-                if isinstance(json_obj, dict) and all(isinstance(v, list) for v in json_obj.values()):
-                    return json_obj
-            except json.JSONDecodeError:
-                continue
-        
-        # 如果没有找到有效的markdown代码块，尝试其他模式
-        json_patterns = [
-            r'\{[\s\S]*\}',           # 标准JSON对象
-            r'\[[\s\S]*\]',           # JSON数组
-            r'\{[^{}]*\}'             # 最小JSON对象
-        ]
-        
-        for pattern in json_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                try:
-                    # 清理可能的干扰字符
-                    cleaned_match = re.sub(r'[\r\n]+', '\n', match)
-                    cleaned_match = re.sub(r'(?<!\\)"', '"', cleaned_match) # 修复引号
-                    json_obj = json.loads(cleaned_match)
-                    # 验证结果是否符合预期格式（字典，且值为列表）
-                    if isinstance(json_obj, dict) and all(isinstance(v, list) for v in json_obj.values()):
-                        return json_obj
-                except json.JSONDecodeError:
-                    continue
-        
-        return None
+        # 优先从 markdown 代码块开始查找，找不到再扫描全文
+        block_start = text.find("```json")
+        if block_start >= 0:
+            json_obj = extract_json_value(text, self.is_category_mapping, block_start)
+            if json_obj is not None:
+                return json_obj
+        return extract_json_value(text, self.is_category_mapping)
+
+    @staticmethod
+    def is_category_mapping(value):
+        """验证结果是否符合预期格式（字典，且值为列表）"""
+        return isinstance(value, dict) and all(isinstance(v, list) for v in value.values())
 
-    def call_google_api(self, prompt, max_retries=3):
-        """调用Google API并处理重试逻辑"""
-        headers = {'Content-Type': 'application/json'}
+    def build_payload(self, prompt, json_mode=False):
+        """构造请求体，json_mode 为 True 时要求模型直接输出 JSON"""
         payload = {
             "contents": [{
                 "parts": [{
@@ -84,90 +219,460 @@ class FileProcessor:
             "generationConfig": {
                 "temperature": self.temperature,
                 "topP": 0.8,
-                "topK": 40,
-                "stopSequences": ["}"]
+                "topK": 40
             }
         }
-        
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code == 429:  # Rate limit
-                    wait_time = (attempt + 1) * 2
-                    print(f"达到速率限制，等待{wait_time}秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"API调用失败（尝试 {attempt + 1}/{max_retries}）：{response.text}")
-                    time.sleep(1)
-            except Exception:
-                print(f"API调用出错（尝试 {attempt + 1}/{max_retries}）：{str(e)}")
-                time.sleep(1)
+        if json_mode:
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+        return payload
+
+    def model_url(self, model_name, stream=False):
+        """构造指定模型的请求地址"""
+        if stream:
+            return f"{Config.API_BASE_URL}/models/{model_name}:streamGenerateContent?alt=sse&key={self.api_key}"
+        return f"{Config.API_BASE_URL}/models/{model_name}:generateContent?key={self.api_key}"
+
+    def call_google_api(self, prompt, max_retries=3, model_name=None, json_mode=False):
+        """调用Google API并处理重试逻辑，model_name 为空时使用主模型"""
+        payload = self.build_payload(prompt, json_mode=json_mode)
+        model_name = model_name or self.model_name
+        api_url = self.api_url if model_name == self.model_name else self.model_url(model_name)
+        with get_metrics().span("call_google_api", model=model_name) as record:
+            result = self.client.post_json(
+                api_url, payload, max_retries=max_retries, cancel_token=self.cancel_token, record=record
+            )
+            record["ok"] = result is not None
+            self.record_usage(record, prompt, (result or {}).get("usageMetadata"), self.get_response_text(result))
+        return result
+
+    def record_usage(self, record, prompt, usage, response_text):
+        """记录请求和响应的 token 数（优先使用 API 返回的 usageMetadata，否则估算）"""
+        usage = usage or {}
+        prompt_tokens = usage.get("promptTokenCount")
+        if prompt_tokens is None:
+            prompt_tokens = self.estimate_tokens(prompt)
+        response_tokens = usage.get("candidatesTokenCount")
+        if response_tokens is None:
+            response_tokens = self.estimate_tokens(response_text) if response_text else 0
+        record["prompt_tokens"] = prompt_tokens
+        record["response_tokens"] = response_tokens
+        metrics = get_metrics()
+        metrics.count("tokens.prompt", prompt_tokens)
+        metrics.count("tokens.response", response_tokens)
+
+    def estimate_tokens(self, text):
+        """粗略估算文本的 token 数（ASCII 约 4 字符 1 token，其他字符按 1 token 计）"""
+        ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+        return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+    def split_into_batches(self, file_names):
+        """按 token 预算将文件列表切分为多个批次"""
+        batches = []
+        current_batch = []
+        current_tokens = 0
+        for file_name in file_names:
+            # 编码后每个文件占一行“编号|目录|文件名[|内容摘要]”
+            tokens = self.estimate_tokens(os.path.basename(file_name)) + 4
+            snippet = self.snippets.get(file_name)
+            if snippet:
+                tokens += self.estimate_tokens(snippet)
+            if current_batch and current_tokens + tokens > self.batch_token_budget:
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+            current_batch.append(file_name)
+            current_tokens += tokens
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+
+    def get_response_text(self, result):
+        """从API响应中提取第一个候选的文本"""
+        if result and "candidates" in result and result["candidates"]:
+            content = result["candidates"][0].get("content", {})
+            if "parts" in content and content["parts"]:
+                return content["parts"][0].get("text")
         return None
 
-    def analyze_filenames(self, file_names):
-        """分析文件名并返回分类结果"""
-        # 构造两阶段分析的提示词
-        analysis_prompt = (
-            "你是一个专业的文件分类助手。请分析以下文件列表，完成以下任务：\n\n"
-            "任务1 - 分析和理解：\n"
-            "1. 理解文件的主题和类型\n"
-            "2. 识别文件之间的关联性\n"
-            "3. 发现可能的分类维度\n"
-            "4. 确定合适的分类层次\n\n"
-            "任务2 - 提供分类建议：\n"
-            "1. 建议最合适的分类方案\n"
-            "2. 说明分类的理由\n"
-            "3. 解释分类的优势\n\n"
-            "文件列表：\n" +
-            "\n".join(file_names) +
-            "\n\n请提供你的分析和建议。"
+    def build_analysis_prompt(self, file_names):
+        """构造分析阶段的提示词"""
+        return ANALYSIS_PROMPT_TEMPLATE.format(file_list=EncodedFileList(file_names, self.snippets).to_text())
+
+    def build_taxonomy_hint(self, taxonomy):
+        """构造已有分类体系的提示（分批时共享）"""
+        if not taxonomy:
+            return ""
+        return TAXONOMY_HINT_TEMPLATE.format(
+            taxonomy="\n".join(f"- {category}" for category in taxonomy)
         )
-        
+
+    def build_classification_prompt(self, analysis_text, encoded_files, taxonomy=None):
+        """构造分类阶段的提示词，taxonomy 为已确定的分类列表（分批时共享）"""
+        return CLASSIFICATION_PROMPT_TEMPLATE.format(
+            analysis_text=analysis_text,
+            taxonomy_hint=self.build_taxonomy_hint(taxonomy),
+            file_list=encoded_files.to_text()
+        )
+
+    def build_structured_prompt(self, encoded_files, taxonomy=None):
+        """构造结构化输出模式的提示词"""
+        return STRUCTURED_PROMPT_TEMPLATE.format(
+            taxonomy_hint=self.build_taxonomy_hint(taxonomy),
+            file_list=encoded_files.to_text()
+        )
+
+    def build_routing_prompt(self, encoded_files, taxonomy=None):
+        """构造快速模型的分类提示词（要求给出置信度）"""
+        return ROUTING_PROMPT_TEMPLATE.format(
+            taxonomy_hint=self.build_taxonomy_hint(taxonomy),
+            uncategorized=UNCATEGORIZED_NAMES[0],
+            file_list=encoded_files.to_text()
+        )
+
+    def classify_batch(self, analysis_text, file_names, taxonomy=None):
+        """对单个批次调用分类请求，返回 {分类: [文件路径, ...]} 或 None"""
+        encoded_files = EncodedFileList(file_names, self.snippets)
+        prompt = self.build_classification_prompt(analysis_text, encoded_files, taxonomy)
+        classification_result = self.call_google_api(prompt)
+        if classification_result and "candidates" in classification_result:
+            content = classification_result["candidates"][0]["content"]
+            json_data = self.extract_json_from_text(content)
+            if json_data:
+                mapping = encoded_files.decode_mapping(json_data)
+                self.record_completed(mapping)
+                return mapping or None
+        return None
+
+    def classify_batch_structured(self, file_names, taxonomy=None):
+        """
+        结构化输出模式下对单个批次分类：一次流式请求，
+        每解析出一个完整的分类就立即通过 on_category 回调通知。
+        """
+        encoded_files = EncodedFileList(file_names, self.snippets)
+        prompt = self.build_structured_prompt(encoded_files, taxonomy)
+        payload = self.build_payload(prompt, json_mode=True)
+        parser = IncrementalObjectParser()
+        category_mapping = {}
+        seen = set()
+        usage = None
+        with get_metrics().span("stream_google_api", model=self.model_name) as record:
+            for event in self.client.stream_json(self.stream_url, payload, cancel_token=self.cancel_token, record=record):
+                usage = event.get("usageMetadata") or usage
+                text = self.get_response_text(event)
+                if not text:
+                    continue
+                for category, values in parser.feed(text):
+                    if not isinstance(values, list):
+                        continue
+                    files = encoded_files.decode_mapping({category: values}, seen).get(category)
+                    if not files:
+                        continue
+                    category_mapping.setdefault(category, []).extend(files)
+                    self.record_completed({category: files})
+                    if self.on_category:
+                        self.on_category(category, files)
+            if not category_mapping and parser.text:
+                # 模型在 JSON 之前输出了含括号的说明时增量解析器拿不到任何成员，改为从完整文本中提取
+                json_data = self.extract_json_from_text(parser.text)
+                if json_data:
+                    category_mapping = encoded_files.decode_mapping(json_data, seen)
+                    self.record_completed(category_mapping)
+                    for category, files in category_mapping.items():
+                        if self.on_category:
+                            self.on_category(category, files)
+            record["ok"] = bool(category_mapping)
+            self.record_usage(record, prompt, usage, parser.text)
+        return category_mapping or None
+
+    def classify_batch_routed(self, file_names, taxonomy=None, escalate=None):
+        """
+        用快速模型对单个批次分类，返回置信度达到阈值的 {分类: [文件路径, ...]}。
+        其余文件以 (路径, 快速模型给出的分类或 None) 的形式追加到 escalate 列表。
+        """
+        encoded_files = EncodedFileList(file_names, self.snippets)
+        prompt = self.build_routing_prompt(encoded_files, taxonomy)
+        result = self.call_google_api(prompt, model_name=self.fast_model_name, json_mode=True)
+        mapping, low = {}, []
+        seen = set()
+        json_data = self.extract_json_from_text(self.get_response_text(result) or "")
+        if json_data:
+            mapping, low = encoded_files.decode_scored_mapping(
+                json_data, self.confidence_threshold, seen, UNCATEGORIZED_NAMES
+            )
+        low.extend((path, None) for path in file_names if path not in seen)
+        if escalate is not None:
+            escalate.extend(low)
+        self.record_completed(mapping)
+        for category, files in mapping.items():
+            if self.on_category:
+                self.on_category(category, files)
+        return mapping
+
+    def extract_snippets(self, file_names):
+        """提取内容摘要（提取期间也会响应取消），失败时只按文件名分类"""
+        try:
+            self.snippets = self.content_extractor.extract_many(file_names, cancel_token=self.cancel_token)
+            if self.snippets:
+                print(f"已提取 {len(self.snippets)} 个文件的内容摘要")
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            print(f"提取内容摘要失败，将只按文件名分类：{str(e)}")
+            self.snippets = {}
+
+    def check_cancelled(self):
+        """已取消时抛出 OperationCancelled（在批次之间调用）"""
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
+    def record_completed(self, mapping):
+        """
+        记录已完成分类的文件并立即写入分类缓存。
+        取消或中断后，这些文件在下次分析时直接命中缓存，不必从头开始。
+        """
+        if not mapping:
+            return
+        with self._completed_lock:
+            self.merge_mappings(self.completed_mapping, mapping)
+        if self.cache:
+            self.cache.put_mapping(mapping, self.cache_contents())
+
+    def cache_contents(self):
+        """按内容摘要分类时缓存键需要包含摘要，否则同名文件会共用其他目录中的缓存结果"""
+        return self.snippets if self.content_extractor else None
+
+    def merge_mappings(self, target, mapping):
+        """将分类映射合并到 target 中（同名分类的文件列表合并）"""
+        for category, files in mapping.items():
+            target.setdefault(category, []).extend(files)
+        return target
+
+    @timed("analyze_filenames")
+    def analyze_filenames(self, file_names, taxonomy=None):
+        """
+        分析文件名并返回分类结果（本地规则和缓存能确定分类的文件不请求大模型）。
+        taxonomy 为已有的分类列表（如增量整理时目录中已有的分类），提供时直接按其分类。
+        通过 cancel_token 取消时返回已完成的部分结果，并将 cancelled 置为 True。
+        """
+        self.cancelled = False
+        self.completed_mapping = {}
+        self.snippets = {}
+        local_mapping = {}
+        if self.rule_classifier:
+            local_mapping, file_names = self.rule_classifier.classify(file_names)
+            matched = sum(len(files) for files in local_mapping.values())
+            if matched:
+                print(f"本地规则已分类 {matched} 个文件")
+
+        try:
+            # 内容摘要在查询缓存之前提取：缓存键包含摘要，同名但内容不同的文件不会误用缓存
+            if self.content_extractor and file_names:
+                self.extract_snippets(file_names)
+
+            if self.cache and file_names:
+                hits = self.cache.get_many(file_names, self.cache_contents())
+                uncached = []
+                for file_name in file_names:
+                    if file_name in hits:
+                        local_mapping.setdefault(hits[file_name], []).append(file_name)
+                    else:
+                        uncached.append(file_name)
+                file_names = uncached
+                if hits:
+                    print(f"分类缓存命中 {len(hits)} 个文件，剩余 {len(file_names)} 个文件需要请求大模型")
+
+            if not file_names:
+                return LOCAL_ANALYSIS_TEXT, local_mapping
+            self.check_cancelled()
+
+            # 本地规则和缓存已确定的分类作为提示，大模型新给出的分类与其保持一致，合并后不会出现近义的重复分类
+            taxonomy_hint = None if taxonomy else sorted(local_mapping) or None
+            # 每批结果在完成时已经写入缓存（见 record_completed）
+            if self.fast_model_name:
+                analysis_text, category_mapping = self.analyze_routed(file_names, taxonomy, taxonomy_hint)
+            elif taxonomy:
+                analysis_text, category_mapping = self.analyze_with_taxonomy(file_names, taxonomy)
+            else:
+                analysis_text, category_mapping = self.analyze_uncached(file_names, taxonomy_hint)
+        except OperationCancelled:
+            self.cancelled = True
+            with self._completed_lock:
+                completed = self.merge_mappings({}, self.completed_mapping)
+            count = sum(len(files) for files in completed.values())
+            print(f"分析已取消，{count} 个文件已完成分类")
+            return CANCELLED_ANALYSIS_TEXT.format(count=count), self.merge_mappings(local_mapping, completed)
+        if not category_mapping:
+            # 大模型没有返回结果时仍保留本地规则和缓存已确定的分类
+            if not local_mapping:
+                return analysis_text, None
+            count = sum(len(files) for files in local_mapping.values())
+            print(f"大模型分类失败，保留本地已分类的 {count} 个文件")
+            note = LOCAL_ONLY_ANALYSIS_TEXT.format(count=count)
+            return f"{analysis_text}\n\n{note}" if analysis_text else note, local_mapping
+        return analysis_text, self.merge_mappings(local_mapping, category_mapping)
+
+    def analyze_uncached(self, file_names, taxonomy_hint=None):
+        """
+        调用大模型分析文件名并返回分类结果。
+        taxonomy_hint 为建议优先使用的分类（如缓存命中的分类），与 taxonomy 不同，模型仍可新增分类。
+        """
+        batches = self.split_into_batches(file_names)
+        if self.structured_output:
+            return self.analyze_structured(batches, taxonomy_hint)
+        if len(batches) > 1:
+            return self.analyze_filenames_batched(batches, taxonomy_hint)
+
         # 获取分析结果
-        analysis_result = self.call_google_api(analysis_prompt)
-        if not analysis_result:
+        analysis_result = self.call_google_api(self.build_analysis_prompt(file_names))
+        analysis_text = self.get_response_text(analysis_result)
+        if not analysis_text:
             return None, None
         
-        # 提取分析文本
-        analysis_text = None
-        if "candidates" in analysis_result and analysis_result["candidates"]:
-            content = analysis_result["candidates"][0]["content"]
-            if "parts" in content and content["parts"]:
-                analysis_text = content["parts"][0]["text"]
+        # 获取分类结果
+        json_data = self.classify_batch(analysis_text, file_names, taxonomy_hint)
+        if json_data:
+            return analysis_text, json_data
         
+        return analysis_text, None
+
+    @staticmethod
+    def seed_taxonomy(seed_mapping, taxonomy_hint=None):
+        """第一批的分类加上提示中的其他分类，作为其余批次共享的分类体系"""
+        taxonomy = list(seed_mapping.keys())
+        taxonomy.extend(category for category in taxonomy_hint or () if category not in seed_mapping)
+        return taxonomy
+
+    def analyze_filenames_batched(self, batches, taxonomy_hint=None):
+        """
+        分批并发分析文件名。
+        先用第一批文件完成分析并确定种子分类体系，其余批次共享该分类体系并发分类，
+        最后合并为统一的分类映射。
+        """
+        seed_batch = batches[0]
+        analysis_result = self.call_google_api(self.build_analysis_prompt(seed_batch))
+        analysis_text = self.get_response_text(analysis_result)
         if not analysis_text:
             return None, None
-        
-        # 构造分类提示词
-        classification_prompt = (
-            "基于以下分析结果，请将文件按照最优的分类方案进行分类，并以JSON格式返回。\n\n"
-            "分析结果：\n"
-            f"{analysis_text}\n\n"
-            "要求：\n"
-            "1. 使用最合适的分类层次\n"
-            "2. 分类名称要清晰易懂\n"
-            "3. 可以使用层级结构（用'/'分隔）\n"
-            "4. 确保分类逻辑合理\n"
-            "5. 返回格式为JSON，可以使用markdown代码块\n\n"
-            "示例格式：\n"
-            "```json\n"
-            "{\n"
-            '  "主分类/子分类": ["file1.pdf"],\n'
-            '  "另一分类": ["file2.pdf"]\n'
-            "}\n"
-            "```\n\n"
-            "需要分类的文件：\n" +
-            "\n".join(file_names)
+
+        seed_mapping = self.classify_batch(analysis_text, seed_batch, taxonomy_hint)
+        if not seed_mapping:
+            return analysis_text, None
+
+        category_mapping = self.merge_mappings({}, seed_mapping)
+        taxonomy = self.seed_taxonomy(seed_mapping, taxonomy_hint)
+        self.classify_remaining_batches(
+            batches, category_mapping,
+            lambda batch: self.classify_batch(analysis_text, batch, taxonomy)
         )
-        
-        # 获取分类结果
-        classification_result = self.call_google_api(classification_prompt)
-        if classification_result and "candidates" in classification_result:
-            content = classification_result["candidates"][0]["content"]
-            json_data = self.extract_json_from_text(content)
-            if json_data:
-                return analysis_text, json_data
-        
-        return analysis_text, None
\ No newline at end of file
+        return analysis_text, category_mapping
+
+    def analyze_with_taxonomy(self, file_names, taxonomy):
+        """已有分类体系时不再单独请求分析，每批文件直接按该体系单次分类"""
+        batches = self.split_into_batches(file_names)
+        category_mapping = {}
+        self.classify_remaining_batches(
+            batches, category_mapping,
+            lambda batch: self.classify_batch_structured(batch, taxonomy),
+            start=0
+        )
+        if not category_mapping:
+            return None, None
+        return TAXONOMY_ANALYSIS_TEXT, category_mapping
+
+    def analyze_routed(self, file_names, taxonomy=None, taxonomy_hint=None):
+        """
+        分级模型路由：所有批次先交给快速模型（没有已有分类体系时由第一批确定），
+        只有低置信度、未分类或快速模型请求失败的文件才交给主模型按同一分类体系重新分类。
+        快速模型未能为第一批给出任何可信分类时，改由主模型分类第一批并确定分类体系，
+        保证所有批次共享同一分类体系。
+        主模型也未能分类的文件，如果快速模型给出过分类则沿用该分类。
+        taxonomy_hint 同 analyze_uncached，只在没有 taxonomy 时用于第一批。
+        """
+        batches = self.split_into_batches(file_names)
+        escalate = []
+        category_mapping = {}
+        strong_seed_mapping = {}
+        start = 0
+        if not taxonomy:
+            seed_mapping = self.classify_batch_routed(batches[0], taxonomy_hint, escalate)
+            if not seed_mapping:
+                print(f"快速模型未能确定分类体系，第一批文件交由 {self.model_name} 分类")
+                escalate.clear()
+                _, strong_seed_mapping = self.analyze_uncached(batches[0], taxonomy_hint)
+                if not strong_seed_mapping:
+                    return None, None
+                seed_mapping = strong_seed_mapping
+            else:
+                self.merge_mappings(category_mapping, seed_mapping)
+            taxonomy = self.seed_taxonomy(seed_mapping, taxonomy_hint)
+            start = 1
+        self.classify_remaining_batches(
+            batches, category_mapping,
+            lambda batch: self.classify_batch_routed(batch, taxonomy, escalate),
+            start=start
+        )
+
+        confident = sum(len(files) for files in category_mapping.values())
+        escalated = len(escalate) + sum(len(files) for files in strong_seed_mapping.values())
+        self.merge_mappings(category_mapping, strong_seed_mapping)
+        metrics = get_metrics()
+        metrics.count("routing.fast_classified", confident)
+        metrics.count("routing.escalated", escalated)
+        if escalate:
+            print(f"快速模型已分类 {confident} 个文件，{len(escalate)} 个低置信度文件交由 {self.model_name} 分类")
+            escalated_names = [path for path, _ in escalate]
+            _, strong_mapping = self.analyze_with_taxonomy(escalated_names, taxonomy)
+            strong_mapping = strong_mapping or {}
+            self.merge_mappings(category_mapping, strong_mapping)
+            resolved = {path for files in strong_mapping.values() for path in files}
+            fallback = {}
+            for path, category in escalate:
+                if path not in resolved and category and category not in UNCATEGORIZED_NAMES:
+                    fallback.setdefault(category, []).append(path)
+            self.record_completed(fallback)
+            self.merge_mappings(category_mapping, fallback)
+
+        if not category_mapping:
+            return None, None
+        analysis_text = ROUTED_ANALYSIS_TEXT.format(
+            fast_model=self.fast_model_name, model=self.model_name,
+            confident=confident, escalated=escalated
+        )
+        return analysis_text, category_mapping
+
+    def analyze_structured(self, batches, taxonomy_hint=None):
+        """结构化输出模式：第一批确定种子分类体系，其余批次共享该体系并发分类"""
+        seed_mapping = self.classify_batch_structured(batches[0], taxonomy_hint)
+        if not seed_mapping:
+            return None, None
+
+        category_mapping = self.merge_mappings({}, seed_mapping)
+        taxonomy = self.seed_taxonomy(seed_mapping, taxonomy_hint)
+        self.classify_remaining_batches(
+            batches, category_mapping,
+            lambda batch: self.classify_batch_structured(batch, taxonomy)
+        )
+        return STRUCTURED_ANALYSIS_TEXT, category_mapping
+
+    def classify_remaining_batches(self, batches, category_mapping, classify, start=1):
+        """用线程池并发分类从第 start 批开始的批次（默认跳过第一批），结果合并到 category_mapping"""
+        self.check_cancelled()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.classify_unless_cancelled, classify, batch) for batch in batches[start:]]
+            try:
+                for index, future in enumerate(futures, start=start + 1):
+                    mapping = future.result()
+                    if mapping:
+                        self.merge_mappings(category_mapping, mapping)
+                    else:
+                        print(f"第 {index}/{len(batches)} 批分类失败，已跳过")
+            except OperationCancelled:
+                # 尚未开始的批次不再执行，正在进行的请求在取消后立即返回
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def classify_unless_cancelled(self, classify, batch):
+        """线程池中的批次开始前先检查是否已取消"""
+        self.check_cancelled()
+        return classify(batch)
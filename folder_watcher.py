@@ -0,0 +1,307 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from config import Config
+from file_index import FileIndex
+from file_organizer import FileOrganizer
+from move_journal import MoveJournal
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# 仍在下载或写入中的临时文件后缀
+TEMPORARY_SUFFIXES = (".part", ".crdownload", ".download", ".tmp", ".partial")
+
+# 读取已有分类体系时检查的目录层数（分类名称形如 "主分类/子分类"）
+CATEGORY_DEPTH = 2
+
+# 最早到达的文件最多等待的时间（秒），持续有新文件到达时也会按时处理
+MAX_BATCH_DELAY = 30.0
+
+# 分类失败的文件第一次重试前等待的时间（秒），之后每次加倍，最长 RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 30.0
+RETRY_MAX_DELAY = 600.0
+
+# 监听模式创建的操作日志在日志中记录的来源
+WATCH_JOURNAL_KIND = "watch"
+
+
+def is_candidate(name):
+    """是否为需要整理的新文件（忽略隐藏文件、临时文件和分析报告）"""
+    return not (
+        name.startswith(".")
+        or name.lower().endswith(TEMPORARY_SUFFIXES)
+        or name.startswith("file_analysis_report_")
+    )
+
+
+class InotifyWatcher:
+    """通过 inotify 监听目录中写入完成或移入的文件（仅 Linux）"""
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch 失败")
+        self.path = path
+
+    def wait(self, timeout):
+        """
+        等待新文件，返回文件名列表；事件队列溢出时返回 None，
+        表示可能有遗漏，调用方需要重新检查整个目录。
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        names = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                raise OSError(errno.ENOENT, "监听的目录已被删除或移动", self.path)
+            if name and not mask & IN_ISDIR:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    定时检查目录的顶层文件（不支持 inotify 的平台使用）。
+    文件大小和修改时间在两次检查之间保持不变才视为写入完成。
+    """
+
+    def __init__(self, path, interval=None):
+        self.path = path
+        self.interval = interval or Config.WATCH_POLL_INTERVAL
+        self.reported = set(self._list_files())
+        self.pending = {}
+
+    def _list_files(self):
+        files = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue
+        return files
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        files = self._list_files()
+        names = []
+        for name, signature in files.items():
+            if name in self.reported:
+                continue
+            if self.pending.get(name) == signature:
+                names.append(name)
+                self.reported.add(name)
+                self.pending.pop(name)
+            else:
+                self.pending[name] = signature
+        # 已被移走的文件之后再次出现时重新报告
+        self.reported.intersection_update(files)
+        return names
+
+    def close(self):
+        pass
+
+
+def create_watcher(path, log=print):
+    """优先使用 inotify，不可用时回退到定时检查"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as e:
+            log(f"inotify 不可用，改为定时检查目录：{str(e)}")
+    return PollingWatcher(path)
+
+
+class FolderWatcher:
+    """
+    监听目录并增量整理新到达的文件。
+    新文件在一段时间内没有新的到达后合并为一批，以目录中已有的分类体系作为上下文分类，
+    再移动到对应目录，每批使用独立的操作日志，可以逐批撤销（只保留最近 WATCH_KEEP_JOURNALS 批）。
+    分类失败的文件按退避间隔重新排队，超过 WATCH_MAX_RETRIES 次后放弃。
+    """
+
+    def __init__(self, root_path, processor=None, log=print, debounce=None, max_batch=None):
+        self.root_path = os.path.abspath(root_path)
+        self.processor = processor
+        self.log = log
+        self.debounce = debounce if debounce is not None else Config.WATCH_DEBOUNCE
+        self.max_batch = max_batch or Config.WATCH_MAX_BATCH
+        self.journal_dir = MoveJournal.journal_dir(Config.APP_DATA_DIR)
+        self.keep_journals = Config.WATCH_KEEP_JOURNALS
+        self.max_retries = Config.WATCH_MAX_RETRIES
+        self.failures = {}  # 文件名 -> 分类失败的次数
+        self.taxonomy = self.load_taxonomy()
+        self.stats = {"batches": 0, "moved": 0, "skipped": 0, "failed": 0}
+        # 进程池在整个监听期间复用，由 run 结束时关闭
+        self._owns_processor = processor is None
+
+    def load_taxonomy(self):
+        """读取目录中已有的分类目录（最多 CATEGORY_DEPTH 层）"""
+        taxonomy = []
+        level = [""]
+        for _ in range(CATEGORY_DEPTH):
+            next_level = []
+            for relative_dir in level:
+                try:
+                    with os.scandir(os.path.join(self.root_path, relative_dir)) as it:
+                        for entry in it:
+                            if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                                continue
+                            category = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                            next_level.append(category)
+                except OSError:
+                    continue
+            # 只保留最深一层的分类，中间层已包含在名称中
+            parents = {os.path.dirname(category) for category in next_level}
+            taxonomy = [category for category in taxonomy if category not in parents]
+            taxonomy.extend(next_level)
+            level = next_level
+        return sorted(taxonomy)
+
+    def existing_files(self):
+        """目录顶层已有的待整理文件"""
+        names = []
+        with os.scandir(self.root_path) as it:
+            for entry in it:
+                if is_candidate(entry.name) and entry.is_file(follow_symlinks=False):
+                    names.append(entry.name)
+        return names
+
+    def run(self, should_stop=None, include_existing=True):
+        """持续监听直到 should_stop 返回 True（或收到 KeyboardInterrupt）"""
+        watcher = create_watcher(self.root_path, self.log)
+        pending = {}  # 文件名 -> 首次发现的时间
+        not_before = {}  # 等待重试的文件名 -> 最早可以重试的时间
+        last_arrival = 0.0
+        if include_existing:
+            now = time.monotonic()
+            pending = {name: now for name in self.existing_files()}
+        self.prune_journals()
+        self.log(f"开始监听目录：{self.root_path}（已有 {len(self.taxonomy)} 个分类）")
+        try:
+            while not (should_stop and should_stop()):
+                names = watcher.wait(self.debounce if pending else 1.0)
+                now = time.monotonic()
+                if names is None:
+                    names = self.existing_files()
+                for name in names:
+                    if is_candidate(name):
+                        pending.setdefault(name, now)
+                        last_arrival = now
+                ready = [name for name in pending if not_before.get(name, 0.0) <= now]
+                if ready and (
+                    now - last_arrival >= self.debounce
+                    or len(ready) >= self.max_batch
+                    or now - min(pending[name] for name in ready) >= MAX_BATCH_DELAY
+                ):
+                    batch = sorted(ready, key=pending.get)[:self.max_batch]
+                    for name in batch:
+                        pending.pop(name)
+                        not_before.pop(name, None)
+                    for name in self.process_batch(batch):
+                        delay = self.retry_delay(name)
+                        if delay is None:
+                            continue
+                        pending[name] = now
+                        not_before[name] = now + delay
+        finally:
+            watcher.close()
+            if self._owns_processor and self.processor is not None and self.processor.content_extractor:
+                self.processor.content_extractor.close()
+        return self.stats
+
+    def retry_delay(self, name):
+        """记录一次分类失败，返回重试前等待的秒数；超过重试次数时返回 None"""
+        attempts = self.failures.get(name, 0) + 1
+        if attempts > self.max_retries:
+            self.failures.pop(name, None)
+            self.stats["skipped"] += 1
+            self.log(f"多次分类失败，不再重试：{name}")
+            return None
+        self.failures[name] = attempts
+        return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+
+    def prune_journals(self):
+        """只保留最近 keep_journals 个监听批次的日志（包括之前监听时留下的）"""
+        MoveJournal.prune(self.journal_dir, self.root_path, self.keep_journals, kind=WATCH_JOURNAL_KIND)
+
+    def process_batch(self, names):
+        """分类并移动一批新文件，返回分类失败、需要稍后重试的文件名"""
+        paths = [os.path.join(self.root_path, name) for name in names]
+        paths = [path for path in paths if os.path.isfile(path)]
+        if not paths:
+            return []
+        self.log(f"\n发现 {len(paths)} 个新文件，正在分类...")
+        if self.processor is None:
+            # 只在需要分类时才导入，避免监听前加载网络相关模块
+            from file_processor import FileProcessor
+            self.processor = FileProcessor()
+            if self.processor.content_extractor:
+                self.processor.content_extractor.keep_pool = True
+        try:
+            _, category_mapping = self.processor.analyze_filenames(paths, self.taxonomy)
+        except Exception as e:
+            self.log(f"分类失败：{str(e)}")
+            category_mapping = None
+        if not category_mapping:
+            self.log("未能获取有效的分类结果，这批文件稍后重试")
+            return [os.path.basename(path) for path in paths]
+
+        file_index = FileIndex(self.root_path)
+        for path in paths:
+            file_index.add(path)
+            self.failures.pop(os.path.basename(path), None)
+        journal = MoveJournal.create(self.journal_dir, self.root_path, category_mapping, kind=WATCH_JOURNAL_KIND)
+        try:
+            organizer = FileOrganizer(self.root_path, journal, file_index=file_index, log=self.log)
+            organizer.move_files(category_mapping)
+            journal.commit()
+        finally:
+            journal.close()
+        self.prune_journals()
+
+        self.stats["batches"] += 1
+        for key in ("moved", "skipped", "failed"):
+            self.stats[key] += organizer.stats[key]
+        new_categories = set(category_mapping) - set(self.taxonomy)
+        if new_categories:
+            self.taxonomy = sorted(set(self.taxonomy) | new_categories)
+            self.log(f"新增分类：{', '.join(sorted(new_categories))}")
+        return []
@@ -0,0 +1,200 @@
+import json
+
+
+class IncrementalObjectParser:
+    """
+    增量解析流式返回的顶层 JSON 对象。
+    每次 feed 一段文本，返回这段文本中新近完整的成员 (键, 值)，
+    不必等待整个响应结束。对象之前的内容（如 markdown 代码块标记）会被忽略。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.member_start = None
+        self.finished = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        members = []
+        text = self.text
+        while self.pos < len(text) and not self.finished:
+            ch = text[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                if self.depth > 0:
+                    self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                if self.depth == 1:
+                    if ch == "{":
+                        self.member_start = self.pos + 1
+                    else:
+                        # 顶层不是对象，无法按成员解析
+                        self.finished = True
+            elif ch in "}]" and self.depth > 0:
+                if self.depth == 1:
+                    members.extend(self._finish_member())
+                    self.finished = True
+                self.depth -= 1
+            elif ch == "," and self.depth == 1:
+                members.extend(self._finish_member())
+                self.member_start = self.pos + 1
+            self.pos += 1
+        return members
+
+    def _finish_member(self):
+        segment = self.text[self.member_start:self.pos].strip()
+        if not segment:
+            return []
+        try:
+            return list(json.loads("{" + segment + "}").items())
+        except json.JSONDecodeError:
+            return []
+
+
+# 闭合括号对应关系
+CLOSERS = {"{": "}", "[": "]"}
+
+# 截断修复时最多尝试回退的成员个数
+MAX_REPAIR_ATTEMPTS = 8
+
+# 遇到未闭合的候选时，最多从其后重新查找的次数（保证总耗时与文本长度成线性关系）
+MAX_TRUNCATED_RETRIES = 4
+
+# markdown 代码块标记
+CODE_FENCE = "```"
+
+_decoder = json.JSONDecoder()
+
+
+def scan_json_candidates(text, start=0):
+    """
+    单次扫描文本，依次返回每个顶层 {...} 或 [...] 的起止位置 (start, end)。
+    字符串中的括号会被正确跳过；文本结束时仍未闭合的候选返回 (start, None)。
+    """
+    depth = 0
+    in_string = False
+    escape = False
+    candidate_start = None
+    for pos in range(start, len(text)):
+        ch = text[pos]
+        if depth == 0:
+            if ch in CLOSERS:
+                candidate_start = pos
+                depth = 1
+            continue
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in CLOSERS:
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                yield candidate_start, pos + 1
+    if depth > 0:
+        yield candidate_start, None
+
+
+def repair_truncated_json(fragment):
+    """
+    修复常见的 JSON 格式问题：去掉闭合括号前多余的逗号，补全被截断的字符串和括号；
+    仍无法解析时依次回退到前面的成员边界再尝试。返回解析结果，失败返回 None。
+    """
+    chars = []
+    stack = []
+    in_string = False
+    escape = False
+    cut_points = []
+    for ch in fragment:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in CLOSERS:
+            stack.append(CLOSERS[ch])
+        elif ch in "}]":
+            # 去掉 [1, 2, ] 这类末尾多余的逗号
+            while chars and chars[-1].isspace():
+                chars.pop()
+            if chars and chars[-1] == ",":
+                chars.pop()
+                cut_points.pop()
+            if stack:
+                stack.pop()
+        elif ch == ",":
+            cut_points.append((len(chars), "".join(reversed(stack))))
+        chars.append(ch)
+
+    text = "".join(chars)
+    head = text + ('"' if in_string else "")
+    attempts = [head.rstrip().rstrip(",") + "".join(reversed(stack))]
+    for pos, closers in reversed(cut_points[-MAX_REPAIR_ATTEMPTS:]):
+        attempts.append(text[:pos] + closers)
+    for attempt in attempts:
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def extract_json_value(text, validator=None, start=0):
+    """
+    从文本中提取第一个满足 validator 的 JSON 值。
+    每个顶层候选只用 raw_decode 解析一次；解析失败或被截断的候选会先尝试修复，
+    以便尽量保留模型已返回的部分结果。未闭合的候选之后最多重新查找
+    MAX_TRUNCATED_RETRIES 次，因此总耗时与文本长度成线性关系。
+    """
+    validator = validator or (lambda value: True)
+    pos = start
+    retries = 0
+    while pos < len(text):
+        truncated_start = None
+        for candidate_start, candidate_end in scan_json_candidates(text, pos):
+            if candidate_end is None:
+                truncated_start = candidate_start
+                break
+            try:
+                value, _ = _decoder.raw_decode(text, candidate_start)
+            except json.JSONDecodeError:
+                value = repair_truncated_json(text[candidate_start:candidate_end])
+            if value is not None and validator(value):
+                return value
+        if truncated_start is None:
+            return None
+        # 截断的代码块在末尾仍有结束标记，修复前先去掉，否则会被当作 JSON 内容
+        fragment = text[truncated_start:]
+        fence = fragment.find(CODE_FENCE)
+        if fence >= 0:
+            fragment = fragment[:fence]
+        value = repair_truncated_json(fragment)
+        if value is not None and validator(value):
+            return value
+        retries += 1
+        if retries >= MAX_TRUNCATED_RETRIES:
+            return None
+        # 未闭合的可能只是正文中多余的括号，从它之后继续查找
+        pos = truncated_start + 1
+    return None
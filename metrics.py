@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import functools
+import pstats
+import logging
+import cProfile
+import threading
+import contextlib
+from datetime import datetime
+from config import Config
+
+# 结构化指标写入的日志器名称
+METRICS_LOGGER_NAME = "file_organizer.metrics"
+
+_logger = logging.getLogger(METRICS_LOGGER_NAME)
+_logger.propagate = False
+_logging_configured = False
+_logging_lock = threading.Lock()
+
+
+def resolve_log_path(log_path=None):
+    """相对路径的日志文件放在应用数据目录下，与运行时的工作目录无关"""
+    log_path = log_path or Config.LOG_FILE_PATH
+    if not os.path.isabs(log_path):
+        log_path = os.path.join(Config.APP_DATA_DIR, log_path)
+    return log_path
+
+
+def setup_logging():
+    """根据 ENABLE_LOGGING 和 LOG_FILE_PATH 配置日志文件（只配置一次）"""
+    global _logging_configured
+    with _logging_lock:
+        if _logging_configured:
+            return
+        _logging_configured = True
+        if not Config.ENABLE_LOGGING:
+            _logger.disabled = True
+            return
+        try:
+            log_path = resolve_log_path()
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            handler = logging.FileHandler(log_path, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+            _logger.setLevel(logging.INFO)
+        except OSError as e:
+            print(f"无法打开日志文件，将不记录性能指标：{str(e)}")
+            _logger.disabled = True
+
+
+class Metrics:
+    """
+    线程安全的性能指标收集器。
+    span 记录各阶段的耗时，count 记录计数（如 API 请求数、重试次数、token 数）；
+    每个阶段结束时在日志文件中写入一行 JSON，汇总结果可以写入分析报告。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}
+            self.counters = {}
+
+    @contextlib.contextmanager
+    def span(self, name, **fields):
+        """
+        计时一个阶段。fields 中的附加信息会写入日志；
+        with 语句中返回的字典可以继续补充信息（如状态码、token 数）。
+        """
+        record = dict(fields)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield record
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stats = self.spans.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0, "errors": 0})
+                stats["count"] += 1
+                stats["seconds"] += seconds
+                stats["max"] = max(stats["max"], seconds)
+                if error is not None:
+                    stats["errors"] += 1
+            record.update({"span": name, "seconds": round(seconds, 6), "time": datetime.now().isoformat()})
+            if error is not None:
+                record["error"] = repr(error)
+            self.log(record)
+
+    def timed(self, name):
+        """装饰器：对函数的每次调用计时"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def log(self, record):
+        setup_logging()
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def snapshot(self):
+        """返回当前指标的副本（可直接序列化为 JSON）"""
+        with self._lock:
+            spans = {
+                name: {
+                    "count": stats["count"],
+                    "seconds": round(stats["seconds"], 4),
+                    "max": round(stats["max"], 4),
+                    "errors": stats["errors"],
+                }
+                for name, stats in self.spans.items()
+            }
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def summary_lines(self):
+        """生成报告中的性能统计表"""
+        data = self.snapshot()
+        lines = []
+        if data["spans"]:
+            lines.append(f"{'阶段':<24}{'次数':>8}{'总耗时(秒)':>14}{'最长(秒)':>12}{'失败':>6}")
+            for name, stats in sorted(data["spans"].items(), key=lambda item: -item[1]["seconds"]):
+                lines.append(f"{name:<24}{stats['count']:>8}{stats['seconds']:>14.3f}{stats['max']:>12.3f}{stats['errors']:>6}")
+        if data["counters"]:
+            lines.append("")
+            for name, value in sorted(data["counters"].items()):
+                lines.append(f"{name}: {value}")
+        return lines
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """返回进程内共享的指标收集器"""
+    return _metrics
+
+
+def timed(name):
+    """使用共享收集器计时的装饰器"""
+    return _metrics.timed(name)
+
+
+def run_with_profile(func, output_path, top=30):
+    """
+    在 cProfile 下运行 func（用于单次运行的性能分析），
+    统计结果保存到 output_path，并把耗时最多的函数输出到标准错误。
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(output_path)
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(top)
+        print(f"性能分析结果已保存至：{output_path}", file=sys.stderr)
@@ -0,0 +1,121 @@
+import os
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import Config
+
+# 每个任务处理的移动操作数（同一目标目录的文件尽量分在同一任务中）
+MOVE_CHUNK_SIZE = 256
+
+# 内核拷贝不支持时回退到普通拷贝的错误码
+COPY_FALLBACK_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def copy_file_fast(src, dst):
+    """
+    在内核中拷贝文件内容（copy_file_range，不支持时由 shutil.copyfile 使用 sendfile），
+    数据不经过用户态缓冲区，并保留文件元数据。
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)
+    copied = False
+    if copy_file_range is not None:
+        with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+            try:
+                remaining = os.fstat(src_file.fileno()).st_size
+                while remaining > 0:
+                    count = copy_file_range(src_file.fileno(), dst_file.fileno(), min(remaining, 1 << 30))
+                    if count == 0:
+                        break
+                    remaining -= count
+                copied = True
+            except OSError as e:
+                if e.errno not in COPY_FALLBACK_ERRORS:
+                    raise
+    if not copied:
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+
+def move_file(src, dst):
+    """
+    移动单个文件：同一文件系统内直接 rename，跨设备时拷贝后删除源文件。
+    目标已存在时抛出 FileExistsError，不会覆盖。
+    """
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, "目标位置已存在同名文件", dst)
+    try:
+        os.rename(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    copy_file_fast(src, dst)
+    os.unlink(src)
+
+
+class MoveExecutor:
+    """
+    并行执行移动方案。
+    移动操作按目标目录分组切分为多个任务，由线程池并发执行；
+    每个任务执行前先批量写入操作日志（一次 fsync），保证日志记录先于实际操作。
+    """
+
+    def __init__(self, journal, max_workers=None, chunk_size=MOVE_CHUNK_SIZE):
+        self.journal = journal
+        self.max_workers = max(1, max_workers or Config.MOVE_WORKERS)
+        self.chunk_size = chunk_size
+
+    def split_chunks(self, moves):
+        """按目标目录分组后切分任务"""
+        by_dir = {}
+        for src, dst in moves:
+            by_dir.setdefault(os.path.dirname(dst), []).append((src, dst))
+        chunks = []
+        for dir_moves in by_dir.values():
+            for start in range(0, len(dir_moves), self.chunk_size):
+                chunks.append(dir_moves[start:start + self.chunk_size])
+        return chunks
+
+    def _run_chunk(self, chunk, cancel_event):
+        results = []
+        for src, dst in chunk:
+            if cancel_event.is_set():
+                break
+            try:
+                move_file(src, dst)
+                results.append((src, dst, None))
+            except OSError as e:
+                results.append((src, dst, e))
+        return results
+
+    def run(self, moves, on_result=None, should_cancel=None):
+        """
+        执行 [(源路径, 目标路径), ...]，目标目录需事先创建。
+        每完成一个文件在调用线程中回调 on_result(src, dst, error)；
+        should_cancel 返回 True 时不再开始新的移动，已开始的任务执行完当前文件后停止。
+        返回是否全部执行（未被取消）。
+        """
+        chunks = self.split_chunks(moves)
+        cancel_event = threading.Event()
+        # 同时在途的任务数有上限，日志只比实际操作提前少量记录
+        max_pending = self.max_workers * 2
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            next_chunk = 0
+            while next_chunk < len(chunks) or pending:
+                if should_cancel and should_cancel():
+                    cancel_event.set()
+                while not cancel_event.is_set() and next_chunk < len(chunks) and len(pending) < max_pending:
+                    chunk = chunks[next_chunk]
+                    next_chunk += 1
+                    self.journal.record_moves(chunk)
+                    pending.add(executor.submit(self._run_chunk, chunk, cancel_event))
+                if not pending:
+                    break
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for src, dst, error in future.result():
+                        if on_result:
+                            on_result(src, dst, error)
+        return not cancel_event.is_set()
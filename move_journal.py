@@ -0,0 +1,298 @@
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 判断日志是否已完成时只读取文件末尾的字节数（最后几条记录都很短）
+TAIL_BYTES = 4096
+
+
+class MoveJournal:
+    """
+    整理操作日志。
+    每个会修改目录的操作在执行前追加一条记录并 fsync，
+    还原时按相反顺序重放，整理中途崩溃后也可以据此继续或回滚。
+    打开已有日志时只在需要时读取：根目录和方案只读第一行，是否完成只读文件末尾，
+    全部记录在首次访问 entries 时才解析。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[List[dict]] = None
+        self._header: Optional[dict] = None
+        self._file = None
+
+    @staticmethod
+    def journal_dir(app_data_dir: str) -> str:
+        return os.path.join(app_data_dir, "journals")
+
+    @classmethod
+    def create(cls, journal_dir: str, root_path: str, plan: Optional[Dict[str, List[str]]] = None,
+               kind: Optional[str] = None) -> "MoveJournal":
+        """为一次整理操作创建新的日志，并记录根目录、分类方案和来源（如监听模式为 "watch"）"""
+        os.makedirs(journal_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        journal = cls(os.path.join(journal_dir, f"{timestamp}_{cls.root_hash(root_path)}.jsonl"))
+        journal._append({
+            "op": "begin",
+            "root": os.path.abspath(root_path),
+            "time": datetime.now().isoformat(),
+            "plan": plan or {},
+            "kind": kind
+        })
+        return journal
+
+    @staticmethod
+    def root_hash(root_path: str) -> str:
+        return hashlib.sha1(os.path.abspath(root_path).encode("utf-8")).hexdigest()[:10]
+
+    @staticmethod
+    def read_entries(path: str) -> List[dict]:
+        """读取日志记录，跳过崩溃时写了一半的记录"""
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    @classmethod
+    def find_by_root(cls, journal_dir: str, root_path: str) -> List["MoveJournal"]:
+        """查找指定目录上的所有整理日志，按创建时间排序（先按文件名中的目录摘要筛选，不解析其他日志）"""
+        if not os.path.isdir(journal_dir):
+            return []
+        root_path = os.path.abspath(root_path)
+        suffix = f"_{cls.root_hash(root_path)}.jsonl"
+        journals = []
+        for name in sorted(os.listdir(journal_dir)):
+            if not name.endswith(suffix):
+                continue
+            journal = cls(os.path.join(journal_dir, name))
+            if journal.root == root_path:
+                journals.append(journal)
+        return journals
+
+    @classmethod
+    def find_incomplete(cls, journal_dir: str, root_path: str) -> List["MoveJournal"]:
+        """查找指定目录上未完成（既未提交也未回滚）的整理日志"""
+        return [journal for journal in cls.find_by_root(journal_dir, root_path) if not journal.is_finished]
+
+    @classmethod
+    def prune(cls, journal_dir: str, root_path: str, keep: int, kind: Optional[str] = None) -> int:
+        """
+        只保留指定目录最近 keep 个已提交且来源为 kind 的日志，
+        更早的日志连同其回收目录一起删除（之后不能再撤销），返回删除的数量。
+        """
+        if keep <= 0:
+            return 0
+        committed = [
+            journal for journal in cls.find_by_root(journal_dir, root_path)
+            if journal.kind == kind and journal.last_op == "commit"
+        ]
+        for journal in committed[:-keep]:
+            trash_dir = journal.trash_dir
+            journal.discard()
+            if trash_dir:
+                shutil.rmtree(trash_dir, ignore_errors=True)
+        return max(0, len(committed) - keep)
+
+    @property
+    def entries(self) -> List[dict]:
+        if self._entries is None:
+            self._entries = self.read_entries(self.path) if os.path.exists(self.path) else []
+        return self._entries
+
+    @property
+    def header(self) -> dict:
+        """begin 记录，尚未读取全部记录时只解析第一行"""
+        if self._entries is not None:
+            return self._entries[0] if self._entries and self._entries[0].get("op") == "begin" else {}
+        if self._header is None:
+            self._header = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    entry = json.loads(f.readline())
+                if isinstance(entry, dict) and entry.get("op") == "begin":
+                    self._header = entry
+            except (OSError, ValueError):
+                pass
+        return self._header
+
+    @property
+    def root(self) -> Optional[str]:
+        return self.header.get("root")
+
+    @property
+    def plan(self) -> Dict[str, List[str]]:
+        return self.header.get("plan") or {}
+
+    @property
+    def kind(self) -> Optional[str]:
+        return self.header.get("kind")
+
+    @property
+    def last_op(self) -> Optional[str]:
+        """最后一条完整记录的操作，尚未读取全部记录时只读取文件末尾"""
+        if self._entries is None:
+            try:
+                with open(self.path, "rb") as f:
+                    size = f.seek(0, os.SEEK_END)
+                    f.seek(max(0, size - TAIL_BYTES))
+                    lines = f.read().splitlines()
+            except OSError:
+                return None
+            if size > TAIL_BYTES:
+                # 第一行可能只读到后半部分
+                lines = lines[1:]
+            for line in reversed(lines):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    return entry.get("op")
+        # 末尾没有完整的短记录（如只有很长的 begin 记录）时读取全部记录
+        return self.entries[-1].get("op") if self.entries else None
+
+    @property
+    def trash_dir(self) -> Optional[str]:
+        """日志中删除操作所用的回收目录，没有删除过文件时返回 None"""
+        for entry in self.entries:
+            if entry.get("op") == "remove":
+                return os.path.dirname(entry["trash"])
+        return None
+
+    @property
+    def is_committed(self) -> bool:
+        return any(entry.get("op") == "commit" for entry in self.entries)
+
+    @property
+    def is_rolled_back(self) -> bool:
+        return any(entry.get("op") == "rollback" for entry in self.entries)
+
+    @property
+    def is_finished(self) -> bool:
+        # commit 和 rollback 之后不会再追加记录
+        return self.last_op in ("commit", "rollback")
+
+    @property
+    def operation_count(self) -> int:
+        return sum(1 for entry in self.entries if entry.get("op") in ("mkdir", "move", "remove", "rmdir", "create"))
+
+    def _append(self, entry: dict):
+        """追加一条记录并立即落盘"""
+        self._append_many([entry])
+
+    def _append_many(self, entries: List[dict]):
+        """追加多条记录，只落盘一次"""
+        # 先读取已有记录，避免打开文件后把本次写入的记录读入两次
+        current = self.entries
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            # 上次崩溃可能留下没有换行的半条记录，先补上换行
+            if self._file.tell() > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._file.write("\n")
+        self._file.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        current.extend(entries)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def makedirs(self, path: str):
+        """创建目录，并记录实际新建的每一级目录"""
+        missing = []
+        current = os.path.abspath(path)
+        while not os.path.exists(current):
+            missing.append(current)
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
+        for dir_path in reversed(missing):
+            self._append({"op": "mkdir", "path": dir_path})
+            os.makedirs(dir_path, exist_ok=True)
+
+    def move(self, src: str, dst: str):
+        """移动文件"""
+        self._append({"op": "move", "src": os.path.abspath(src), "dst": os.path.abspath(dst)})
+        shutil.move(src, dst)
+
+    def record_moves(self, moves: List[Tuple[str, str]]):
+        """批量记录即将执行的移动操作（由调用方随后执行），还原时未执行的操作会被跳过"""
+        self._append_many([
+            {"op": "move", "src": os.path.abspath(src), "dst": os.path.abspath(dst)}
+            for src, dst in moves
+        ])
+
+    def remove(self, path: str, trash_dir: str):
+        """删除文件：实际移动到回收目录，以便还原"""
+        path = os.path.abspath(path)
+        trash_path = os.path.join(trash_dir, f"{len(self.entries)}_{os.path.basename(path)}")
+        os.makedirs(trash_dir, exist_ok=True)
+        self._append({"op": "remove", "path": path, "trash": trash_path})
+        shutil.move(path, trash_path)
+
+    def rmdir(self, path: str):
+        """删除空目录"""
+        self._append({"op": "rmdir", "path": os.path.abspath(path)})
+        os.rmdir(path)
+
+    def record_create(self, path: str):
+        """记录新建的文件（如分析报告），还原时删除"""
+        self._append({"op": "create", "path": os.path.abspath(path)})
+
+    def commit(self):
+        """标记整理操作已完整执行"""
+        self._append({"op": "commit"})
+        self.close()
+
+    def rollback(self, log=print) -> bool:
+        """按相反顺序重放日志撤销所有操作，返回是否全部成功"""
+        success = True
+        for entry in reversed(self.entries):
+            op = entry.get("op")
+            try:
+                if op == "move":
+                    # 记录在操作之前写入，目标不存在说明该操作没有真正执行
+                    if os.path.exists(entry["dst"]) and not os.path.exists(entry["src"]):
+                        os.makedirs(os.path.dirname(entry["src"]), exist_ok=True)
+                        shutil.move(entry["dst"], entry["src"])
+                elif op == "remove":
+                    if os.path.exists(entry["trash"]) and not os.path.exists(entry["path"]):
+                        os.makedirs(os.path.dirname(entry["path"]), exist_ok=True)
+                        shutil.move(entry["trash"], entry["path"])
+                elif op == "rmdir":
+                    os.makedirs(entry["path"], exist_ok=True)
+                elif op == "mkdir":
+                    if os.path.isdir(entry["path"]) and not os.listdir(entry["path"]):
+                        os.rmdir(entry["path"])
+                elif op == "create":
+                    if os.path.isfile(entry["path"]):
+                        os.remove(entry["path"])
+            except OSError as e:
+                success = False
+                log(f"撤销操作失败：{op} {entry.get('path') or entry.get('dst')} - {str(e)}")
+        # 回收目录中的文件都已放回原处时，一并删除空的回收目录
+        trash_dir = self.trash_dir
+        if trash_dir and os.path.isdir(trash_dir) and not os.listdir(trash_dir):
+            os.rmdir(trash_dir)
+        self._append({"op": "rollback"})
+        self.close()
+        return success
+
+    def discard(self):
+        """删除日志文件"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,297 @@
+"""
+文件智能分类整理工具 - 命令行（无界面）入口。
+
+流程：扫描 -> 分类 -> 生成方案 -> 执行整理 -> 保存报告。
+不导入 PyQt6，适合在服务器或定时任务中无人值守运行。
+
+示例：
+    python organize_cli.py /data/books                     # 只分类并输出整理方案
+    python organize_cli.py /data/books --apply --json      # 分类并执行整理，输出 JSON 结果
+    python organize_cli.py /data/books --plan plan.json --apply
+    python organize_cli.py /data/books --undo              # 撤销最近一次整理
+    python organize_cli.py /data/inbox --watch             # 持续整理新到达的文件，Ctrl+C 退出
+    python organize_cli.py /data/books --profile run.prof  # 在 cProfile 下运行，保存性能分析结果
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from config import Config
+from directory_scanner import scan_directory
+from directory_snapshot import DirectorySnapshot
+from duplicate_detector import DuplicateDetector
+from file_index import FileIndex
+from file_organizer import FileOrganizer
+from move_journal import MoveJournal
+from metrics import get_metrics, run_with_profile
+
+# 退出码
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_EMPTY_DIR = 3
+EXIT_CLASSIFY_FAILED = 4
+EXIT_RECOVERY_REQUIRED = 5
+EXIT_PARTIAL_FAILURE = 6
+
+
+class CliRunner:
+    """命令行整理流程"""
+
+    def __init__(self, args):
+        self.args = args
+        self.root_path = os.path.abspath(args.directory)
+        self.journal_dir = MoveJournal.journal_dir(Config.APP_DATA_DIR)
+        self.log_lines = []
+        self.result = {"root": self.root_path, "status": "ok"}
+        self.timings = {}
+
+    def log(self, message):
+        """日志写到标准错误，标准输出只留给结果"""
+        self.log_lines.append(message)
+        if not self.args.quiet:
+            print(message, file=sys.stderr)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """记录各阶段耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 3)
+
+    def fail(self, code, message):
+        self.result["status"] = "error"
+        self.result["error"] = message
+        self.log(f"错误：{message}")
+        return code
+
+    def run(self):
+        if not os.path.isdir(self.root_path):
+            return self.fail(EXIT_USAGE, f"目录不存在：{self.root_path}")
+
+        if self.args.undo:
+            return self.undo()
+
+        incomplete = MoveJournal.find_incomplete(self.journal_dir, self.root_path)
+        if incomplete:
+            if self.args.recover == "rollback":
+                return self.rollback(incomplete)
+            if self.args.recover == "resume":
+                return self.resume(incomplete)
+            return self.fail(
+                EXIT_RECOVERY_REQUIRED,
+                "该目录有未完成的整理操作，请使用 --recover resume 或 --recover rollback 处理"
+            )
+
+        if self.args.watch:
+            return self.watch()
+
+        with self.stage("scan"):
+            scan = scan_directory(self.root_path, on_error=lambda path, e: self.log(f"读取目录失败：{path} - {str(e)}"))
+        self.result["files"] = len(scan.files)
+        self.log(f"共找到 {len(scan.files)} 个文件")
+        if not scan.files:
+            return self.fail(EXIT_EMPTY_DIR, "目录为空")
+
+        file_paths = scan.file_paths()
+        duplicates = None
+        if not self.args.plan and Config.ENABLE_DUPLICATE_DETECTION:
+            with self.stage("dedup"):
+                duplicates = DuplicateDetector(
+                    on_error=lambda path, e: self.log(f"读取文件失败：{path} - {str(e)}")
+                ).detect(scan.files)
+            if not duplicates.is_empty():
+                self.result["duplicates"] = duplicates.groups
+                self.log(duplicates.summary() + "，每组只分类一次：")
+                for line in duplicates.describe(self.root_path):
+                    self.log(line)
+                file_paths = duplicates.unique_paths(file_paths)
+
+        with self.stage("classify"):
+            analysis_text, category_mapping = self.load_or_classify(file_paths)
+        if category_mapping and duplicates is not None:
+            category_mapping = duplicates.apply(category_mapping)
+        if not category_mapping:
+            return self.fail(EXIT_CLASSIFY_FAILED, "未能获取有效的分类结果")
+        self.result["categories"] = len(category_mapping)
+        self.result["plan"] = category_mapping
+        if analysis_text:
+            self.log(f"\n分析结果：\n{analysis_text}")
+
+        if self.args.save_plan:
+            with open(self.args.save_plan, "w", encoding="utf-8") as f:
+                json.dump(category_mapping, f, ensure_ascii=False, indent=2)
+            self.log(f"整理方案已保存至：{self.args.save_plan}")
+
+        if not self.args.apply:
+            return EXIT_OK
+        return self.apply(scan, category_mapping)
+
+    def load_or_classify(self, file_paths):
+        """读取已有的整理方案，或调用大模型分类"""
+        if self.args.plan:
+            with open(self.args.plan, "r", encoding="utf-8") as f:
+                return None, json.load(f)
+        # 只在需要分类时才导入，读取已有方案时无需加载网络相关模块
+        from file_processor import FileProcessor
+        processor = FileProcessor(
+            api_key=Config.API_KEY,
+            model_name=Config.MODEL_NAME,
+            temperature=Config.TEMPERATURE
+        )
+        return processor.analyze_filenames(file_paths)
+
+    def apply(self, scan, category_mapping):
+        """执行整理方案"""
+        snapshot = DirectorySnapshot(self.root_path)
+        snapshot.take_snapshot(scan)
+        if self.args.backup:
+            with self.stage("backup"):
+                if snapshot.create_backup():
+                    self.result["backup"] = {"path": snapshot.backup_path, "strategy": snapshot.backup_strategy_used}
+                    self.log(f"已创建目录备份：{snapshot.backup_path}（{snapshot.backup_strategy_used}）")
+                else:
+                    return self.fail(EXIT_ERROR, "创建目录备份失败")
+
+        journal = snapshot.begin_journal(category_mapping)
+        organizer = FileOrganizer(
+            self.root_path,
+            journal,
+            file_index=FileIndex.from_scan(scan),
+            trash_dir=snapshot.trash_path,
+            log=self.log
+        )
+        try:
+            with self.stage("move"):
+                organizer.move_files(category_mapping)
+            with self.stage("cleanup"):
+                organizer.cleanup_empty_dirs()
+            report_path = organizer.save_analysis_report(category_mapping, "\n".join(self.log_lines))
+            journal.commit()
+        finally:
+            journal.close()
+        # 只保留最近 JOURNAL_KEEP 次整理的日志和回收目录，避免历史记录不断增长
+        MoveJournal.prune(self.journal_dir, self.root_path, Config.JOURNAL_KEEP)
+
+        self.result.update(organizer.stats)
+        self.result["report"] = report_path
+        self.result["journal"] = journal.path
+        self.log(f"\n分析报告已保存至：{report_path}")
+        if organizer.stats["failed"]:
+            # 有操作失败时保留备份，供手动核对和恢复
+            if snapshot.backup_path:
+                self.log(f"部分操作失败，目录备份保留在：{snapshot.backup_path}")
+            self.result["status"] = "partial"
+            return EXIT_PARTIAL_FAILURE
+        # 整理已完整提交，之后可通过 --undo 按日志撤销，不再需要备份
+        if snapshot.backup_path and snapshot.remove_backup():
+            self.result["backup"]["removed"] = True
+        return EXIT_OK
+
+    def watch(self):
+        """监听目录，按已有分类体系增量整理新到达的文件"""
+        # 只在监听模式下才导入
+        from folder_watcher import FolderWatcher
+        watcher = FolderWatcher(self.root_path, log=self.log)
+        try:
+            with self.stage("watch"):
+                watcher.run()
+        except KeyboardInterrupt:
+            self.log("已停止监听")
+        self.result.update(watcher.stats)
+        if watcher.stats["failed"]:
+            self.result["status"] = "partial"
+            return EXIT_PARTIAL_FAILURE
+        return EXIT_OK
+
+    def undo(self):
+        """撤销该目录最近一次已完成的整理"""
+        journals = [
+            journal for journal in MoveJournal.find_by_root(self.journal_dir, self.root_path)
+            if journal.last_op == "commit"
+        ]
+        if not journals:
+            return self.fail(EXIT_ERROR, "没有可以撤销的整理记录")
+        return self.rollback(journals[-1:])
+
+    def rollback(self, journals):
+        # 整理前的快照清单保存在磁盘上，撤销后与当前目录比较以核对结果
+        snapshot = DirectorySnapshot.find_by_journal(self.root_path, journals[0].path)
+        success = True
+        with self.stage("rollback"):
+            for journal in reversed(journals):
+                if journal.rollback(self.log):
+                    journal.discard()
+                else:
+                    success = False
+        self.result["rolled_back"] = len(journals)
+        if snapshot is not None:
+            with self.stage("verify"):
+                diff = snapshot.diff_with_current()
+            snapshot.manifest.close()
+            self.result["restore_diff"] = diff.summary()
+            if not diff.is_empty():
+                self.log(f"撤销后与整理前的快照仍有差异：{diff.summary()}")
+        if not success:
+            return self.fail(EXIT_PARTIAL_FAILURE, "部分操作未能撤销")
+        self.log("已撤销整理操作")
+        return EXIT_OK
+
+    def resume(self, journals):
+        failed = 0
+        with self.stage("resume"):
+            for journal in journals:
+                stats = FileOrganizer.resume(journal, log=self.log)
+                failed += stats["failed"]
+        self.result["resumed"] = len(journals)
+        self.result["failed"] = failed
+        self.log("已继续完成上次的整理操作")
+        return EXIT_PARTIAL_FAILURE if failed else EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="文件智能分类整理工具（命令行版）")
+    parser.add_argument("directory", help="要整理的目录")
+    parser.add_argument("--apply", action="store_true", help="执行整理（默认只输出整理方案）")
+    parser.add_argument("--plan", help="使用已有的整理方案 JSON 文件，不再调用大模型")
+    parser.add_argument("--save-plan", help="将整理方案保存为 JSON 文件")
+    parser.add_argument("--backup", action="store_true", help="整理前创建目录备份")
+    parser.add_argument("--undo", action="store_true", help="撤销该目录最近一次整理")
+    parser.add_argument("--watch", action="store_true", help="持续监听目录，按已有分类整理新到达的文件")
+    parser.add_argument("--recover", choices=["resume", "rollback"], help="处理上次中断的整理操作")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出结果")
+    parser.add_argument("--quiet", action="store_true", help="不输出处理日志")
+    parser.add_argument("--profile", metavar="FILE", help="在 cProfile 下运行并将统计结果保存到 FILE")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    runner = CliRunner(args)
+    get_metrics().reset()
+    try:
+        # 各模块的提示信息统一输出到标准错误，保证标准输出只有结果
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.profile:
+                exit_code = run_with_profile(runner.run, args.profile)
+            else:
+                exit_code = runner.run()
+    except Exception as e:
+        exit_code = runner.fail(EXIT_ERROR, f"处理过程中出错：{str(e)}")
+
+    runner.result["exit_code"] = exit_code
+    runner.result["timings"] = runner.timings
+    runner.result["metrics"] = get_metrics().snapshot()
+    if args.json:
+        print(json.dumps(runner.result, ensure_ascii=False))
+    elif runner.result["status"] != "error" and "plan" in runner.result and not args.apply:
+        print(json.dumps(runner.result["plan"], ensure_ascii=False, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
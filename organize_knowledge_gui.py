@@ -1,66 +1,205 @@
 import os
 import json
-import shutil
-from datetime import datetime
+import time
+import threading
+from array import array
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                            QHBoxLayout, QPushButton, QTextEdit, QFileDialog,
-                            QLabel, QMessageBox, QProgressDialog)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QRectF
+                            QHBoxLayout, QPushButton, QPlainTextEdit, QFileDialog,
+                            QLabel, QMessageBox, QProgressDialog, QListView, QSplitter)
+from PyQt6.QtCore import (Qt, QThread, pyqtSignal, QRectF, QTimer,
+                          QAbstractListModel, QModelIndex)
 from PyQt6.QtGui import QIcon, QPixmap, QPainter, QPainterPath 
 from file_processor import FileProcessor
 from loading_spinner import LoadingSpinner
-from directory_snapshot import DirectorySnapshot
+from directory_snapshot import DirectorySnapshot, BACKUP_STRATEGY_NAMES
+from file_index import FileIndex
+from file_organizer import FileOrganizer
+from directory_scanner import scan_directory
+from move_journal import MoveJournal
+from duplicate_detector import DuplicateDetector
+from metrics import get_metrics
+from cancellation import CancelToken, OperationCancelled
 from config import Config  # 导入配置类
 
-class WorkerThread(QThread):
-    """后台工作线程，用于处理文件分析和整理"""
+# 日志批量刷新到界面的时间间隔（秒）
+LOG_FLUSH_INTERVAL = 0.1
+
+
+class FileListModel(QAbstractListModel):
+    """
+    文件列表模型，配合 QListView 只渲染可见的行。
+    只保存按相对路径排序的扫描条目序号，显示时才由扫描结果生成路径。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._scan = None
+        self._rows = array("q")
+
+    def set_scan(self, scan):
+        self.beginResetModel()
+        self._scan = scan
+        self._rows = array("q", sorted(scan.file_indexes, key=scan.relative_path)) if scan else array("q")
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            return self._scan.relative_path(self._rows[index.row()])
+        return None
+
+class LogThread(QThread):
+    """带日志缓冲的后台线程基类，日志按时间间隔合并后发送到界面"""
     update_signal = pyqtSignal(str)  # 用于更新UI的信号
+    
+    def __init__(self):
+        super().__init__()
+        self._pending_logs = []
+        self._last_log_emit = 0.0
+        # log 也会在线程池的回调中调用（如每完成一个分类），缓存的读写需要加锁
+        self._log_lock = threading.Lock()
+    
+    def log(self, message):
+        """发送日志消息到UI（按时间间隔合并后批量发送，可从任意线程调用）"""
+        with self._log_lock:
+            self._pending_logs.append(message)
+            due = time.monotonic() - self._last_log_emit >= LOG_FLUSH_INTERVAL
+        if due:
+            self.flush_log()
+    
+    def flush_log(self):
+        """立即发送缓存的日志消息"""
+        with self._log_lock:
+            # 在锁内发送，保证多个线程发送的批次顺序与写入顺序一致
+            if self._pending_logs:
+                self.update_signal.emit("\n".join(self._pending_logs))
+                self._pending_logs = []
+            self._last_log_emit = time.monotonic()
+
+
+class WorkerThread(LogThread):
+    """后台工作线程，用于处理文件分析和整理"""
     result_signal = pyqtSignal(tuple)  # 用于返回分析文本和分类结果的信号
     error_signal = pyqtSignal(str)    # 用于报告错误的信号
+    cancelled_signal = pyqtSignal(tuple)  # 取消后返回已完成的部分结果 (分析文本, 分类结果)
     
-    def __init__(self, base_dir):
+    def __init__(self, base_dir, file_names=None, scan=None):
         super().__init__()
         self.base_dir = base_dir
+        # 协作式取消：批次之间检查，正在进行的请求不再等待
+        self.cancel_token = CancelToken()
+        # 已有扫描结果时直接使用，避免再次遍历目录；路径列表在线程中才生成，分析结束后即释放
+        self.scan = scan
+        self.file_names = file_names
         # 使用配置中的大模型参数
         self.processor = FileProcessor(
             api_key=Config.API_KEY,
             model_name=Config.MODEL_NAME,
             temperature=Config.TEMPERATURE
         )
+        # 结构化输出模式下每完成一个分类就显示出来
+        self.processor.on_category = lambda category, files: self.log(
+            f"已完成分类：{category}（{len(files)} 个文件）"
+        )
+        self.processor.cancel_token = self.cancel_token
     
-    def log(self, message):
-        """发送日志消息到UI"""
-        self.update_signal.emit(message)
+    def cancel(self):
+        """请求取消（线程会在几毫秒内带着已完成的结果结束）"""
+        self.cancel_token.cancel()
     
     def run(self):
         try:
             # 收集文件名
-            file_names = []
-            for root, _, files in os.walk(self.base_dir):
-                for file in files:
-                    # 不再过滤文件类型
-                    file_names.append(os.path.join(root, file))
+            file_names = self.file_names
+            if file_names is None:
+                file_names = (self.scan or scan_directory(self.base_dir)).file_paths()
             
             if not file_names:
                 self.error_signal.emit("目录为空")
                 return
             
-            self.log(f"\n找到 {len(file_names)} 个文件")
-            for file in file_names:
-                self.log(f"- {file}")
+            duplicates = None
+            if self.scan is not None and Config.ENABLE_DUPLICATE_DETECTION:
+                self.log("\n正在检测重复文件...")
+                try:
+                    duplicates = DuplicateDetector(
+                        on_error=lambda path, e: self.log(f"读取文件失败：{path} - {str(e)}"),
+                        cancel_token=self.cancel_token
+                    ).detect(self.scan.files)
+                except OperationCancelled:
+                    self.cancelled_signal.emit(("", {}))
+                    return
+                if not duplicates.is_empty():
+                    self.log(duplicates.summary() + "，每组只分类一次：")
+                    for line in duplicates.describe(self.base_dir):
+                        self.log(line)
+                    file_names = duplicates.unique_paths(file_names)
+            
+            self.log(f"\n找到 {len(file_names)} 个文件，正在分析...")
+            self.flush_log()
             
             # 获取分类结果
             analysis_text, category_mapping = self.processor.analyze_filenames(file_names)
-            if category_mapping:
+            if category_mapping and duplicates is not None:
+                category_mapping = duplicates.apply(category_mapping)
+            if self.processor.cancelled:
+                self.cancelled_signal.emit((analysis_text, category_mapping or {}))
+            elif category_mapping:
                 self.result_signal.emit((analysis_text, category_mapping))
             else:
                 self.error_signal.emit("未能获取有效的分类结果")
         
         except Exception as e:
             self.error_signal.emit(f"处理过程中出错：{str(e)}")
+        finally:
+            self.flush_log()
+
+
+class OrganizeThread(LogThread):
+    """后台整理线程：并行移动文件并清理空目录，避免阻塞界面"""
+    progress_signal = pyqtSignal(int, int)  # 已完成数, 总数
+    finished_signal = pyqtSignal(str)  # 出错时为错误信息，否则为空字符串
+    
+    def __init__(self, organizer, category_mapping):
+        super().__init__()
+        self.organizer = organizer
+        self.organizer.log = self.log
+        self.category_mapping = category_mapping
+        self._cancelled = False
+        self._last_progress_emit = 0.0
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def report_progress(self, done, total):
+        """进度同样按时间间隔发送，避免大量信号堆积"""
+        if done == total or time.monotonic() - self._last_progress_emit >= LOG_FLUSH_INTERVAL:
+            self._last_progress_emit = time.monotonic()
+            self.progress_signal.emit(done, total)
+    
+    def run(self):
+        error = ""
+        try:
+            self.organizer.move_files(
+                self.category_mapping,
+                on_progress=self.report_progress,
+                should_cancel=lambda: self._cancelled
+            )
+            if not self._cancelled:
+                self.organizer.cleanup_empty_dirs()
+        except Exception as e:
+            error = str(e)
+        finally:
+            self.flush_log()
+            self.finished_signal.emit(error)
 
 
 class MainWindow(QMainWindow):
+    # 其他线程中产生的日志经由排队信号转到界面线程
+    log_signal = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         # 使用配置中的应用标题和窗口尺寸
@@ -119,6 +258,8 @@ class MainWindow(QMainWindow):
         self.current_dir = None
         self.category_mapping = None
         self.directory_snapshot = None  # 添加目录快照
+        self.journal = None  # 当前整理操作的日志
+        self.progress_dialog = None  # 整理进度对话框
         self.initUI()
 
         # 创建加载动画
@@ -147,7 +288,8 @@ class MainWindow(QMainWindow):
         self.loading_spinner.stop() # 隐藏加载动画
 
         # 初始加载目录文件
-        self.file_list = []
+        self.file_index = None
+        self.scan_result = None  # 当前目录的扫描结果，目录内容变化后置空
     
     def initUI(self):
         # 主窗口部件
@@ -169,10 +311,29 @@ class MainWindow(QMainWindow):
         top_layout.addWidget(self.start_btn)
         layout.addLayout(top_layout)
         
+        # 文件列表区域（模型/视图，只渲染可见行）
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        self.file_model = FileListModel(self)
+        self.file_view = QListView()
+        self.file_view.setModel(self.file_model)
+        self.file_view.setUniformItemSizes(True)
+        self.file_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.file_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        splitter.addWidget(self.file_view)
+        
         # 日志输出区域
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
-        layout.addWidget(self.log_text)
+        splitter.addWidget(self.log_text)
+        layout.addWidget(splitter)
+        
+        # 日志消息先缓存，由定时器批量追加到界面
+        self._pending_logs = []
+        self.log_timer = QTimer(self)
+        self.log_timer.setSingleShot(True)
+        self.log_timer.setInterval(int(LOG_FLUSH_INTERVAL * 1000))
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_signal.connect(self.update_log, Qt.ConnectionType.QueuedConnection)
         
         # 底部按钮区域
         bottom_layout = QHBoxLayout()
@@ -206,33 +367,82 @@ class MainWindow(QMainWindow):
             self.dir_label.setText(f"当前目录: {dir_path}")
             self.start_btn.setEnabled(True)
             
-            # 创建目录快照
+            # 处理上次崩溃或中断时未完成的整理操作
+            incomplete = MoveJournal.find_incomplete(MoveJournal.journal_dir(Config.APP_DATA_DIR), dir_path)
+            if incomplete:
+                self.recover_incomplete_journals(incomplete)
+            
+            # 每个目录单独统计性能指标，汇总结果写入分析报告
+            get_metrics().reset()
+            
+            # 扫描目录一次，快照、备份、文件列表和文件索引共用扫描结果
+            self.scan_result = scan_directory(dir_path)
+            
+            # 创建目录快照（先清理上一个目录的备份和快照清单）
+            self.cleanup_backup()
             self.directory_snapshot = DirectorySnapshot(dir_path)
-            self.directory_snapshot.take_snapshot()
-            if self.directory_snapshot.create_backup():
+            self.directory_snapshot.take_snapshot(self.scan_result)
+            backup_created = self.directory_snapshot.create_backup()
+            if backup_created:
                 self.restore_btn.setEnabled(True)
             
             # 加载并显示目录中的所有文件
-            self.load_directory_files(dir_path)
+            self.load_directory_files(dir_path, self.scan_result)
+            if backup_created:
+                strategy = self.directory_snapshot.backup_strategy_used
+                self.update_log(f"已创建目录备份，备份方式：{BACKUP_STRATEGY_NAMES.get(strategy, strategy)}")
+            else:
+                self.update_log("警告：创建目录备份失败，将无法还原目录")
+    
+    def recover_incomplete_journals(self, journals):
+        """询问用户继续完成或回滚上次未完成的整理操作"""
+        operation_count = sum(journal.operation_count for journal in journals)
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Icon.Warning)
+        box.setWindowTitle("发现未完成的整理操作")
+        box.setText(f"该目录上次的整理操作没有正常完成（已执行 {operation_count} 个操作）。\n请选择继续完成或回滚到整理前的状态。")
+        resume_btn = box.addButton("继续完成", QMessageBox.ButtonRole.AcceptRole)
+        rollback_btn = box.addButton("回滚", QMessageBox.ButtonRole.DestructiveRole)
+        box.addButton("暂不处理", QMessageBox.ButtonRole.RejectRole)
+        box.exec()
+        
+        clicked = box.clickedButton()
+        try:
+            if clicked == rollback_btn:
+                success = True
+                for journal in reversed(journals):
+                    success = journal.rollback(self.update_log) and success
+                    if success:
+                        journal.discard()
+                if success:
+                    QMessageBox.information(self, "成功", "已回滚上次未完成的整理操作")
+                else:
+                    QMessageBox.warning(self, "警告", "部分操作未能回滚，详情请查看日志")
+            elif clicked == resume_btn:
+                for journal in journals:
+                    FileOrganizer.resume(journal, log=self.update_log)
+                QMessageBox.information(self, "成功", "已继续完成上次的整理操作")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"处理未完成的整理操作时出错：{str(e)}")
     
-    def load_directory_files(self, dir_path):
+    def load_directory_files(self, dir_path, scan=None):
         """加载并显示目录中的所有文件"""
-        self.log_text.clear()
-        self.file_list = []
+        self.clear_log()
+        if scan is None:
+            scan = scan_directory(dir_path)
+        self.scan_result = scan
+        # 同时建立文件名索引，供移动文件时查找
+        self.file_index = FileIndex.from_scan(scan)
         
-        for root, _, files in os.walk(dir_path):
-            for file in files:
-                full_path = os.path.join(root, file)
-                rel_path = os.path.relpath(full_path, dir_path)
-                self.file_list.append(rel_path)
+        self.file_model.set_scan(scan)
         
-        if self.file_list:
-            self.log_text.append("当前目录下的文件：")
-            for file in sorted(self.file_list):
-                self.log_text.append(f"- {file}")
-            self.log_text.append(f"\n共找到 {len(self.file_list)} 个文件")
+        if len(self.file_index):
+            self.update_log(f"共找到 {len(self.file_index)} 个文件")
+            duplicates = self.file_index.duplicates()
+            if duplicates:
+                self.update_log(f"其中有 {len(duplicates)} 个文件名在不同子目录中重复出现")
         else:
-            self.log_text.append("目录为空")
+            self.update_log("目录为空")
             self.start_btn.setEnabled(False)
     
     def restore_directory(self):
@@ -252,7 +462,13 @@ class MainWindow(QMainWindow):
             try:
                 if self.directory_snapshot.restore():
                     self.load_directory_files(self.current_dir)
-                    QMessageBox.information(self, "成功", "目录已还原到初始状态")
+                    # 与选择目录时的快照比较，确认还原结果
+                    diff = self.directory_snapshot.diff_with_current(self.scan_result)
+                    if diff.is_empty():
+                        QMessageBox.information(self, "成功", "目录已还原到初始状态")
+                    else:
+                        self.update_log(f"\n还原后与初始状态仍有差异：{diff.summary()}")
+                        QMessageBox.warning(self, "警告", f"目录已还原，但与初始状态仍有差异：{diff.summary()}")
                 else:
                     QMessageBox.critical(self, "错误", "还原目录失败")
             except Exception as e:
@@ -264,7 +480,10 @@ class MainWindow(QMainWindow):
             self.directory_snapshot.cleanup_backup()
     
     def closeEvent(self, event):
-        """程序关闭时清理备份"""
+        """程序关闭时取消后台分析并清理备份"""
+        if hasattr(self, 'worker') and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
         self.cleanup_backup()
         super().closeEvent(event)
 
@@ -293,7 +512,7 @@ class MainWindow(QMainWindow):
         if not self.current_dir:
             return
         
-        self.log_text.clear()
+        self.clear_log()
         self.start_btn.setEnabled(False)
         self.select_dir_btn.setEnabled(False)
         self.cancel_btn.setEnabled(True)
@@ -303,14 +522,37 @@ class MainWindow(QMainWindow):
         self.loading_spinner.start()
         self.processing_label.show()
         
-        self.worker = WorkerThread(self.current_dir)
+        if self.scan_result is None:
+            self.scan_result = scan_directory(self.current_dir)
+        self.worker = WorkerThread(self.current_dir, scan=self.scan_result)
         self.worker.update_signal.connect(self.update_log)
         self.worker.result_signal.connect(self.handle_results)
         self.worker.error_signal.connect(self.handle_error)
+        self.worker.cancelled_signal.connect(self.handle_cancelled)
         self.worker.start()
     
     def update_log(self, message):
-        self.log_text.append(message)
+        """缓存日志消息，定时批量刷新到界面（可从任意线程调用）"""
+        if QThread.currentThread() != self.thread():
+            # 日志缓存和定时器只在界面线程中访问，其他线程通过排队信号转发
+            self.log_signal.emit(message)
+            return
+        self._pending_logs.append(message)
+        if not self.log_timer.isActive():
+            self.log_timer.start()
+    
+    def flush_log(self):
+        """将缓存的日志消息一次性追加到界面"""
+        self.log_timer.stop()
+        if self._pending_logs:
+            self.log_text.appendPlainText("\n".join(self._pending_logs))
+            self._pending_logs = []
+    
+    def clear_log(self):
+        """清空日志"""
+        self._pending_logs = []
+        self.log_timer.stop()
+        self.log_text.clear()
     
     def handle_results(self, results):
         try:
@@ -321,11 +563,11 @@ class MainWindow(QMainWindow):
             analysis_text, category_mapping = results
             self.category_mapping = category_mapping
             
-            self.log_text.append("\n分析结果：")
-            self.log_text.append(analysis_text)
+            self.update_log("\n分析结果：")
+            self.update_log(analysis_text)
             
-            self.log_text.append("\n\n分类结果：")
-            self.log_text.append(json.dumps(category_mapping, ensure_ascii=False, indent=2))
+            self.update_log("\n\n分类结果：")
+            self.update_log(json.dumps(category_mapping, ensure_ascii=False, indent=2))
             
             self.confirm_btn.setEnabled(True)
             self.regenerate_btn.setEnabled(True)
@@ -336,6 +578,35 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "错误", f"处理结果时出错：{str(e)}")
             self.reset_ui()
     
+    def handle_cancelled(self, results):
+        """分析被取消：询问是否使用已完成分类的部分结果"""
+        self.loading_spinner.stop()
+        self.processing_label.hide()
+
+        _, category_mapping = results
+        count = sum(len(files) for files in category_mapping.values())
+        if not count:
+            self.update_log("\n已取消分析")
+            self.reset_ui()
+            return
+
+        message = f"分析已取消，已有 {count} 个文件完成分类"
+        if Config.ENABLE_CLASSIFICATION_CACHE:
+            message += "（结果已保存到分类缓存，重新分析时这些文件不会再请求大模型）"
+        message += "。\n\n是否查看并使用已完成的分类结果整理这些文件？其余文件保持不动。"
+        reply = QMessageBox.question(
+            self,
+            "已取消",
+            message,
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.Yes
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.handle_results(results)
+        else:
+            self.update_log(f"\n已取消分析，{count} 个文件的分类结果未使用")
+            self.reset_ui()
+
     def handle_error(self, error_message):
         # 隐藏加载动画和提示
         self.loading_spinner.stop()
@@ -350,74 +621,83 @@ class MainWindow(QMainWindow):
             return
         
         try:
-            # 移动文件
-            self.move_files(self.category_mapping)
-
-            # 等待一小段时间确保文件移动完成
-            QApplication.processEvents()
-
-            # 清理空目录
-            self.cleanup_empty_dirs()
-
+            # 记录整理操作日志，用于还原或崩溃后恢复
+            self.journal = self.directory_snapshot.begin_journal(self.category_mapping)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"处理过程中出错：{str(e)}")
+            self.reset_ui()
+            return
+        
+        self.confirm_btn.setEnabled(False)
+        self.regenerate_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        self.select_dir_btn.setEnabled(False)
+        self.start_btn.setEnabled(False)
+        
+        # 移动文件和清理空目录在后台线程执行，界面显示进度并可随时取消
+        self.organize_thread = OrganizeThread(self.create_organizer(), self.category_mapping)
+        self.progress_dialog = QProgressDialog("正在整理文件...", "取消", 0, 0, self)
+        self.progress_dialog.setWindowTitle("整理文件")
+        self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress_dialog.setMinimumDuration(500)
+        self.progress_dialog.canceled.connect(self.organize_thread.cancel)
+        self.organize_thread.update_signal.connect(self.update_log)
+        self.organize_thread.progress_signal.connect(self.update_organize_progress)
+        self.organize_thread.finished_signal.connect(self.finish_organizing)
+        self.organize_thread.start()
+    
+    def update_organize_progress(self, done, total):
+        if self.progress_dialog is None:
+            return
+        self.progress_dialog.setMaximum(total)
+        self.progress_dialog.setValue(done)
+        self.progress_dialog.setLabelText(f"正在整理文件...（{done}/{total}）")
+    
+    def finish_organizing(self, error):
+        """整理线程结束后保存报告并提交操作日志"""
+        if self.progress_dialog is not None:
+            self.progress_dialog.canceled.disconnect()
+            self.progress_dialog.close()
+            self.progress_dialog = None
+        cancelled = self.organize_thread.organizer.stats["cancelled"]
+        try:
+            if error:
+                raise RuntimeError(error)
+            
             # 保存分析报告
             self.save_analysis_report()
+            # 取消时已完成的移动同样提交，可以通过还原目录撤销
+            self.journal.commit()
+            # 目录内容已变化，下次处理前重新扫描
+            self.scan_result = None
             self.restore_btn.setEnabled(True)
             
-            QMessageBox.information(self, "成功", "文件整理完成！")
+            if cancelled:
+                QMessageBox.information(self, "已取消", "整理已取消，已移动的文件可以通过“还原目录”撤销")
+            else:
+                QMessageBox.information(self, "成功", "文件整理完成！")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"处理过程中出错：{str(e)}")
-            self.log_text.append(f"\n错误：{str(e)}")
+            self.update_log(f"\n错误：{str(e)}")
+            self.restore_btn.setEnabled(True)
         finally:
+            if self.journal:
+                self.journal.close()
+                self.journal = None
             self.reset_ui()
     
-    def move_files(self, category_mapping):
-        """移动文件到对应目录"""
-        moved_files = set()
-        for category, files in category_mapping.items():
-            category_dir = os.path.join(self.current_dir, category)
-            os.makedirs(category_dir, exist_ok=True)
-            
-            for file_name in files:
-                if file_name in moved_files:
-                    self.update_log(f"警告：文件'{file_name}'已经被移动过")
-                    continue
-                
-                src_file = self.find_file(file_name)
-                if src_file:
-                    try:
-                        shutil.move(src_file, os.path.join(category_dir, file_name))
-                        moved_files.add(file_name)
-                        self.update_log(f"已移动：'{file_name}' -> {category}")
-                    except Exception as e:
-                        self.update_log(f"移动文件'{file_name}'时出错：{str(e)}")
+    def create_organizer(self, trash_dir=None):
+        """创建整理器，复用当前的文件索引和操作日志"""
+        if self.file_index is None:
+            self.file_index = FileIndex.build(self.current_dir)
+        return FileOrganizer(
+            self.current_dir,
+            self.journal,
+            file_index=self.file_index,
+            trash_dir=trash_dir or self.directory_snapshot.trash_path,
+            log=self.update_log
+        )
     
-    def cleanup_empty_dirs(self):
-        """清理所有空目录，包括删除隐藏文件"""
-        # 从下往上遍历目录树，这样可以先处理最深的目录
-        for root, dirs, files in os.walk(self.current_dir, topdown=False):
-            # 跳过当前目录
-            if root == self.current_dir:
-                continue
-
-            # 删除隐藏文件（如 .DS_Store）
-            for item in os.listdir(root):
-                item_path = os.path.join(root, item)
-                if os.path.isfile(item_path) and item.startswith('.'):
-                    try:
-                        os.remove(item_path)
-                        self.update_log(f"已删除隐藏文件：{os.path.relpath(item_path, self.current_dir)}")
-                    except Exception as e:
-                        self.update_log(f"删除隐藏文件失败：{os.path.relpath(item_path, self.current_dir)} - {str(e)}")
-
-            # 检查目录是否为空
-            if not os.listdir(root):
-                try:
-                    os.rmdir(root)
-                    self.update_log(f"已删除空目录：{os.path.relpath(root, self.current_dir)}")
-                except OSError as e:
-                    self.update_log(f"删除目录失败：{os.path.relpath(root, self.current_dir)} - {str(e)}")
-            else:
-                self.update_log(f"目录不为空，跳过：{os.path.relpath(root, self.current_dir)}")
     def cleanup_analysis_reports(self):
         """清理目录中的旧分析报告"""
         if not self.current_dir:
@@ -445,31 +725,15 @@ class MainWindow(QMainWindow):
     def save_analysis_report(self):
         """保存分析报告"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            report_path = os.path.join(self.current_dir, f"file_analysis_report_{timestamp}.txt")
-            
-            with open(report_path, "w", encoding="utf-8") as f:
-                f.write("文件分类分析报告\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"目录路径：{self.current_dir}\n\n")
-                f.write("分类结果：\n")
-                f.write(json.dumps(self.category_mapping, ensure_ascii=False, indent=2))
-                f.write("\n\n处理日志：\n")
-                f.write(self.log_text.toPlainText())
-            
+            self.flush_log()
+            report_path = self.create_organizer().save_analysis_report(
+                self.category_mapping, self.log_text.toPlainText()
+            )
             self.update_log(f"\n分析报告已保存至：{report_path}")
         except Exception as e:
             self.update_log(f"\n保存分析报告时出错：{str(e)}")
             raise
     
-    def find_file(self, file_name):
-        """在目录中查找文件"""
-        for root, _, files in os.walk(self.current_dir):
-            if file_name in files:
-                return os.path.join(root, file_name)
-        return None
-    
     def regenerate(self):
         """重新生成分类"""
         if not self.current_dir:
@@ -487,9 +751,11 @@ class MainWindow(QMainWindow):
     def cancel_operation(self):
         """取消操作"""
         if hasattr(self, 'worker') and self.worker.isRunning():
-            self.worker.terminate()
-            self.loading_spinner.stop()
-            self.processing_label.hide()
+            # 协作式取消，线程结束后通过 handle_cancelled 返回已完成的部分结果
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.update_log("\n正在取消...")
+            return
         self.reset_ui()
     
     def reset_ui(self):
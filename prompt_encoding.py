@@ -0,0 +1,126 @@
+import os
+
+
+class EncodedFileList:
+    """
+    文件列表的紧凑编码。
+    相同的目录前缀只在目录表中出现一次，每个文件用数字编号表示，
+    大模型按编号返回分类结果，再映射回真实路径。
+    """
+
+    def __init__(self, file_names, snippets=None):
+        self.file_names = list(file_names)
+        # 文件内容摘要 {路径: 摘要}（可选），附在对应文件行的末尾
+        self.snippets = snippets or {}
+        dir_names = [os.path.dirname(name) for name in self.file_names]
+        self.base_dir = ""
+        if dir_names and all(dir_names):
+            try:
+                self.base_dir = os.path.commonpath(dir_names)
+            except ValueError:  # 绝对路径和相对路径混用
+                pass
+        self.dir_ids = {}
+        self.entries = []
+        for name, dir_name in zip(self.file_names, dir_names):
+            relative_dir = os.path.relpath(dir_name, self.base_dir) if self.base_dir else dir_name
+            dir_id = self.dir_ids.setdefault(relative_dir, len(self.dir_ids))
+            self.entries.append((dir_id, os.path.basename(name)))
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def to_text(self):
+        """生成提示词中的文件列表文本"""
+        lines = []
+        if self.base_dir:
+            lines.append(f"根目录：{self.base_dir}")
+        lines.append("目录表（编号=相对路径）：")
+        for relative_dir, dir_id in self.dir_ids.items():
+            lines.append(f"D{dir_id}={relative_dir or '.'}")
+        if self.snippets:
+            lines.append("文件（编号|目录|文件名|内容摘要，没有摘要的文件省略最后一项）：")
+        else:
+            lines.append("文件（编号|目录|文件名）：")
+        for file_id, (dir_id, base_name) in enumerate(self.entries):
+            snippet = self.snippets.get(self.file_names[file_id])
+            if snippet:
+                lines.append(f"{file_id}|D{dir_id}|{base_name}|{snippet}")
+            else:
+                lines.append(f"{file_id}|D{dir_id}|{base_name}")
+        return "\n".join(lines)
+
+    def resolve(self, value):
+        """将模型返回的文件编号映射回真实路径，无法识别时返回 None"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, str):
+            value = value.strip()
+            if not value.isdigit():
+                return None
+        try:
+            file_id = int(value)
+        except (TypeError, ValueError):
+            return None
+        if 0 <= file_id < len(self.file_names):
+            return self.file_names[file_id]
+        return None
+
+    def decode_mapping(self, mapping, seen=None):
+        """
+        将 {分类: [编号, ...]} 转换为 {分类: [路径, ...]}，忽略无效编号和重复编号。
+        seen 为已经分配过分类的路径集合，多次调用时可传入同一个集合。
+        """
+        result = {}
+        seen = set() if seen is None else seen
+        for category, values in mapping.items():
+            for value in values:
+                path = self.resolve(value)
+                if path is None or path in seen:
+                    continue
+                seen.add(path)
+                result.setdefault(category, []).append(path)
+        return result
+
+    def decode_scored_mapping(self, mapping, threshold, seen=None, uncategorized=()):
+        """
+        解码带置信度的分类结果 {分类: [[编号, 置信度], ...]}。
+        返回 (mapping, low)：mapping 为置信度达到 threshold 的 {分类: [路径, ...]}；
+        low 为需要进一步确认的 [(路径, 分类), ...]，包括置信度不足、缺少置信度
+        以及被归入 uncategorized 中分类的文件。
+        """
+        result = {}
+        low = []
+        seen = set() if seen is None else seen
+        for category, values in mapping.items():
+            for value in values:
+                confidence = None
+                if isinstance(value, (list, tuple)):
+                    if not value:
+                        continue
+                    if len(value) > 1:
+                        confidence = self.parse_confidence(value[1])
+                    value = value[0]
+                path = self.resolve(value)
+                if path is None or path in seen:
+                    continue
+                seen.add(path)
+                if category in uncategorized or confidence is None or confidence < threshold:
+                    low.append((path, category))
+                else:
+                    result.setdefault(category, []).append(path)
+        return result, low
+
+    @staticmethod
+    def parse_confidence(value):
+        """将模型返回的置信度转换为 0~1 的小数（支持百分数），无法识别时返回 None"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, str):
+            value = value.strip().rstrip("%")
+        try:
+            confidence = float(value)
+        except (TypeError, ValueError):
+            return None
+        if confidence > 1:
+            confidence /= 100
+        return max(0.0, min(confidence, 1.0))
@@ -0,0 +1,111 @@
+import os
+import re
+import json
+import mimetypes
+
+# 默认规则：类型明确、无需大模型判断的文件
+# 文档类（pdf、epub 等）需要根据文件名理解主题，不在默认规则中
+DEFAULT_RULES = {
+    "extensions": {
+        "图片": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".heic", ".tif", ".tiff", ".svg", ".raw"],
+        "视频": [".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv", ".webm", ".m4v", ".rmvb"],
+        "音频": [".mp3", ".wav", ".flac", ".aac", ".ogg", ".m4a", ".wma", ".ape"],
+        "压缩包": [".zip", ".rar", ".7z", ".tar", ".gz", ".tgz", ".bz2", ".xz"],
+        "安装包与镜像": [".iso", ".img", ".dmg", ".exe", ".msi", ".pkg", ".deb", ".rpm", ".apk", ".appimage"],
+        "字体": [".ttf", ".otf", ".woff", ".woff2"],
+        "种子文件": [".torrent"],
+    },
+    "patterns": {
+        "图片/截图": [r"(?i)^(screenshot|screen shot|屏幕截图|截屏)"],
+    },
+    "keywords": {},
+}
+
+# MIME 大类到分类的映射，扩展名规则未命中时使用
+MIME_CATEGORIES = {
+    "image": "图片",
+    "video": "视频",
+    "audio": "音频",
+}
+
+
+class RuleClassifier:
+    """
+    本地规则分类器：按正则、关键词、扩展名和 MIME 类型批量分类文件，
+    能确定分类的文件不再发送给大模型。
+    """
+
+    def __init__(self, rules=None):
+        rules = rules or DEFAULT_RULES
+        self.extension_map = {}
+        for category, extensions in rules.get("extensions", {}).items():
+            for extension in extensions:
+                self.extension_map[extension.lower()] = category
+
+        # 所有正则合并为一个带命名分组的表达式，每个文件名只匹配一次
+        self.pattern_categories = []
+        pattern_parts = []
+        for category, patterns in rules.get("patterns", {}).items():
+            for pattern in patterns:
+                group = f"p{len(self.pattern_categories)}"
+                self.pattern_categories.append(category)
+                pattern_parts.append(f"(?P<{group}>{self._inline_flags(pattern)})")
+        self.pattern_regex = re.compile("|".join(pattern_parts)) if pattern_parts else None
+
+        # 关键词同样合并为一个表达式，长关键词优先
+        self.keyword_map = {}
+        for category, keywords in rules.get("keywords", {}).items():
+            for keyword in keywords:
+                self.keyword_map[keyword.lower()] = category
+        keywords = sorted(self.keyword_map, key=len, reverse=True)
+        self.keyword_regex = re.compile("|".join(re.escape(k) for k in keywords)) if keywords else None
+
+    @staticmethod
+    def _inline_flags(pattern):
+        """合并表达式时全局标志不能出现在中间，改写为局部标志"""
+        match = re.match(r"^\(\?([aiLmsux]+)\)", pattern)
+        if match:
+            return f"(?{match.group(1)}:{pattern[match.end():]})"
+        return pattern
+
+    @classmethod
+    def from_file(cls, rules_path=None):
+        """加载规则文件（JSON），文件中的规则覆盖同名的默认规则"""
+        rules = {key: dict(value) for key, value in DEFAULT_RULES.items()}
+        if rules_path and os.path.exists(rules_path):
+            with open(rules_path, "r", encoding="utf-8") as f:
+                custom_rules = json.load(f)
+            for key in ("extensions", "patterns", "keywords"):
+                rules[key].update(custom_rules.get(key, {}))
+        return cls(rules)
+
+    def classify_one(self, file_name):
+        """返回单个文件的分类，无法确定时返回 None"""
+        base_name = os.path.basename(file_name)
+        if self.pattern_regex:
+            match = self.pattern_regex.search(base_name)
+            if match:
+                return self.pattern_categories[int(match.lastgroup[1:])]
+        if self.keyword_regex:
+            match = self.keyword_regex.search(base_name.lower())
+            if match:
+                return self.keyword_map[match.group(0)]
+        extension = os.path.splitext(base_name)[1].lower()
+        if extension in self.extension_map:
+            return self.extension_map[extension]
+        mime_type, _ = mimetypes.guess_type(base_name, strict=False)
+        if mime_type:
+            return MIME_CATEGORIES.get(mime_type.split("/", 1)[0])
+        return None
+
+    def classify(self, file_names):
+        """批量分类，返回 (分类映射, 未能分类的文件列表)"""
+        category_mapping = {}
+        remaining = []
+        for file_name in file_names:
+            category = self.classify_one(file_name)
+            if category:
+                category_mapping.setdefault(category, []).append(file_name)
+            else:
+                remaining.append(file_name)
+        return category_mapping, remaining
@@ -0,0 +1,208 @@
+import os
+import json
+import sqlite3
+import hashlib
+import tempfile
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+from directory_scanner import FileInfo
+
+# 批量写入时每次 executemany 的条目数
+INSERT_BATCH_SIZE = 5000
+
+# 查询结果中条目的列顺序，与 row_to_info 对应
+ENTRY_COLUMNS = "path, is_dir, size, mtime_ns, inode, device, is_symlink"
+
+
+class SnapshotManifest:
+    """
+    保存在磁盘上的目录快照清单（SQLite）。
+    每个条目只保存相对路径及其父目录、大小、修改时间和 inode，按扫描顺序批量写入，
+    并在路径、父目录和 inode 上建立索引；读取时逐行产生 FileInfo，不会一次性载入内存。
+    程序崩溃或重启后仍可以重新打开，用于还原后的核对和目录差异比较。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        db_dir = os.path.dirname(path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY, path TEXT NOT NULL, parent TEXT NOT NULL, "
+            "is_dir INTEGER NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "inode INTEGER NOT NULL, device INTEGER NOT NULL, is_symlink INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._root_path = self.get_meta("root")
+
+    @staticmethod
+    def manifest_dir(app_data_dir: str) -> str:
+        return os.path.join(app_data_dir, "snapshots")
+
+    @staticmethod
+    def root_hash(root_path: str) -> str:
+        return hashlib.sha1(os.path.abspath(root_path).encode("utf-8")).hexdigest()[:10]
+
+    @classmethod
+    def create(cls, manifest_dir: str, root_path: str, snapshot_time: datetime,
+               temporary: bool = False, keep: int = 0) -> "SnapshotManifest":
+        """
+        为 root_path 创建新的快照清单。
+        temporary 为 True 时创建临时清单（仅用于一次差异比较，不会被 find_by_root 找到）；
+        keep 大于 0 时只保留该目录最近的 keep 个清单（含新建的这个）。
+        """
+        os.makedirs(manifest_dir, exist_ok=True)
+        if temporary:
+            fd, path = tempfile.mkstemp(prefix="current_", suffix=".db", dir=manifest_dir)
+            os.close(fd)
+        else:
+            if keep > 0:
+                for old in cls.find_by_root(manifest_dir, root_path)[:-(keep - 1) or None]:
+                    cls.discard_path(old)
+            timestamp = snapshot_time.strftime("%Y%m%d_%H%M%S_%f")
+            path = os.path.join(manifest_dir, f"{timestamp}_{cls.root_hash(root_path)}.db")
+        manifest = cls(path)
+        manifest.set_meta("root", os.path.abspath(root_path))
+        manifest.set_meta("time", snapshot_time.isoformat())
+        return manifest
+
+    @classmethod
+    def find_by_root(cls, manifest_dir: str, root_path: str) -> List[str]:
+        """查找指定目录的快照清单路径，按创建时间排序"""
+        if not os.path.isdir(manifest_dir):
+            return []
+        suffix = f"_{cls.root_hash(root_path)}.db"
+        return [
+            os.path.join(manifest_dir, name) for name in sorted(os.listdir(manifest_dir))
+            if name.endswith(suffix) and not name.startswith("current_")
+        ]
+
+    @property
+    def root_path(self) -> Optional[str]:
+        return self._root_path
+
+    def get_meta(self, key: str, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key: str, value):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+        if key == "root":
+            self._root_path = value
+
+    def write_entries(self, entries: Iterable[FileInfo]) -> int:
+        """按扫描顺序分批写入条目（可以是扫描过程中产生的迭代器），返回条目数"""
+        count = 0
+        batch = []
+        with self._conn:
+            self._conn.execute("DROP INDEX IF EXISTS idx_entries_path")
+            self._conn.execute("DELETE FROM entries")
+            for entry in entries:
+                batch.append((
+                    entry.path, entry.path.rpartition(os.sep)[0], int(entry.is_dir), entry.size,
+                    entry.mtime_ns, entry.inode, entry.device, int(entry.is_symlink)
+                ))
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    count += self._insert(batch)
+                    batch = []
+            if batch:
+                count += self._insert(batch)
+            # 写入完成后再建索引，比逐行维护索引更快（扫描结果中的路径本身不会重复）
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_path ON entries(path)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_parent ON entries(parent)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_inode ON entries(device, inode)")
+        return count
+
+    def _insert(self, rows) -> int:
+        self._conn.executemany(
+            "INSERT INTO entries (path, parent, is_dir, size, mtime_ns, inode, device, is_symlink) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return len(rows)
+
+    def row_to_info(self, row, root_path: Optional[str] = None) -> FileInfo:
+        path, is_dir, size, mtime_ns, inode, device, is_symlink = row
+        return FileInfo(
+            path=path,
+            is_dir=bool(is_dir),
+            original_path=os.path.join(root_path or self._root_path, path),
+            size=size,
+            mtime_ns=mtime_ns,
+            inode=inode,
+            device=device,
+            is_symlink=bool(is_symlink)
+        )
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def iter_entries(self) -> Iterator[FileInfo]:
+        """按扫描顺序逐个产生条目，父目录总是先于其内容"""
+        for row in self._conn.execute(f"SELECT {ENTRY_COLUMNS} FROM entries ORDER BY id"):
+            yield self.row_to_info(row)
+
+    def first_regular_file(self) -> Optional[FileInfo]:
+        """返回第一个普通文件（非符号链接）"""
+        row = self._conn.execute(
+            f"SELECT {ENTRY_COLUMNS} FROM entries WHERE is_dir = 0 AND is_symlink = 0 ORDER BY id LIMIT 1"
+        ).fetchone()
+        return self.row_to_info(row) if row else None
+
+    def compare(self, other: "SnapshotManifest") -> Tuple[List[FileInfo], List[FileInfo], List[Tuple[FileInfo, FileInfo]]]:
+        """
+        在 SQLite 中与另一个清单比较（不把任何一方完整载入内存）。
+        返回 (只在本清单中的条目, 只在 other 中的条目, 路径相同但大小或修改时间不同的文件 [(旧, 新)])。
+        """
+        self._conn.execute("ATTACH DATABASE ? AS other", (other.path,))
+        try:
+            removed = [
+                self.row_to_info(row) for row in self._conn.execute(
+                    f"SELECT {ENTRY_COLUMNS} FROM main.entries AS o WHERE NOT EXISTS "
+                    "(SELECT 1 FROM other.entries AS n WHERE n.path = o.path) ORDER BY o.id"
+                )
+            ]
+            added = [
+                self.row_to_info(row, other.root_path) for row in self._conn.execute(
+                    f"SELECT {ENTRY_COLUMNS} FROM other.entries AS n WHERE NOT EXISTS "
+                    "(SELECT 1 FROM main.entries AS o WHERE o.path = n.path) ORDER BY n.id"
+                )
+            ]
+            modified = []
+            columns = ", ".join(f"o.{name}" for name in ENTRY_COLUMNS.split(", "))
+            other_columns = ", ".join(f"n.{name}" for name in ENTRY_COLUMNS.split(", "))
+            for row in self._conn.execute(
+                f"SELECT {columns}, {other_columns} FROM main.entries AS o "
+                "JOIN other.entries AS n ON n.path = o.path "
+                "WHERE o.is_dir = 0 AND n.is_dir = 0 AND (o.size != n.size OR o.mtime_ns != n.mtime_ns) "
+                "ORDER BY o.id"
+            ):
+                modified.append((self.row_to_info(row[:7]), self.row_to_info(row[7:], other.root_path)))
+            return removed, added, modified
+        finally:
+            self._conn.execute("DETACH DATABASE other")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def discard(self):
+        """关闭并删除清单文件"""
+        self.close()
+        self.discard_path(self.path)
+
+    @staticmethod
+    def discard_path(path: str):
+        for name in (path, path + "-wal", path + "-shm"):
+            if os.path.exists(name):
+                os.remove(name)
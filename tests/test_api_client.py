@@ -0,0 +1,57 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from api_client import GeminiClient
+from cancellation import CancelToken, OperationCancelled
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_gemini_server import MockGeminiServer  # noqa: E402
+
+PAYLOAD = {"contents": [{"parts": [{"text": "a.txt"}]}]}
+
+
+@pytest.fixture
+def server():
+    server = MockGeminiServer(latency=5.0)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client():
+    client = GeminiClient(max_connections=1, requests_per_minute=6000)
+    yield client
+    client.close()
+
+
+def test_cancel_aborts_in_flight_request_and_frees_its_slot(server, client):
+    url = f"{server.base_url}/models/m:generateContent"
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(OperationCancelled):
+        client.post_json(url, PAYLOAD, cancel_token=token)
+    assert time.monotonic() - start < 1.0
+    assert client.concurrency.in_flight == 0
+
+    # 下一次运行不必等待被取消的请求
+    server.latency = 0.0
+    start = time.monotonic()
+    assert client.post_json(url, PAYLOAD, cancel_token=CancelToken()) is not None
+    assert time.monotonic() - start < 1.0
+
+
+def test_cancel_during_stream(server, client):
+    url = f"{server.base_url}/models/m:streamGenerateContent?alt=sse"
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(OperationCancelled):
+        list(client.stream_json(url, PAYLOAD, cancel_token=token))
+    assert time.monotonic() - start < 1.0
+    assert client.concurrency.in_flight == 0
@@ -0,0 +1,66 @@
+import itertools
+
+import pytest
+
+import classification_cache
+from classification_cache import ClassificationCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "cache.db"), "model-a", 0.2, "v1")
+    yield cache
+    cache.close()
+
+
+def test_key_normalizes_path_case_and_unicode(cache):
+    key = cache.make_key("Café.txt")
+    assert cache.make_key("/some/dir/CAFÉ.TXT") == key
+    assert cache.make_key("C:\\docs\\Cafe\u0301.txt") == key
+    assert cache.make_key("other.txt") != key
+
+
+def test_key_depends_on_model_temperature_and_prompt(tmp_path, cache):
+    key = cache.make_key("a.txt")
+    for args in (("model-b", 0.2, "v1"), ("model-a", 0.7, "v1"), ("model-a", 0.2, "v2")):
+        other = ClassificationCache(str(tmp_path / "other.db"), *args)
+        try:
+            assert other.make_key("a.txt") != key
+        finally:
+            other.close()
+
+
+def test_round_trip_by_name(cache):
+    cache.put_mapping({"文档": ["dir/a.txt", "b.txt"], "图片": ["c.png"]})
+    assert cache.get_many(["other/A.TXT", "c.png", "d.txt"]) == {"other/A.TXT": "文档", "c.png": "图片"}
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    # 每次调用时间递增，避免时钟精度导致的并列
+    clock = itertools.count(1)
+    monkeypatch.setattr(classification_cache.time, "time", lambda: float(next(clock)))
+    cache = ClassificationCache(str(tmp_path / "lru.db"), "model-a", 0.2, "v1", max_entries=2)
+    try:
+        cache.put_mapping({"A": ["a.txt"]})
+        cache.put_mapping({"B": ["b.txt"]})
+        cache.get_many(["a.txt"])
+        cache.put_mapping({"C": ["c.txt"]})
+        assert cache.get_many(["a.txt", "b.txt", "c.txt"]) == {"a.txt": "A", "c.txt": "C"}
+    finally:
+        cache.close()
+
+
+def test_key_includes_content_when_given(cache):
+    plain = cache.make_key("a.txt")
+    empty = cache.make_key("a.txt", "")
+    assert empty != plain
+    assert cache.make_key("a.txt", "第一章") != empty
+    assert cache.make_key("dir/A.txt", "第一章") == cache.make_key("a.txt", "第一章")
+
+
+def test_same_name_with_different_content_misses(cache):
+    cache.put_mapping({"小说": ["x/book.txt"]}, contents={"x/book.txt": "从前有座山"})
+    contents = {"x/book.txt": "从前有座山", "y/book.txt": "季度财务报表"}
+    assert cache.get_many(["x/book.txt", "y/book.txt"], contents) == {"x/book.txt": "小说"}
+    # 不按内容分类时的缓存与按内容分类时互不影响
+    assert cache.get_many(["x/book.txt"]) == {}
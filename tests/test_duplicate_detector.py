@@ -0,0 +1,74 @@
+import os
+
+import duplicate_detector
+from directory_scanner import scan_directory
+from duplicate_detector import PARTIAL_HASH_BYTES, DuplicateDetector, DuplicateReport
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def detect(root, **kwargs):
+    return DuplicateDetector(max_workers=2, **kwargs).detect(scan_directory(root).files)
+
+
+def test_groups_identical_files_and_keeps_shallowest(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, "deep", "sub", "a.txt"), b"same")
+    write(os.path.join(root, "a.txt"), b"same")
+    write(os.path.join(root, "b.txt"), b"diff")
+    write(os.path.join(root, "empty1"), b"")
+    write(os.path.join(root, "empty2"), b"")
+
+    report = detect(root)
+    assert report.groups == [[os.path.join(root, "a.txt"), os.path.join(root, "deep", "sub", "a.txt")]]
+    assert report.duplicate_count == 1
+
+
+def test_large_files_differing_in_the_middle_are_not_duplicates(tmp_path):
+    root = str(tmp_path)
+    size = PARTIAL_HASH_BYTES * 4
+    data = bytearray(size)
+    write(os.path.join(root, "a.bin"), bytes(data))
+    write(os.path.join(root, "b.bin"), bytes(data))
+    data[size // 2] = 1
+    write(os.path.join(root, "c.bin"), bytes(data))
+
+    report = detect(root)
+    assert report.groups == [[os.path.join(root, "a.bin"), os.path.join(root, "b.bin")]]
+
+
+def test_hard_links_are_not_reported(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, "a.txt"), b"same")
+    os.link(os.path.join(root, "a.txt"), os.path.join(root, "b.txt"))
+    assert detect(root).is_empty()
+
+
+def test_file_emptied_before_full_hash_is_reported_not_fatal(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    size = PARTIAL_HASH_BYTES * 4
+    for name in ("a.bin", "b.bin", "c.bin"):
+        write(os.path.join(root, name), b"x" * size)
+    files = scan_directory(root).files
+    # 部分哈希之后、完整哈希之前被清空的文件
+    monkeypatch.setattr(duplicate_detector, "partial_hash", lambda path, size: "same")
+    write(os.path.join(root, "c.bin"), b"")
+
+    errors = []
+    report = DuplicateDetector(on_error=lambda path, e: errors.append(path)).detect(files)
+    assert errors == [os.path.join(root, "c.bin")]
+    assert report.groups == [[os.path.join(root, "a.bin"), os.path.join(root, "b.bin")]]
+
+
+def test_quarantine_adds_copies_to_duplicate_dir():
+    report = DuplicateReport([["/r/a.txt", "/r/x/a.txt"]])
+    mapping = {"文档": ["/r/a.txt"]}
+    assert report.apply(mapping, action="report") is mapping
+    quarantined = report.apply(mapping, action="quarantine")
+    assert quarantined["文档"] == ["/r/a.txt"]
+    assert list(quarantined.values())[-1] == ["/r/x/a.txt"]
+    assert report.unique_paths(["/r/a.txt", "/r/x/a.txt"]) == ["/r/a.txt"]
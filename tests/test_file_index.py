@@ -0,0 +1,54 @@
+import os
+
+from file_index import FileIndex
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+
+def build(tmp_path):
+    root = str(tmp_path)
+    for relative in ("a/report.pdf", "b/report.pdf", "b/notes.txt"):
+        touch(os.path.join(root, relative))
+    return root, FileIndex.build(root)
+
+
+def test_lookup_by_name_returns_all_same_name_files(tmp_path):
+    root, index = build(tmp_path)
+    assert len(index) == 3
+    assert sorted(index.lookup("report.pdf")) == [
+        os.path.join(root, "a", "report.pdf"), os.path.join(root, "b", "report.pdf")
+    ]
+    assert index.lookup("missing.pdf") == []
+
+
+def test_lookup_prefers_exact_path(tmp_path):
+    root, index = build(tmp_path)
+    expected = [os.path.join(root, "b", "report.pdf")]
+    assert index.lookup(os.path.join("b", "report.pdf")) == expected
+    assert index.lookup(os.path.join(root, "b", "report.pdf")) == expected
+
+
+def test_duplicates(tmp_path):
+    root, index = build(tmp_path)
+    assert list(index.duplicates()) == ["report.pdf"]
+
+
+def test_move_add_remove(tmp_path):
+    root, index = build(tmp_path)
+    src = os.path.join(root, "a", "report.pdf")
+    dst = os.path.join(root, "c", "report.pdf")
+    index.move(src, dst)
+    assert src not in index and dst in index
+    assert len(index) == 3
+
+    index.add(dst)
+    assert len(index) == 3
+
+    index.remove(os.path.join(root, "b", "report.pdf"))
+    index.remove(dst)
+    assert index.lookup("report.pdf") == []
+    assert index.duplicates() == {}
+    assert len(index) == 1
@@ -0,0 +1,66 @@
+import pytest
+
+from config import Config
+from file_processor import FileProcessor
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "APP_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "ENABLE_RULE_CLASSIFIER", False)
+    monkeypatch.setattr(Config, "ENABLE_CONTENT_SNIPPETS", False)
+    monkeypatch.setattr(Config, "ENABLE_CLASSIFICATION_CACHE", True)
+    monkeypatch.setattr(Config, "STRUCTURED_OUTPUT", True)
+    monkeypatch.setattr(Config, "FAST_MODEL_NAME", "")
+    processor = FileProcessor()
+    yield processor
+    processor.cache.close()
+
+
+def test_cache_hits_are_passed_as_taxonomy_hint(processor):
+    processor.cache.put_mapping({"编程技术": ["a.py"], "文学": ["poem.txt"]})
+    seen = []
+
+    def classify(file_names, taxonomy=None):
+        seen.append(taxonomy)
+        return {"编程技术": list(file_names)}
+
+    processor.classify_batch_structured = classify
+    _, mapping = processor.analyze_filenames(["a.py", "poem.txt", "b.py"])
+    assert seen == [sorted(["编程技术", "文学"])]
+    assert mapping == {"编程技术": ["a.py", "b.py"], "文学": ["poem.txt"]}
+
+
+def test_no_hint_without_hits(processor):
+    seen = []
+
+    def classify(file_names, taxonomy=None):
+        seen.append(taxonomy)
+        return {"编程技术": list(file_names)}
+
+    processor.classify_batch_structured = classify
+    processor.analyze_filenames(["b.py"])
+    assert seen == [None]
+
+
+def stream_events(*chunks):
+    return [{"candidates": [{"content": {"parts": [{"text": chunk}]}}]} for chunk in chunks]
+
+
+def test_structured_stream_parses_members_incrementally(processor, monkeypatch):
+    events = stream_events('{"书籍": [0', '], "音乐": [1]}')
+    monkeypatch.setattr(processor.client, "stream_json", lambda *args, **kwargs: iter(events))
+    received = []
+    processor.on_category = lambda category, files: received.append(category)
+    mapping = processor.classify_batch_structured(["a.pdf", "b.mp3"])
+    assert mapping == {"书籍": ["a.pdf"], "音乐": ["b.mp3"]}
+    assert received == ["书籍", "音乐"]
+
+
+def test_structured_stream_falls_back_when_preamble_has_braces(processor, monkeypatch):
+    events = stream_events('Here is {json}: ', '{"书籍": [0, 1]}')
+    monkeypatch.setattr(processor.client, "stream_json", lambda *args, **kwargs: iter(events))
+    received = []
+    processor.on_category = lambda category, files: received.append(category)
+    assert processor.classify_batch_structured(["a.pdf", "b.epub"]) == {"书籍": ["a.pdf", "b.epub"]}
+    assert received == ["书籍"]
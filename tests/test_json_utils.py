@@ -0,0 +1,56 @@
+import time
+
+from json_utils import extract_json_value, repair_truncated_json
+
+
+def is_mapping(value):
+    return isinstance(value, dict)
+
+
+def test_extract_skips_prose_and_invalid_candidates():
+    text = '说明 [1, 2] 以及结果：{"文档": ["a.txt"]} 结束'
+    assert extract_json_value(text, is_mapping) == {"文档": ["a.txt"]}
+
+
+def test_extract_ignores_brackets_inside_strings():
+    text = '{"a": "} {", "b": [1]}'
+    assert extract_json_value(text) == {"a": "} {", "b": [1]}
+
+
+def test_extract_repairs_trailing_commas():
+    assert extract_json_value('{"a": [1, 2, ], "b": 3, }') == {"a": [1, 2], "b": 3}
+
+
+def test_extract_keeps_members_of_truncated_response():
+    text = '```json\n{"文档": ["a.txt", "b.txt"], "图片": ["c.png", "d.p'
+    assert extract_json_value(text, is_mapping) == {"文档": ["a.txt", "b.txt"], "图片": ["c.png", "d.p"]}
+
+
+def test_extract_strips_code_fence_from_truncated_candidate():
+    text = '```json\n{"文档": ["a.txt"], "图片": ["c.png"]\n```'
+    assert extract_json_value(text, is_mapping) == {"文档": ["a.txt"], "图片": ["c.png"]}
+
+
+def test_extract_returns_none_without_valid_value():
+    assert extract_json_value("没有 JSON 内容") is None
+    assert extract_json_value("[1, 2]", is_mapping) is None
+
+
+def test_extract_is_linear_for_many_unclosed_candidates():
+    text = "{ a " * 3000
+    start = time.perf_counter()
+    assert extract_json_value(text, is_mapping) is None
+    assert time.perf_counter() - start < 1.0
+
+
+def test_repair_closes_strings_and_brackets():
+    assert repair_truncated_json('{"a": [1, 2], "b": "tex') == {"a": [1, 2], "b": "tex"}
+    assert repair_truncated_json('[{"a": 1}, {"b": ') == [{"a": 1}]
+
+
+def test_repair_backs_off_to_member_boundary():
+    assert repair_truncated_json('{"a": 1, "b": tr') == {"a": 1}
+
+
+def test_repair_returns_none_for_garbage():
+    assert repair_truncated_json("not json") is None
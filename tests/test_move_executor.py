@@ -0,0 +1,83 @@
+import errno
+import os
+
+import pytest
+
+import move_executor
+from move_executor import MoveExecutor, move_file
+from move_journal import MoveJournal
+
+
+def write(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_move_file_renames(tmp_path):
+    src, dst = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    write(src, "a")
+    move_file(src, dst)
+    assert not os.path.exists(src)
+    assert read(dst) == "a"
+
+
+def test_move_file_refuses_to_overwrite(tmp_path):
+    src, dst = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    write(src, "a")
+    write(dst, "b")
+    with pytest.raises(FileExistsError):
+        move_file(src, dst)
+    assert read(src) == "a"
+    assert read(dst) == "b"
+
+
+def test_move_file_refuses_to_overwrite_dangling_symlink(tmp_path):
+    src, dst = str(tmp_path / "a.txt"), str(tmp_path / "link")
+    write(src, "a")
+    os.symlink(str(tmp_path / "missing"), dst)
+    with pytest.raises(FileExistsError):
+        move_file(src, dst)
+    assert os.path.islink(dst)
+
+
+def test_move_file_copies_across_devices(tmp_path, monkeypatch):
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "跨设备")
+
+    monkeypatch.setattr(move_executor.os, "rename", cross_device)
+    src, dst = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    write(src, "a" * 100000)
+    move_file(src, dst)
+    assert not os.path.exists(src)
+    assert read(dst) == "a" * 100000
+
+
+def test_executor_reports_conflicts_and_moves_the_rest(tmp_path):
+    root = tmp_path / "root"
+    target = root / "target"
+    target.mkdir(parents=True)
+    moves = []
+    for index in range(5):
+        src = str(root / f"{index}.txt")
+        write(src, str(index))
+        moves.append((src, str(target / f"{index}.txt")))
+    write(moves[2][1], "existing")
+
+    journal = MoveJournal.create(str(tmp_path / "journals"), str(root))
+    errors = {}
+    try:
+        assert MoveExecutor(journal, max_workers=2, chunk_size=2).run(
+            moves, lambda src, dst, error: errors.__setitem__(src, error))
+    finally:
+        journal.close()
+
+    assert isinstance(errors.pop(moves[2][0]), FileExistsError)
+    assert set(errors.values()) == {None}
+    assert read(moves[2][0]) == "2"
+    assert read(moves[2][1]) == "existing"
+    assert sorted(os.listdir(str(target))) == [f"{index}.txt" for index in range(5)]
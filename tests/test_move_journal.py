@@ -0,0 +1,168 @@
+import os
+
+from file_organizer import FileOrganizer
+from move_journal import MoveJournal
+
+
+def write(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def snapshot(root):
+    """返回目录中所有文件的 {相对路径: 内容}"""
+    files = {}
+    for dir_path, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dir_path, name)
+            with open(path, encoding="utf-8") as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def make_tree(tmp_path):
+    root = tmp_path / "root"
+    write(str(root / "inbox" / "a.txt"), "a")
+    write(str(root / "inbox" / "b.pdf"), "b")
+    write(str(root / "inbox" / ".DS_Store"), "ds")
+    write(str(root / "keep" / "c.txt"), "c")
+    return str(root)
+
+
+def test_rollback_restores_moves_and_removed_files(tmp_path):
+    root = make_tree(tmp_path)
+    before = snapshot(root)
+    plan = {"文档": ["a.txt", "b.pdf"]}
+    journal = MoveJournal.create(str(tmp_path / "journals"), root, plan)
+    organizer = FileOrganizer(root, journal, log=lambda message: None)
+    organizer.move_files(plan)
+    organizer.cleanup_empty_dirs()
+    journal.commit()
+
+    assert organizer.stats["moved"] == 2
+    assert not os.path.exists(os.path.join(root, "inbox"))
+    assert sorted(os.listdir(os.path.join(root, "文档"))) == ["a.txt", "b.pdf"]
+
+    reopened = MoveJournal(journal.path)
+    assert reopened.is_committed
+    assert reopened.trash_dir == organizer.trash_dir
+    assert reopened.rollback(log=lambda message: None)
+    assert snapshot(root) == before
+    assert not os.path.exists(os.path.join(root, "文档"))
+    # 隐藏文件已放回原处，空的回收目录随之删除
+    assert not os.path.exists(organizer.trash_dir)
+    assert MoveJournal(journal.path).is_rolled_back
+
+
+def test_rollback_skips_recorded_but_unexecuted_moves(tmp_path):
+    root = make_tree(tmp_path)
+    before = snapshot(root)
+    journal = MoveJournal.create(str(tmp_path / "journals"), root)
+    src = os.path.join(root, "inbox", "a.txt")
+    journal.record_moves([(src, os.path.join(root, "文档", "a.txt"))])
+    journal.close()
+
+    assert MoveJournal(journal.path).rollback(log=lambda message: None)
+    assert snapshot(root) == before
+
+
+def test_partial_record_is_skipped_and_terminated(tmp_path):
+    root = make_tree(tmp_path)
+    journal = MoveJournal.create(str(tmp_path / "journals"), root)
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "move", "src": ')
+
+    reopened = MoveJournal(journal.path)
+    assert [entry["op"] for entry in reopened.entries] == ["begin"]
+    reopened.commit()
+    assert [entry["op"] for entry in MoveJournal.read_entries(journal.path)] == ["begin", "commit"]
+
+
+def test_resume_finishes_plan_and_keeps_journal_for_undo(tmp_path):
+    root = make_tree(tmp_path)
+    before = snapshot(root)
+    journal_dir = str(tmp_path / "journals")
+    plan = {"文档": ["a.txt", "b.pdf"]}
+
+    # 模拟中途崩溃：只移动了一个文件，并已删除一个隐藏文件
+    journal = MoveJournal.create(journal_dir, root, plan)
+    trash_dir = f"{journal.path}.trash"
+    journal.makedirs(os.path.join(root, "文档"))
+    journal.move(os.path.join(root, "inbox", "a.txt"), os.path.join(root, "文档", "a.txt"))
+    journal.remove(os.path.join(root, "inbox", ".DS_Store"), trash_dir)
+    journal.close()
+
+    incomplete = MoveJournal.find_incomplete(journal_dir, root)
+    assert [item.path for item in incomplete] == [journal.path]
+
+    stats = FileOrganizer.resume(incomplete[0], log=lambda message: None)
+    assert stats["moved"] == 1
+    assert sorted(os.listdir(os.path.join(root, "文档"))) == ["a.txt", "b.pdf"]
+    assert not os.path.exists(os.path.join(root, "inbox"))
+    assert MoveJournal.find_incomplete(journal_dir, root) == []
+
+    # 提交后的日志仍保留，撤销时连同中断前的操作一起还原
+    resumed = MoveJournal(journal.path)
+    assert resumed.is_committed
+    assert resumed.trash_dir == trash_dir
+    assert resumed.rollback(log=lambda message: None)
+    assert snapshot(root) == before
+
+
+def commit_journal(journal_dir, root, plan=None, kind=None, trash_dir=None):
+    journal = MoveJournal.create(journal_dir, root, plan, kind=kind)
+    if trash_dir:
+        hidden = os.path.join(root, f".hidden_{os.path.basename(journal.path)}")
+        write(hidden, "h")
+        journal.remove(hidden, trash_dir)
+    journal.commit()
+    return journal
+
+
+def test_find_by_root_reads_only_matching_journals(tmp_path):
+    journal_dir = str(tmp_path / "journals")
+    root, other = make_tree(tmp_path), str(tmp_path / "other")
+    os.makedirs(other)
+    mine = commit_journal(journal_dir, root)
+    commit_journal(journal_dir, other)
+    write(os.path.join(journal_dir, "broken.jsonl"), "not json")
+
+    found = MoveJournal.find_by_root(journal_dir, root)
+    assert [journal.path for journal in found] == [mine.path]
+    # 根目录和是否完成只读取第一行和文件末尾，不解析全部记录
+    assert found[0].is_finished and found[0].last_op == "commit"
+    assert found[0]._entries is None
+
+
+def test_last_op_with_large_plan_and_partial_tail(tmp_path):
+    root = make_tree(tmp_path)
+    plan = {"文档": [f"file_{index}.txt" for index in range(2000)]}
+    journal = MoveJournal.create(str(tmp_path / "journals"), root, plan)
+    journal.close()
+    assert MoveJournal(journal.path).last_op == "begin"
+    assert not MoveJournal(journal.path).is_finished
+
+    journal = MoveJournal(journal.path)
+    journal.commit()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "rollb')
+    reopened = MoveJournal(journal.path)
+    assert reopened.last_op == "commit"
+    assert reopened.plan == plan
+
+
+def test_prune_keeps_latest_committed_and_removes_trash(tmp_path):
+    journal_dir = str(tmp_path / "journals")
+    root = make_tree(tmp_path)
+    trash_dirs = [str(tmp_path / f".trash_{index}") for index in range(3)]
+    journals = [commit_journal(journal_dir, root, trash_dir=trash_dir) for trash_dir in trash_dirs]
+    watch = commit_journal(journal_dir, root, kind="watch")
+    unfinished = MoveJournal.create(journal_dir, root)
+    unfinished.close()
+
+    assert MoveJournal.prune(journal_dir, root, keep=1) == 2
+    remaining = [journal.path for journal in MoveJournal.find_by_root(journal_dir, root)]
+    assert remaining == [journals[2].path, watch.path, unfinished.path]
+    assert [os.path.exists(trash_dir) for trash_dir in trash_dirs] == [False, False, True]
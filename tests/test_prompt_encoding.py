@@ -0,0 +1,46 @@
+from prompt_encoding import EncodedFileList
+
+
+FILES = ["/data/books/a.pdf", "/data/books/b.epub", "/data/music/c.mp3"]
+
+
+def test_to_text_lists_shared_directories_once():
+    text = EncodedFileList(FILES).to_text()
+    assert "根目录：/data" in text
+    assert "D0=books" in text and "D1=music" in text
+    assert "0|D0|a.pdf" in text and "2|D1|c.mp3" in text
+
+
+def test_decode_mapping_resolves_ids_and_skips_invalid_and_duplicates():
+    encoded = EncodedFileList(FILES)
+    mapping = {"书籍": [0, "1", 1, 7, -1, True, "x"], "音乐": [2, 0]}
+    assert encoded.decode_mapping(mapping) == {"书籍": FILES[:2], "音乐": [FILES[2]]}
+
+
+def test_decode_mapping_shares_seen_across_calls():
+    encoded = EncodedFileList(FILES)
+    seen = set()
+    assert encoded.decode_mapping({"书籍": [0]}, seen) == {"书籍": [FILES[0]]}
+    assert encoded.decode_mapping({"其他": [0, 2]}, seen) == {"其他": [FILES[2]]}
+
+
+def test_decode_scored_mapping_splits_confident_and_low():
+    encoded = EncodedFileList(FILES)
+    mapping = {"书籍": [[0, 0.9], [1, "40%"]], "未分类": [[2, 0.99]]}
+    confident, low = encoded.decode_scored_mapping(mapping, 0.7, uncategorized=("未分类",))
+    assert confident == {"书籍": [FILES[0]]}
+    assert low == [(FILES[1], "书籍"), (FILES[2], "未分类")]
+
+
+def test_decode_scored_mapping_treats_missing_confidence_as_low():
+    encoded = EncodedFileList(FILES)
+    confident, low = encoded.decode_scored_mapping({"书籍": [0, [1], [2, "高"]], "其他": [[0, 1.0]]}, 0.5)
+    assert confident == {}
+    assert low == [(FILES[0], "书籍"), (FILES[1], "书籍"), (FILES[2], "书籍")]
+
+
+def test_parse_confidence_accepts_percentages_and_clamps():
+    assert EncodedFileList.parse_confidence("85%") == 0.85
+    assert EncodedFileList.parse_confidence(95) == 0.95
+    assert EncodedFileList.parse_confidence(-1) == 0.0
+    assert EncodedFileList.parse_confidence(True) is None